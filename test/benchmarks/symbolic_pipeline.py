@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of the symbolic processing in compute_form_data.
+
+Times and memory-profiles each stage of ``compute_form_data`` on the
+forms in ``demo/*.ufl`` and on synthetic families of forms of
+increasing size.  Run as a script::
+
+    python test/benchmarks/symbolic_pipeline.py -o results.json
+    python test/benchmarks/symbolic_pipeline.py -o new.json --compare results.json
+
+The results are written as JSON, with one record per benchmark case
+and stage.  With ``--compare``, the timings are compared to a previous
+run and the script exits with a nonzero status if any stage got slower
+than the given tolerance.
+"""
+
+# Copyright (C) 2019 The FEniCS Project
+#
+# This file is part of UFL (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import argparse
+import datetime
+import gc
+import glob
+import json
+import os
+import platform
+import re
+import sys
+import time
+import tracemalloc
+
+import ufl
+from ufl import (FiniteElement, VectorElement, MixedElement, TestFunction,
+                 TrialFunction, Coefficient, TestFunctions, TrialFunctions,
+                 triangle, tetrahedron, variable, diff, derivative, grad, inner,
+                 exp, det, tr, Identity, dx, ds, dS)
+from ufl.algorithms import load_ufl_file, compute_form_data
+from ufl.algorithms.compute_form_data import _build_symbolic_passes
+from ufl.algorithms.pass_fusion import FormPass, apply_fused_passes
+from ufl.corealg.traversal import unique_pre_traversal
+
+FORMAT_VERSION = 1
+
+demodir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "demo"))
+
+# The parameters FFC and TSFC pass to compute_form_data
+default_parameters = dict(do_apply_function_pullbacks=True,
+                          do_apply_integral_scaling=True,
+                          do_apply_geometry_lowering=True,
+                          preserve_geometry_types=(),
+                          do_apply_default_restrictions=True,
+                          do_apply_restrictions=True,
+                          do_estimate_degrees=True,
+                          do_append_everywhere_integrals=True,
+                          complex_mode=False)
+
+
+# --- Benchmark cases
+
+def demo_cases():
+    "Yield (name, form) for each form in the demo files."
+    filenames = sorted(set(glob.glob(os.path.join(demodir, "*.ufl")))
+                       - set(glob.glob(os.path.join(demodir, "_*.ufl"))))
+    for filename in filenames:
+        basename = os.path.splitext(os.path.basename(filename))[0]
+        data = load_ufl_file(filename)
+        names = {id(form): name for name, form in data.object_by_name.items()}
+        for i, form in enumerate(data.forms):
+            yield "demo/%s/%s" % (basename, names.get(id(form), i)), form
+
+
+def nested_derivative_form(n):
+    """Derivative of order n of a nonlinear energy functional, the
+    last two in the direction of a test and a trial function."""
+    element = FiniteElement("Lagrange", triangle, 2)
+    u = Coefficient(element)
+    directions = [Coefficient(element) for i in range(n - 2)]
+    directions += [TestFunction(element), TrialFunction(element)][:n]
+    form = exp(inner(grad(u), grad(u))) * u**2 * dx
+    for w in directions:
+        form = derivative(form, u, w)
+    return form
+
+
+def nested_diff_form(n):
+    "Hyperelasticity-like form with n nested variable derivatives."
+    element = VectorElement("Lagrange", tetrahedron, 1)
+    u = Coefficient(element)
+    v = TestFunction(element)
+    F = variable(Identity(3) + grad(u))
+    C = variable(F.T * F)
+    psi = exp(tr(C)) * det(C)
+    for i in range(n):
+        psi = tr(diff(psi, C))
+    P = diff(psi, F)
+    return inner(P, grad(v)) * dx
+
+
+def mixed_element_form(n):
+    "Vector Laplacian on a mixed element with n vector subelements."
+    element = MixedElement([VectorElement("Lagrange", triangle, 1 + i % 2) for i in range(n)])
+    us = TrialFunctions(element)
+    vs = TestFunctions(element)
+    return sum(inner(grad(u), grad(v)) for u, v in zip(us, vs)) * dx
+
+
+def subdomain_form(n):
+    "Form with different integrands on n cell, exterior and interior facet subdomains."
+    element = FiniteElement("Discontinuous Lagrange", triangle, 1)
+    u = TrialFunction(element)
+    v = TestFunction(element)
+    f = Coefficient(element)
+    form = 0
+    for i in range(n):
+        form += (i + 1) * f * u * v * dx(i) + f**i * u * v * ds(i)
+        form += inner(grad(u)('+'), grad(v)('-')) * (i + 1) * dS(i)
+    return form
+
+
+synthetic_families = {
+    "nested_derivatives": (nested_derivative_form, (1, 2, 3)),
+    "nested_diff": (nested_diff_form, (1, 2, 4)),
+    "mixed_element": (mixed_element_form, (2, 8, 32)),
+    "subdomains": (subdomain_form, (4, 16, 64)),
+}
+
+
+def synthetic_cases(quick=False):
+    "Yield (name, form) for the synthetic scaling families."
+    for family, (make_form, sizes) in sorted(synthetic_families.items()):
+        for n in sizes[:2] if quick else sizes:
+            yield "synthetic/%s/%d" % (family, n), make_form(n)
+
+
+# --- Measurement
+
+def count_nodes(form):
+    "Return the number of unique nodes in the integrands of form."
+    return sum(len(set(unique_pre_traversal(itg.integrand()))) for itg in form.integrals())
+
+
+def run_stages(form, parameters):
+    """Run the stages of compute_form_data on form and yield (stage,
+    callable) pairs, each callable running one stage on the result of
+    the previous."""
+    passes = _build_symbolic_passes(form, **parameters)
+    for p in passes:
+        if isinstance(p, FormPass):
+            yield p.name, p.function
+        else:
+            yield p.name, lambda f, p=p: apply_fused_passes([p], f)
+
+
+def measure_stages(form, parameters, repeat):
+    """Measure each symbolic processing stage of compute_form_data on
+    form, and compute_form_data as a whole.
+
+    Returns a list of dicts with the stage name, the best and mean
+    wall time in seconds over repeat runs, the peak memory allocated
+    during the stage in bytes, and the number of nodes after the stage.
+    """
+    stages = {}
+    order = []
+    for r in range(repeat + 1):
+        # The last run measures memory, tracing slows down the timings
+        trace = r == repeat
+        f = form
+        position = 0
+        for name, stage in run_stages(form, parameters):
+            key = (position, name)
+            position += 1
+            if key not in stages:
+                order.append(key)
+                stages[key] = {"stage": name, "position": key[0], "times": []}
+            gc.collect()
+            if trace:
+                tracemalloc.start()
+                f = stage(f)
+                stages[key]["peak_memory"] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                stages[key]["nodes"] = count_nodes(f)
+            else:
+                t0 = time.perf_counter()
+                f = stage(f)
+                stages[key]["times"].append(time.perf_counter() - t0)
+
+        key = (position, "compute_form_data")
+        if key not in stages:
+            order.append(key)
+            stages[key] = {"stage": "compute_form_data", "position": key[0], "times": []}
+        gc.collect()
+        if trace:
+            tracemalloc.start()
+            fd = compute_form_data(form, **parameters)
+            stages[key]["peak_memory"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            stages[key]["nodes"] = count_nodes(fd.preprocessed_form)
+        else:
+            t0 = time.perf_counter()
+            compute_form_data(form, **parameters)
+            stages[key]["times"].append(time.perf_counter() - t0)
+
+    records = []
+    for key in order:
+        s = stages[key]
+        times = s.pop("times")
+        s["time"] = min(times)
+        s["mean_time"] = sum(times) / len(times)
+        s["repeat"] = len(times)
+        records.append(s)
+    return records
+
+
+def run_benchmarks(cases, repeat=3, parameters=None, log=None):
+    """Run benchmarks for the (name, form) pairs in cases.
+
+    Returns a list of result records, one per case and stage.  Forms
+    which compute_form_data rejects are recorded with an error.
+    """
+    parameters = dict(default_parameters, **(parameters or {}))
+    results = []
+    for name, form in cases:
+        nodes = count_nodes(form)
+        try:
+            records = measure_stages(form, parameters, repeat)
+        except Exception as e:
+            results.append({"case": name, "error": "%s: %s" % (type(e).__name__, e)})
+            if log:
+                log("%-50s skipped (%s)" % (name, type(e).__name__))
+            continue
+        for record in records:
+            record["case"] = name
+            record["input_nodes"] = nodes
+            results.append(record)
+        if log:
+            log("%-50s %10.4f s" % (name, records[-1]["time"]))
+    return results
+
+
+def benchmark_metadata():
+    "Return information about the environment the benchmarks run in."
+    return {"format_version": FORMAT_VERSION,
+            "ufl_version": ufl.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": datetime.datetime.now().isoformat()}
+
+
+# --- Comparison of results
+
+def compare_results(old, new, tolerance=0.1, min_time=1e-3):
+    """Compare the timings of two benchmark runs.
+
+    Returns a list of (case, stage, old time, new time) for the stages
+    which got slower by more than the relative tolerance. Stages faster
+    than min_time seconds in both runs are ignored as too noisy.
+    """
+    def timings(data):
+        return {(r["case"], r["position"], r["stage"]): r["time"]
+                for r in data["results"] if "error" not in r}
+
+    old_times = timings(old)
+    regressions = []
+    for key, t in sorted(timings(new).items()):
+        t0 = old_times.get(key)
+        if t0 is None or max(t, t0) < min_time:
+            continue
+        if t > t0 * (1.0 + tolerance):
+            regressions.append((key[0], key[2], t0, t))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="number of timed runs of each stage (default: 3)")
+    parser.add_argument("-k", "--filter", default="",
+                        help="only run cases with names matching this regular expression")
+    parser.add_argument("--quick", action="store_true",
+                        help="skip the largest sizes of the synthetic families")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="compare timings to results from a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative slowdown reported as regression (default: 0.1)")
+    args = parser.parse_args(args)
+
+    pattern = re.compile(args.filter)
+    cases = ((name, form) for cases in (demo_cases(), synthetic_cases(args.quick))
+             for name, form in cases if pattern.search(name))
+
+    data = {"metadata": benchmark_metadata(),
+            "results": run_benchmarks(cases, repeat=args.repeat,
+                                      log=lambda s: print(s, file=sys.stderr))}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+    else:
+        json.dump(data, sys.stdout, indent=1, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        regressions = compare_results(old, data, tolerance=args.tolerance)
+        for case, stage, t0, t in regressions:
+            print("%-50s %-30s %10.4f s -> %10.4f s (%+.0f%%)"
+                  % (case, stage, t0, t, 100.0 * (t / t0 - 1.0)), file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
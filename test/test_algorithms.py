@@ -11,7 +11,7 @@ from pprint import *
 
 from ufl import (FiniteElement, TestFunction, TrialFunction, triangle,
                  div, grad, Argument, dx, adjoint, Coefficient,
-                 FacetNormal, inner, dot, ds)
+                 FacetNormal, inner, dot, ds, dS)
 from ufl.algorithms import (extract_arguments, expand_derivatives,
                             expand_indices, extract_elements,
                             extract_unique_elements, extract_coefficients)
@@ -142,3 +142,96 @@ def test_adjoint():
     d = adjoint(b)
     d_arg_degrees = [arg.ufl_element().degree() for arg in extract_arguments(d)]
     assert d_arg_degrees == [2, 1]
+
+
+def test_dag_snapshot_traversal(arguments, coefficients):
+    from ufl.classes import Coefficient, Expr, Grad
+    from ufl.corealg.dag_snapshot import DAGSnapshot
+    from ufl.corealg.map_dag import map_expr_dag
+    from ufl.corealg.multifunction import MultiFunction
+    from ufl.corealg.traversal import cutoff_unique_post_traversal
+    from ufl.algorithms import extract_type
+    from ufl.algorithms.renumbering import renumber_indices
+
+    v, u = arguments
+    c, f = coefficients
+    e = inner(c * grad(u), grad(v)) + f * u * v + c * grad(f)[0] * v
+    s = DAGSnapshot([e])
+    assert len(s) == len(list(unique_post_traversal(e)))
+    assert s.nodes[s.roots[0]] == e
+
+    order = [s.nodes[k] for k in s.post_order(s.roots[0])]
+    assert order == list(unique_post_traversal(e))
+
+    cutoff_types = [False] * len(Expr._ufl_all_classes_)
+    cutoff_types[Grad._ufl_typecode_] = True
+    order = [s.nodes[k] for k in s.post_order(s.roots[0], cutoff_types=cutoff_types)]
+    assert order == list(cutoff_unique_post_traversal(e, cutoff_types))
+
+    assert extract_type(s, Coefficient) == set((c, f))
+
+    class Renamer(MultiFunction):
+        expr = MultiFunction.reuse_if_untouched
+
+        def coefficient(self, o):
+            return f if o == c else o
+
+    expected = map_expr_dag(Renamer(), e)
+    result = map_expr_dag(Renamer(), e, snapshot=s)
+    assert renumber_indices(result) == renumber_indices(expected)
+
+
+def test_form_analysis(arguments, coefficients, forms):
+    from ufl.classes import (Argument, Constant, FacetNormal, Grad, FormArgument,
+                             SpatialCoordinate, Restricted, Sum, Product)
+    from ufl.algorithms import extract_type
+    from ufl.algorithms.analysis import (analyze, extract_arguments_and_coefficients,
+                                         extract_constants, has_type)
+
+    v, u = arguments
+    c, f = coefficients
+    a, L, b = forms
+
+    # The analysis is computed once and shared by the accessors
+    analysis = b.analysis()
+    assert b.analysis() is analysis
+    assert analysis.terminals(Argument) == set((v, u))
+    assert analysis.terminals(FormArgument) == set((v, u, c, f))
+    assert extract_type(b, FormArgument) == analysis.terminals(FormArgument)
+    assert extract_arguments_and_coefficients(b) == ([v, u], [c, f])
+    assert b.arguments() == (v, u) and b.coefficients() == (c, f)
+    assert extract_constants(b) == []
+    assert analysis.unique_elements() == extract_unique_elements(b)
+    assert analysis.domains() == b.ufl_domains()
+    assert [type(g) for g in analysis.geometric_quantities()] == [FacetNormal]
+    assert analysis.max_derivative_order() == 1
+    assert analysis.restrictions() == set()
+    assert has_type(b, Grad) and has_type(b, FacetNormal) and has_type(b, Product)
+    assert not has_type(b, SpatialCoordinate) and not has_type(b, Sum) and not has_type(a, Grad)
+
+    # The results of analyzing an expression and the form agree
+    e = b.integrals()[0].integrand()
+    assert analyze(e).terminals(FormArgument) == extract_type(e, FormArgument)
+
+    mesh = v.ufl_domain()
+    k = Constant(mesh)
+    x = SpatialCoordinate(mesh)
+    F = k * div(grad(u))('+') * v('-') * dS + x[0] * u * v * dx
+    analysis = F.analysis()
+    assert F.constants() == [k]
+    assert analysis.max_derivative_order() == 2
+    assert analysis.restrictions() == set(("+", "-"))
+    assert analysis.has_type(Restricted) and not analyze(a).has_type(Restricted)
+    assert analysis.geometric_quantities() == set((x,))
+
+    # Subclasses of terminal types not registered as ufl types, as
+    # defined by form compilers, are found by their own class
+    class Function(Coefficient):
+        pass
+
+    g = Function(c.ufl_function_space())
+    G = g * u * v * dx + c * v * dx
+    assert extract_type(G, Function) == set((g,))
+    assert extract_type(G, Coefficient) == set((c, g))
+    assert has_type(G, Function) and not has_type(b, Function)
+    assert G.coefficients() == (c, g)
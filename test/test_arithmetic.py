@@ -95,3 +95,33 @@ def test_elem_op(self):
     self.assertEqual(elem_op(sin, A), as_matrix(((sin(x), sin(y), sin(z)),
                                                  (sin(3), sin(4), sin(5)))))
     self.assertEqual(elem_op(sin, A).dx(0).ufl_shape, (2, 3))
+
+
+def test_sort_keys_order_like_traversal():
+    from itertools import product
+    from ufl.sorting import cmp_expr, _cmp_expr_by_traversal, expr_sort_key, sorted_expr
+    element = FiniteElement("Lagrange", triangle, 1)
+    V = VectorElement("Lagrange", triangle, 1)
+    f, g = Coefficient(element), Coefficient(element)
+    v = TestFunction(element)
+    w = Coefficient(V)
+    x = SpatialCoordinate(triangle)
+    i, j = indices(2)
+    A = outer(w, w)
+    exprs = [f, g, v, 2, 3.5, x[0], x[1], w[0], w[i], A[i, j], A[0, i], A[1, 0],
+             as_tensor(A[i, j], (i, j))[0, 1], variable(f), variable(g),
+             f + g, f * g, g * v, sin(f), f**2, (f + g) * v, grad(w)[0, i]]
+    exprs = [as_ufl(e) for e in exprs]
+    for a, b in product(exprs, exprs):
+        assert cmp_expr(a, b) == _cmp_expr_by_traversal(a, b)
+    s = f + g
+    assert expr_sort_key(s) is expr_sort_key(s)
+
+    # Deeply nested expressions fall back to comparison by traversal
+    a = f
+    b = g
+    for k in range(3000):
+        a = sin(a)
+        b = sin(b)
+    assert sorted_expr([b, a]) == [a, b]
+    assert cmp_expr(b, a) == 1
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Check that the benchmark harness in test/benchmarks runs."""
+
+import json
+
+from benchmarks.symbolic_pipeline import (run_benchmarks, synthetic_cases,
+                                          compare_results, main)
+
+
+def test_symbolic_pipeline_benchmark_records():
+    cases = [c for c in synthetic_cases(quick=True) if c[0] == "synthetic/mixed_element/2"]
+    results = run_benchmarks(cases, repeat=1)
+    stages = [r["stage"] for r in results]
+    assert stages[0] == "apply_algebra_lowering"
+    assert stages[-1] == "compute_form_data"
+    assert "apply_derivatives" in stages
+    assert [r["position"] for r in results] == list(range(len(results)))
+    for r in results:
+        assert r["case"] == "synthetic/mixed_element/2"
+        assert r["time"] > 0.0 and r["peak_memory"] > 0 and r["nodes"] > 0
+
+    old = {"results": results}
+    new = {"results": [dict(r, time=2 * r["time"] + 1.0) for r in results]}
+    assert len(compare_results(old, new)) == len(results)
+    assert compare_results(new, old) == []
+
+
+def test_symbolic_pipeline_benchmark_output(tmpdir):
+    output = str(tmpdir.join("results.json"))
+    assert main(["-o", output, "-r", "1", "-k", "demo/Mass/"]) == 0
+    with open(output) as f:
+        data = json.load(f)
+    assert data["metadata"]["format_version"] == 1
+    assert set(r["case"] for r in data["results"]) == set(["demo/Mass/a"])
+    assert main(["-o", output, "-r", "1", "-k", "demo/Mass/", "--compare", output,
+                 "--tolerance", "1e9"]) == 0
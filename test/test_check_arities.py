@@ -3,7 +3,7 @@
 import pytest
 from ufl import *
 from ufl.algorithms.compute_form_data import compute_form_data
-from ufl.algorithms.check_arities import ArityMismatch
+from ufl.algorithms.check_arities import ArityMismatch, check_integrands_arity
 
 
 def test_check_arities():
@@ -51,3 +51,43 @@ def test_complex_arities():
 
     with pytest.raises(ArityMismatch):
         compute_form_data(inner(conj(v), u) * dx, complex_mode=True)
+
+
+def test_arity_mismatches():
+    cell = triangle
+    V = FiniteElement("P", cell, 1)
+    v = TestFunction(V)
+    u = TrialFunction(V)
+    f = Coefficient(V)
+
+    for form in [sin(v) * dx,
+                 (v + u) * dx,
+                 (v + f) * v * dx,
+                 v * v * dx,
+                 f / v * dx,
+                 conditional(lt(v, 0), v, 0) * dx,
+                 conditional(lt(f, 0), v, u) * dx,
+                 inner(as_vector([v, u]), as_vector([1, 1])) * dx]:
+        with pytest.raises(ArityMismatch):
+            compute_form_data(form)
+
+    # The arguments of each integral must match those of the form
+    with pytest.raises(ArityMismatch):
+        compute_form_data(u * v * dx + v * ds)
+
+    compute_form_data(conditional(lt(f, 0), v, 0) * u * dx + as_vector([v, 0])[0] * f * u * ds)
+
+
+def test_check_integrands_arity_shares_subexpressions():
+    V = FiniteElement("P", triangle, 1)
+    v = TestFunction(V)
+    u = TrialFunction(V)
+    f = Coefficient(V)
+    e = exp(f) * u
+
+    check_integrands_arity([e * v, (e + u) * conj(v)], (v, u))
+    check_integrands_arity([e * conj(v), e * conj(v) * f], (v, u), complex_mode=True)
+    with pytest.raises(ArityMismatch):
+        check_integrands_arity([e * conj(v), e * v], (v, u), complex_mode=True)
+    with pytest.raises(ArityMismatch):
+        check_integrands_arity([e * v, e], (v, u))
@@ -132,3 +132,93 @@ def test_some_compound_types():
 
     assert etpd(dot(grad(v), grad(v))) == 2 - 1 + 2 - 1
     assert etpd(inner(grad(v), grad(v))) == 2 - 1 + 2 - 1
+
+
+def test_degree_estimation_cache():
+    from ufl.algorithms.estimate_degrees import DegreeEstimationCache, IrreducibleInt, cap_degree
+    from ufl.algorithms.compute_form_data import attach_estimated_degrees
+
+    V1 = FiniteElement("CG", triangle, 1)
+    V2 = FiniteElement("CG", triangle, 2)
+    v = TestFunction(V1)
+    f = Coefficient(V2)
+    g = Coefficient(FiniteElement("CG", triangle, None))
+    e = f**2 * g
+
+    cache = DegreeEstimationCache()
+    assert estimate_total_polynomial_degree(e * v, cache=cache) == 6
+    size = len(cache)
+    assert size > 0
+
+    # Degrees are reused across integrals and calls, both integrands
+    # were estimated above
+    form = e * v * dx + e * ds
+    fd = attach_estimated_degrees(form, cache=cache)
+    assert [itg.metadata()["estimated_polynomial_degree"] for itg in fd.integrals()] == [6, 5]
+    assert len(cache) == size
+
+    # Degrees are memoized per default degree and element replace map
+    assert estimate_total_polynomial_degree(e * v, default_degree=3, cache=cache) == 8
+    assert estimate_total_polynomial_degree(e * v, element_replace_map={V2: V1}, cache=cache) == 4
+    assert estimate_total_polynomial_degree(e * v, cache=cache) == 6
+
+    # A cache passed to compute_form_data is reused across calls, by
+    # default a new cache is used for each call
+    from ufl.algorithms import compute_form_data
+    cache = DegreeEstimationCache()
+    compute_form_data(e * v * dx + f * v * ds, degree_cache=cache)
+    assert len(cache) > 0
+
+    # The memo is bounded
+    cache = DegreeEstimationCache(memo_size=3)
+    assert estimate_total_polynomial_degree(e * v, cache=cache) == 6
+    assert len(cache) == 0
+    assert estimate_total_polynomial_degree(e * v, cache=DegreeEstimationCache(memo_size=0)) == 6
+
+    # Capping the degrees
+    assert cap_degree(6, None) == 6
+    assert cap_degree(6, 4) == 4
+    assert cap_degree((6, 2), 4) == (4, 2)
+    assert isinstance(cap_degree(IrreducibleInt(6), 4), IrreducibleInt)
+    fd = attach_estimated_degrees(form, max_degree=5)
+    assert [itg.metadata()["estimated_polynomial_degree"] for itg in fd.integrals()] == [5, 5]
+    fd = compute_form_data(e * v * dx + f * v * ds, max_estimated_degree=4)
+    assert [itg.metadata()["estimated_polynomial_degree"]
+            for data in fd.integral_data for itg in data.integrals] == [4, 3]
+
+
+def test_degree_breakdown_and_policies():
+    from ufl.log import UFLException
+    from ufl.algorithms.estimate_degrees import estimate_degree_breakdown
+    from ufl.algorithms.compute_form_data import attach_estimated_degrees
+
+    V = FiniteElement("CG", triangle, 2)
+    v = TestFunction(V)
+    f = Coefficient(V)
+    g = Coefficient(V)
+    e = (g + f**2) * exp(f**3)
+
+    degree, path = estimate_degree_breakdown(e * v)
+    assert degree == 14
+    assert path[0] == (e * v, 14)
+    assert [type(o).__name__ for o, d in path] == ["Product", "Product", "Exp", "Power", "Coefficient"]
+    assert [d for o, d in path] == [14, 12, 8, 6, 2]
+
+    form = e * v * dx + g * v * ds
+    fd = compute_form_data(form, do_estimated_degree_breakdown=True)
+    breakdowns = fd.degree_breakdowns
+    assert [(b.integral_type, b.degree) for b in breakdowns] == [("cell", 14), ("exterior_facet", 4)]
+    assert "Exp(8)" in str(breakdowns[0])
+
+    # Policies for degrees above a threshold
+    degrees = [itg.metadata()["estimated_polynomial_degree"]
+               for itg in attach_estimated_degrees(form, max_degree=8).integrals()]
+    assert degrees == [8, 4]
+    degrees = [itg.metadata()["estimated_polynomial_degree"]
+               for itg in attach_estimated_degrees(form, max_degree=8, policy="warn").integrals()]
+    assert degrees == [14, 4]
+    with pytest.raises(UFLException) as e:
+        compute_form_data(form, max_estimated_degree=8, estimated_degree_policy="error")
+    assert "Exp(8)" in str(e.value)
+    with pytest.raises(UFLException):
+        attach_estimated_degrees(form, max_degree=8, policy="ignore")
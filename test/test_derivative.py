@@ -10,7 +10,7 @@ from itertools import chain
 
 from ufl import *
 from ufl.constantvalue import as_ufl
-from ufl.algorithms import expand_indices, strip_variables, post_traversal, compute_form_data
+from ufl.algorithms import expand_indices, strip_variables, post_traversal, compute_form_data, expand_derivatives
 
 
 def assertEqualBySampling(actual, expected):
@@ -684,3 +684,157 @@ def test_foobar(self):
     L = NS_a(U, v)*dx
     a = derivative(L, U, du)
     # TODO: assert something
+
+
+def test_derivative_memo_shared_between_integrals():
+    from ufl.algorithms.apply_derivatives import DerivativeRuleDispatcher
+    from ufl.algorithms.apply_algebra_lowering import apply_algebra_lowering
+    from ufl.algorithms.map_integrands import map_integrand_dags
+    from ufl.algorithms.renumbering import renumber_indices
+    from ufl.corealg.map_dag import collect_map_statistics
+
+    element = VectorElement("Lagrange", triangle, 1)
+    u = Coefficient(element)
+    v = TestFunction(element)
+    F = Identity(2) + grad(u)
+    psi = tr(F.T * F) + ln(det(F))**2
+    L = apply_algebra_lowering(sum(derivative((i + 1) * psi, u, v) * ds(i) for i in range(4)))
+
+    with collect_map_statistics() as without_memo:
+        expected = map_integrand_dags(DerivativeRuleDispatcher(memo_size=0), L)
+    rules = DerivativeRuleDispatcher()
+    with collect_map_statistics() as with_memo:
+        result = map_integrand_dags(rules, L)
+    assert with_memo.nodes < without_memo.nodes
+    assert len(rules._memo) > 0
+    assert ([renumber_indices(itg.integrand()) for itg in result.integrals()] ==
+            [renumber_indices(itg.integrand()) for itg in expected.integrals()])
+
+    # Applying the same dispatcher again reuses all derivatives
+    with collect_map_statistics() as again:
+        map_integrand_dags(rules, L)
+    assert again.nodes < with_memo.nodes
+
+    # The memo is bounded
+    rules = DerivativeRuleDispatcher(memo_size=10)
+    result = map_integrand_dags(rules, L)
+    assert sum(len(cache) for r, cache in rules._memo.values()) <= 10
+    assert ([renumber_indices(itg.integrand()) for itg in result.integrals()] ==
+            [renumber_indices(itg.integrand()) for itg in expected.integrals()])
+
+
+def test_derivative_argument_containers_index():
+    from ufl.classes import ExprList, ExprMapping, CoefficientDerivative
+    from ufl.algorithms.apply_derivatives import GateauxDerivativeRuleset
+    from ufl.algorithms.renumbering import renumber_indices
+
+    element = FiniteElement("Lagrange", triangle, 1)
+    ws = [Coefficient(element) for i in range(5)]
+    vs = [TestFunction(element)] + [Coefficient(element) for i in range(4)]
+    V = VectorElement("Lagrange", triangle, 1)
+    u = Coefficient(V)
+
+    coefficients = ExprList(*(ws + [u[0], u[1]]))
+    assert coefficients.positions(ws[3]) == (3,)
+    assert coefficients.positions(u) == ()
+    assert coefficients.component_positions(u) == (5, 6)
+    assert coefficients.positions(vs[1]) == ()
+    mapping = ExprMapping(ws[0], vs[1], ws[1], vs[2])
+    assert mapping.mapping() == {ws[0]: vs[1], ws[1]: vs[2]}
+    assert mapping.mapping() is mapping.mapping()
+
+    # The rulesets of all derivative nodes share the index of the
+    # containers
+    F = sum(w**2 * inner(grad(w), grad(w)) for w in ws) * dx
+    d = derivative(F, ws, vs)
+    cds = set(o for itg in d.integrals() for o in post_traversal(itg.integrand())
+              if isinstance(o, CoefficientDerivative))
+    w, v, cd = next(iter(cds)).ufl_operands[1:]
+    rules = GateauxDerivativeRuleset(w, v, cd)
+    assert rules.coefficient(ws[2]) == vs[2]
+    assert rules._coefficients is w and w._index is not None
+    assert rules.coefficient(Coefficient(element)) == 0
+
+    integrand, = [itg.integrand() for itg in expand_derivatives(d).integrals()]
+    expected = sum(itg.integrand() for w_, v_ in zip(ws, vs)
+                   for itg in expand_derivatives(derivative(w_**2 * inner(grad(w_), grad(w_)) * dx,
+                                                            w_, v_)).integrals())
+    assert renumber_indices(integrand) == renumber_indices(expected)
+
+    # Coefficients which are neither form arguments nor components of
+    # one are still reported
+    rules = GateauxDerivativeRuleset(ExprList(ws[0], 2 * ws[1]), ExprList(vs[0], vs[1]), ExprMapping())
+    with pytest.raises(UFLException):
+        rules.grad(grad(ws[2]))
+
+
+def _sample_form(form, mapping, x):
+    from ufl.algorithms.apply_algebra_lowering import apply_algebra_lowering
+    from ufl.algorithms.apply_derivatives import apply_derivatives
+    from ufl.algorithms.apply_restrictions import apply_restrictions
+    value = 0.0
+    for itg in form.integrals():
+        e = apply_derivatives(apply_algebra_lowering(itg.integrand()))
+        if itg.integral_type() == "interior_facet":
+            e = apply_restrictions(e)
+        value += e(x, mapping)
+    return value
+
+
+def test_reverse_derivative_matches_derivative():
+    cell = triangle
+    P = FiniteElement("CG", cell, 2)
+    V = VectorElement("CG", cell, 2)
+    u = Coefficient(P)
+    g = Coefficient(P)
+    w = Coefficient(V)
+    vu = TestFunction(P)
+    vg = TestFunction(P)
+    vw = TestFunction(V)
+
+    def scalar_function(c):
+        def f(x, derivatives=()):
+            return {(): 1.0 + c*x[0]**2 + 0.3*x[1] + c*x[0]*x[1],
+                    (0,): 2*c*x[0] + c*x[1],
+                    (1,): 0.3 + c*x[0]}.get(derivatives, 0.0)
+        return f
+
+    def vector_function(c):
+        def f(x, derivatives=()):
+            return {(): (1.0 + c*x[0]**2 + x[1], 0.5 + c*x[0]*x[1]),
+                    (0,): (2*c*x[0], c*x[1]),
+                    (1,): (1.0, c*x[0])}.get(derivatives, (0.0, 0.0))
+        return f
+
+    mapping = {u: scalar_function(0.7), g: scalar_function(-0.4), w: vector_function(0.9),
+               vu: scalar_function(1.3), vg: scalar_function(2.1), vw: vector_function(-1.1)}
+    directions = {u: vu, g: vg, w: vw}
+
+    F = variable(Identity(2) + grad(w))
+    C = F.T*F
+    psi = (tr(C) - 2)**2 + exp(u*det(C))
+    forms = [u**2*exp(u)*dx + sin(g*u)*ds,
+             inner(grad(u), grad(u))*sqrt(1 + g**2)*dx,
+             inner(grad(w), grad(w))*u*dx + w[0]*w[1]**2*dx + dot(w, grad(u))*dx,
+             conditional(gt(u, 0.5), u**3, g*u)*dx + tr(grad(w).T*grad(w))**2*dx,
+             abs(u*g)**1.5*dx + atan_2(u, g)*dx + max_value(u, g)*dx + ln(1 + u**2)/g*dx,
+             u('+')*g('-')*dS + inner(grad(w)('+'), grad(w)('-'))*dS,
+             psi*dx + diff(psi, F)[0, 1]*g*dx + as_vector([w[1], u])[1]*w[0]*dx]
+
+    x = (0.3, 0.7)
+    for form in forms:
+        coefficients = (u, w, g)
+        arguments = tuple(directions[c] for c in coefficients)
+        for c, a, d in zip(coefficients, arguments, reverse_derivative(form, coefficients, arguments)):
+            expected = _sample_form(expand_derivatives(derivative(form, c, a)), mapping, x)
+            assert abs(_sample_form(d, mapping, x) - expected) < 1e-10 * (1 + abs(expected))
+        assert d.arguments() in ((), (vg,))
+
+    # Default arguments are test functions in the coefficient spaces
+    du, dw = reverse_derivative(forms[2], [u, w])
+    assert du.arguments() == (Argument(u.ufl_function_space(), 0),)
+    assert dw.arguments() == (Argument(w.ufl_function_space(), 0),)
+
+    # Only functionals can be differentiated in reverse mode
+    with pytest.raises(UFLException):
+        reverse_derivative(u*vu*dx, [u])
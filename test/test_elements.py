@@ -221,3 +221,23 @@ def test_mse():
 
         element = FiniteElement('GLL-Edge L2', interval, degree - 1)
         assert element == eval(repr(element))
+
+
+def test_element_hash_key_is_shared():
+    import pickle
+
+    def make():
+        P = FiniteElement("Lagrange", tetrahedron, 2)
+        T = TensorElement("DG", tetrahedron, 1, symmetry=True)
+        return MixedElement([MixedElement([P, T]), VectorElement("Lagrange", tetrahedron, 2)])
+
+    a, b = make(), make()
+    assert a is not b
+    assert a == b and hash(a) == hash(b)
+    assert a._ufl_hash_key_() is b._ufl_hash_key_()
+    assert a != MixedElement([make(), make()])
+    assert {a: 1}[b] == 1
+
+    c = pickle.loads(pickle.dumps(a))
+    assert c == a and hash(c) == hash(a)
+    assert c.sub_elements() == a.sub_elements()
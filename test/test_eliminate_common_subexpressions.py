@@ -0,0 +1,86 @@
+#!/usr/bin/env py.test
+# -*- coding: utf-8 -*-
+
+from ufl import *
+from ufl.algorithms import compute_form_data
+from ufl.algorithms.apply_algebra_lowering import apply_algebra_lowering
+from ufl.algorithms.apply_derivatives import apply_derivatives
+from ufl.algorithms.eliminate_common_subexpressions import eliminate_common_subexpressions
+from ufl.classes import IndexSum, ComponentTensor, Indexed
+from ufl.corealg.traversal import unique_pre_traversal
+
+
+def test_merge_subexpressions_with_different_bound_indices():
+    V = VectorElement("Lagrange", triangle, 1)
+    u = Coefficient(V)
+    w = Coefficient(V)
+
+    # Each lowering of inner binds new indices
+    a = apply_algebra_lowering(inner(grad(u), grad(w)))
+    b = apply_algebra_lowering(inner(grad(u), grad(w)))
+    assert a != b
+    e = exp(a) + b * dot(u, w)
+    r, report = eliminate_common_subexpressions(e, report=True)
+    assert report.nodes_after < report.nodes_before
+    assert report.nodes_after == len(set(unique_pre_traversal(r)))
+    # The lowered inner products are merged
+    sums = [o for o in unique_pre_traversal(r) if isinstance(o, IndexSum) and o.ufl_free_indices == ()]
+    assert len(set(sums)) == 1
+
+    # Subexpressions are merged between integrals of a form
+    form = eliminate_common_subexpressions(a * dx + b * ds)
+    integrands = [itg.integrand() for itg in form.integrals()]
+    assert integrands[0] == integrands[1]
+
+
+def test_collapse_indexed_component_tensor():
+    V = VectorElement("Lagrange", triangle, 1)
+    u = Coefficient(V)
+    f = Coefficient(FiniteElement("Lagrange", triangle, 1))
+    i, j = indices(2)
+    A = as_tensor(f * u[i], (i,))
+    r = eliminate_common_subexpressions(A[j] * u[j])
+    assert not any(isinstance(o, ComponentTensor) for o in unique_pre_traversal(r))
+
+    # Components are not collapsed, the tensor is shared between them
+    r = eliminate_common_subexpressions(A[0] * A[1])
+    assert isinstance(r.ufl_operands[0], Indexed)
+    assert r.ufl_operands[0].ufl_operands[0] == r.ufl_operands[1].ufl_operands[0]
+
+
+def test_eliminate_common_subexpressions_preserves_values():
+    V = VectorElement("Lagrange", triangle, 2)
+    u = Coefficient(V)
+    F = variable(Identity(2) + grad(u))
+    psi = tr(F.T * F) ** 2 + det(F)
+    e = apply_derivatives(apply_algebra_lowering(inner(diff(psi, F), grad(u)) + dot(F * u, F.T * u)))
+
+    def value(x, derivatives=()):
+        if derivatives == ():
+            return (x[0] ** 2 + 0.5 * x[1], x[0] * x[1] - 0.25)
+        elif derivatives == (0,):
+            return (2 * x[0], x[1])
+        elif derivatives == (1,):
+            return (0.5, x[0])
+        return (0.0, 0.0)
+
+    r, report = eliminate_common_subexpressions(e, report=True)
+    assert report.nodes_after < report.nodes_before
+    x = (0.3, 0.7)
+    assert abs(r(x, {u: value}) - e(x, {u: value})) < 1e-12
+
+
+def test_compute_form_data_eliminate_common_subexpressions():
+    V = VectorElement("Lagrange", triangle, 1)
+    u = Coefficient(V)
+    v = TestFunction(V)
+    F = derivative(tr(grad(u).T * grad(u)) ** 2 * dx + det(Identity(2) + grad(u)) * dx, u, v)
+
+    fd = compute_form_data(F)
+    assert not hasattr(fd, "cse_report")
+    fd = compute_form_data(F, do_apply_function_pullbacks=True, do_apply_geometry_lowering=True,
+                           do_apply_integral_scaling=True, do_eliminate_common_subexpressions=True,
+                           do_profile_passes=True)
+    assert fd.cse_report.nodes_after < fd.cse_report.nodes_before
+    assert "eliminate_common_subexpressions" in [p.name for p in fd.pass_profile.entries]
+    assert "nodes" in str(fd.cse_report)
@@ -364,3 +364,130 @@ def test_cofac():
 
 def test_inv():
     pass  # TODO
+
+
+def test_evaluate_batch():
+    import numpy
+    from ufl.algorithms import evaluate_batch
+    V = FiniteElement("CG", triangle, 1)
+    W = VectorElement("CG", triangle, 1)
+    f = Coefficient(V)
+    w = Coefficient(W)
+    x = SpatialCoordinate(triangle)
+    i, j = indices(2)
+
+    def eval_w(x, derivatives=()):
+        if not derivatives:
+            return (x[0] * x[1], x[0] + 2 * x[1])
+        d, = derivatives
+        if d == 0:
+            return (x[1], 1 + 0 * x[0])
+        return (x[0], 2 + 0 * x[0])
+
+    mapping = {f: lambda x: x[0] ** 2, w: eval_w}
+    points = numpy.array([(0.5, 1.5), (2.0, 0.3), (1.0, 1.0), (5.0, 7.0)])
+    expressions = [
+        3 * (x[0] + x[1]) - 7 + x[0] ** (x[1] / 2),
+        (x[i] * x[j]) * Identity(2)[i, j],
+        sin(x[0]) + exp(x[1]) * ln(x[0]) + sqrt(x[1]) + atan_2(x[0], x[1]),
+        as_matrix(outer(x, x)[i, j], (i, j))[0, 1] * f,
+        conditional(lt(x[0], 1.5), x[1], 2 * x[1]) + max_value(x[0], x[1]),
+        div(w) + inner(grad(w), grad(w).T) + dot(w, x) * f,
+        det(as_matrix([[x[0], 1], [2, x[1]]])),
+    ]
+    for s in expressions:
+        e = evaluate_batch(s, points, mapping)
+        v = [s(tuple(p), mapping) for p in points]
+        assert e.shape == (len(points),)
+        assert numpy.allclose(e, v)
+
+    # Values given as arrays per point or constant in all points
+    e = evaluate_batch(f * w[1], points, {f: numpy.arange(4.0), w: (2.0, 3.0)})
+    assert numpy.allclose(e, 3 * numpy.arange(4.0))
+
+    # Nonscalar expressions and components
+    e = evaluate_batch(as_vector((x[1], 2 * x[0])), points)
+    assert numpy.allclose(e, points[:, ::-1] * (1, 2))
+    e = evaluate_batch(as_vector((x[1], 2 * x[0])), points, component=(1,))
+    assert numpy.allclose(e, 2 * points[:, 0])
+
+    # Conditionals broadcast over the shape and free indices of the values
+    A = as_matrix([[x[0], 1], [2, x[1]]])
+    for s in [as_vector(conditional(lt(x[0], 1.5), A[i, j] * x[j], 2 * x[i]), i),
+              as_matrix(conditional(lt(x[0], 1.5), x[i] * x[j], 3 * A[j, i]), (i, j)),
+              conditional(gt(x[1], 1.0), A, A.T) * x]:
+        e = evaluate_batch(s, points)
+        v = [[s[k](tuple(p)) for k in numpy.ndindex(s.ufl_shape)] for p in points]
+        assert numpy.allclose(e.reshape(len(points), -1), v)
+
+
+def test_compile_expression():
+    import numpy
+    from ufl.algorithms import compile_expression, evaluate_batch
+    V = FiniteElement("CG", triangle, 1)
+    W = VectorElement("CG", triangle, 1)
+    f = Coefficient(V)
+    g = Coefficient(V)
+    w = Coefficient(W)
+    x = SpatialCoordinate(triangle)
+    i, j = indices(2)
+
+    def eval_w(x, derivatives=()):
+        if not derivatives:
+            return (x[0] * x[1], x[0] + 2 * x[1])
+        d, = derivatives
+        if d == 0:
+            return (x[1], 1 + 0 * x[0])
+        return (x[0], 2 + 0 * x[0])
+
+    mapping = {f: lambda x: x[0] ** 2, w: eval_w}
+    points = numpy.array([(0.5, 1.5), (2.0, 0.3), (1.0, 1.0), (5.0, 7.0)])
+    expressions = [
+        3 * (x[0] + x[1]) - 7 + x[0] ** (x[1] / 2),
+        (x[i] * x[j]) * Identity(2)[i, j],
+        sin(x[0]) + exp(x[1]) * ln(x[0]) + sqrt(x[1]) + atan_2(x[0], x[1]),
+        conditional(And(lt(x[0], 1.5), Not(eq(x[1], 1.0))), x[1], 2 * x[1]),
+        div(w) + inner(grad(w), grad(w).T) + dot(w, x) * f,
+        inv(outer(x, x) + Identity(2))[0, 1],
+    ]
+    for s in expressions:
+        c = compile_expression(s)
+        assert compile_expression(s) is c
+        for p in points:
+            assert c(tuple(p), mapping) == s(tuple(p), mapping)
+        assert numpy.allclose(c(points, mapping), evaluate_batch(s, points, mapping))
+
+    # Generated code is shared between expressions with equal signature
+    assert compile_expression(sin(f) * x[0]).source == compile_expression(sin(g) * x[0]).source
+    assert compile_expression(sin(g) * x[0])((1.0, 2.0), {g: 3.0}) == math.sin(3.0)
+
+    # Nonscalar expressions
+    c = compile_expression(as_vector((x[1], 2 * x[0])))
+    assert c((5, 7), component=(1,)) == 10
+    assert numpy.allclose(c(points), points[:, ::-1] * (1, 2))
+
+    # Only the selected branch of a conditional is evaluated in a point
+    for s in [conditional(gt(x[0], 0), 1 / x[0], 0),
+              conditional(lt(x[0], 0), sqrt(x[0]) + ln(x[0]), x[1])]:
+        assert compile_expression(s)((0.0, 1.0)) == s((0.0, 1.0))
+        assert compile_expression(s)((2.0, 1.0)) == s((2.0, 1.0))
+
+    # Points in 1D are given as an array of shape (N,)
+    x1 = SpatialCoordinate(interval)
+    points = numpy.array([0.5, 2.0, 3.0])
+    s = x1[0] ** 2 + 1
+    assert numpy.allclose(compile_expression(s)(points), evaluate_batch(s, points))
+
+
+def test_compiled_expression_cache_releases_expressions():
+    import gc
+    from ufl.algorithms.expression_compiler import compile_expression, _compiled_expressions
+    x = SpatialCoordinate(triangle)
+    expressions = [x[0] * (k + 2) + sin(x[1]) for k in range(5)]
+    for s in expressions:
+        compile_expression(s)
+    assert all(s in _compiled_expressions for s in expressions)
+    num_compiled = len(_compiled_expressions)
+    del s, expressions
+    gc.collect()
+    assert len(_compiled_expressions) == num_compiled - 5
@@ -134,3 +134,57 @@ def test_form_call():
         a = u*v*dx
         M = eval("(a @ f) @ g")
         assert M == g*f*dx
+
+
+def test_form_sum_is_lazy():
+    cell = triangle
+    domain = Mesh(cell)
+    V = FunctionSpace(domain, FiniteElement("Lagrange", cell, 1))
+    v = TestFunction(V)
+    u = TrialFunction(V)
+    fs = [Coefficient(V) for i in range(4)]
+    k = Constant(domain)
+
+    terms = [f * u * v * dx(i % 2) + f * u * v * ds for i, f in enumerate(fs)]
+    a = sum(terms)
+    b = Form([itg for term in terms for itg in term.integrals()])
+
+    # The metadata of the terms are not needed
+    assert a.integrals() == b.integrals()
+    assert a.arguments() == (v, u)
+    assert a.coefficients() == tuple(fs)
+    assert a.constants() == []
+    assert a.signature() == b.signature()
+
+    # Combining forms with known metadata merges it
+    for term in terms:
+        term.arguments()
+    c = k * (terms[0] - terms[1]) + terms[2]
+    assert c._analysis is None
+    assert c.arguments() == (v, u)
+    assert c.coefficients() == tuple(fs[:3])
+    assert c.constants() == [k]
+    assert c._analysis is None
+    assert (0 * terms[0]).arguments() == ()
+
+
+def test_form_sum_releases_terms():
+    import pickle
+    cell = triangle
+    V = FunctionSpace(Mesh(cell), FiniteElement("Lagrange", cell, 1))
+    v = TestFunction(V)
+    f = Coefficient(V)
+
+    # Long chains of sums pickle without deep recursion
+    a = sum((i + 1) * f * v * dx(i) for i in range(600))
+    b = pickle.loads(pickle.dumps(a))
+    assert b.integrals() == a.integrals()
+    assert b.arguments() == a.arguments() == (v,)
+
+    # Intermediate sums are released once the sum is collected
+    terms = [f * v * dx(0), f * v * dx(1), f * v * ds]
+    c = terms[0] + terms[1] + terms[2]
+    c.integrals()
+    assert c._merge_sources == tuple(terms)
+    c.arguments()
+    assert c._merge_sources is None
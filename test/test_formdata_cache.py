@@ -0,0 +1,79 @@
+#!/usr/bin/env py.test
+# -*- coding: utf-8 -*-
+
+import os
+
+from ufl import *
+from ufl.algorithms import compute_form_data
+from ufl.algorithms.formdata_cache import FormDataCache
+
+
+def _make_form(cell, mesh, c=1):
+    V = FunctionSpace(mesh, FiniteElement("Lagrange", cell, 2))
+    u = Coefficient(V)
+    f = Coefficient(V)
+    v = TestFunction(V)
+    F = (1 + u**2) * inner(grad(u), grad(v)) * dx - c * f * v * dx + u('+') * v('+') * dS
+    return F, u, f
+
+
+def test_formdata_cache_roundtrip(tmpdir):
+    cell = triangle
+    mesh = Mesh(VectorElement("Lagrange", cell, 1), ufl_id=7)
+    cache = FormDataCache(str(tmpdir))
+    c = Constant(mesh)
+
+    F, u, f = _make_form(cell, mesh, c)
+    fd = compute_form_data(F, cache=cache)
+    assert len(os.listdir(str(tmpdir))) == 1
+
+    # Same form with other coefficient objects hits the cache
+    F2, u2, f2 = _make_form(cell, mesh, c)
+    assert F2.signature() == F.signature()
+    fd2 = compute_form_data(F2, cache=cache)
+    assert fd2.original_form is F2
+    assert fd2.reduced_coefficients == [u2, f2]
+    assert set(fd2.function_replace_map.keys()) == {u2, f2}
+    assert [c.count() for c in fd2.function_replace_map.values()] == \
+        [c.count() for c in fd.function_replace_map.values()]
+    coeffs = set()
+    for itg_data in fd2.integral_data:
+        coeffs.update(itg_data.integral_coefficients)
+    assert coeffs == {u2, f2}
+    assert fd2.preprocessed_form == replace(fd.preprocessed_form, {u: u2, f: f2})
+
+    # Different parameters do not hit the same entry
+    compute_form_data(F2, cache=cache, do_apply_geometry_lowering=True)
+    assert len(os.listdir(str(tmpdir))) == 2
+
+
+def test_formdata_cache_other_domain_misses(tmpdir):
+    cell = triangle
+    cache = FormDataCache(str(tmpdir))
+    F, u, f = _make_form(cell, Mesh(VectorElement("Lagrange", cell, 1), ufl_id=1))
+    compute_form_data(F, cache=cache)
+
+    mesh = Mesh(VectorElement("Lagrange", cell, 1), ufl_id=2)
+    F2, u2, f2 = _make_form(cell, mesh)
+    assert F2.signature() == F.signature()
+    fd2 = compute_form_data(F2, cache=cache)
+    assert fd2.integral_data[0].domain == mesh
+
+
+def test_formdata_cache_profiling(tmpdir):
+    cell = triangle
+    cache = FormDataCache(str(tmpdir))
+    F, u, f = _make_form(cell, Mesh(VectorElement("Lagrange", cell, 1), ufl_id=3))
+    fd = compute_form_data(F, cache=cache, do_profile_passes=True, do_fuse_passes=True)
+    assert fd.pass_profile
+
+    # The profile of the run storing the data is not reused
+    fd2 = compute_form_data(F, cache=cache, do_fuse_passes=True)
+    assert fd2.original_form is F and fd2 is not fd
+    assert not hasattr(fd2, "pass_profile")
+    assert fd2.pass_fusion_report.groups() == fd.pass_fusion_report.groups()
+
+    # Profiling runs the passes instead of reading the cache
+    steps = []
+    fd3 = compute_form_data(F, cache=cache, profile_callback=steps.append)
+    assert steps and fd3.pass_profile
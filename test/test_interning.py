@@ -0,0 +1,68 @@
+#!/usr/bin/env py.test
+# -*- coding: utf-8 -*-
+
+import pickle
+
+import pytest
+
+from ufl import *
+from ufl.classes import Sum, Indexed
+from ufl.core.interning import enable_expr_interning, disable_expr_interning, \
+    interning_enabled, intern_table_size
+
+
+@pytest.fixture
+def interning():
+    enable_expr_interning()
+    yield
+    disable_expr_interning()
+
+
+def test_interned_operators_are_identical(interning):
+    V = VectorElement("Lagrange", triangle, 1)
+    u = Coefficient(V)
+    v = TestFunction(V)
+
+    a = inner(grad(u), grad(v)) + u[0]*v[1]
+    b = inner(grad(u), grad(v)) + u[0]*v[1]
+    assert a is b
+    assert isinstance(a, Sum)
+    assert u[0] is u[0]
+    assert isinstance(u[0], Indexed)
+    assert intern_table_size() > 0
+
+    # Reconstruction gives back the interned object
+    assert a._ufl_expr_reconstruct_(*a.ufl_operands) is a
+    assert pickle.loads(pickle.dumps(a)) == a
+
+    # Different terminal objects give different operators
+    w = Coefficient(V)
+    assert u[0] is not w[0]
+
+    # Equal terminals give the same operators, including free indices
+    i, j = indices(2)
+    assert u[i] is u[i] and u[i] is not u[j]
+    assert as_tensor(grad(u)[i, j], (j, i)) is as_tensor(grad(u)[i, j], (j, i))
+    assert (u[i] * v[i]) is (u[i] * v[i])
+    x = SpatialCoordinate(triangle)
+    assert 2 * x[i] is 2 * x[i]
+    assert SpatialCoordinate(triangle)[i] is x[i]
+
+
+def test_interning_can_be_disabled():
+    V = FiniteElement("Lagrange", triangle, 1)
+    f = Coefficient(V)
+    assert not interning_enabled()
+    assert f*f is not f*f
+
+    enable_expr_interning()
+    try:
+        assert interning_enabled()
+        assert f*f is f*f
+    finally:
+        disable_expr_interning()
+
+    assert not interning_enabled()
+    assert intern_table_size() == 0
+    assert f*f is not f*f
+    assert f*f == f*f
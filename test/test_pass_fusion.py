@@ -0,0 +1,146 @@
+#!/usr/bin/env py.test
+# -*- coding: utf-8 -*-
+
+from ufl import *
+from ufl.algorithms import compute_form_data
+from ufl.constantvalue import Zero
+from ufl.algorithms.renumbering import renumber_indices
+from ufl.algorithms.apply_algebra_lowering import LowerCompoundAlgebra
+from ufl.algorithms.apply_derivatives import DerivativeRuleDispatcher
+from ufl.algorithms.apply_restrictions import RestrictionPropagator
+from ufl.algorithms.remove_complex_nodes import ComplexNodeRemoval
+from ufl.algorithms.pass_fusion import (IntegrandPass, FormPass, plan_pass_fusion, apply_pass_pipeline,
+                                        unshare_integral_indices)
+from ufl.corealg.map_dag import map_expr_dag, map_expr_dags_fused
+
+
+def test_map_expr_dags_fused_matches_sequential():
+    cell = triangle
+    V = FiniteElement("Lagrange", cell, 2)
+    u = Coefficient(V)
+    v = TestFunction(V)
+    e = inner(grad(u**2), grad(v)) + dot(grad(u), grad(u)) * v
+
+    functions = [LowerCompoundAlgebra(), ComplexNodeRemoval(), DerivativeRuleDispatcher()]
+    expected = e
+    for f in functions:
+        expected = map_expr_dag(f, expected)
+    fused, = map_expr_dags_fused(functions, [e])
+    assert renumber_indices(fused) == renumber_indices(expected)
+
+
+def test_pass_fusion_plan():
+    passes = [IntegrandPass("lower", LowerCompoundAlgebra()),
+              IntegrandPass("complex", ComplexNodeRemoval()),
+              IntegrandPass("derivatives", DerivativeRuleDispatcher(), rejects=("derivative",)),
+              FormPass("identity", lambda form: form),
+              IntegrandPass("restrictions", RestrictionPropagator()),
+              IntegrandPass("complex", ComplexNodeRemoval()),
+              IntegrandPass("restrictions", RestrictionPropagator())]
+    steps, report = plan_pass_fusion(passes)
+    assert report.groups() == [("lower", "complex", "derivatives"),
+                               ("restrictions", "complex"),
+                               ("restrictions",)]
+    assert report.fused() == ["complex", "derivatives", "complex"]
+    assert "Restricted" in report.entries[-1][2]
+
+
+def test_pass_pipeline_zero_integrals():
+    V = FiniteElement("Lagrange", triangle, 1)
+    v = TestFunction(V)
+    form = v * dx + v * ds
+
+    def zero_facets(integral_type):
+        if integral_type == "exterior_facet":
+            return lambda e: Zero(e.ufl_shape, e.ufl_free_indices, e.ufl_index_dimensions)
+        return lambda e: e
+
+    # Zero integrals are removed unless all passes of a group keep them
+    zero_pass = IntegrandPass("zero", zero_facets)
+    keep_zero_pass = IntegrandPass("zero", zero_facets, keeps_zero_integrals=True)
+    complex_pass = IntegrandPass("complex", ComplexNodeRemoval())
+    assert len(apply_pass_pipeline([zero_pass], form)[0].integrals()) == 1
+    assert len(apply_pass_pipeline([keep_zero_pass], form)[0].integrals()) == 2
+    assert len(apply_pass_pipeline([keep_zero_pass, complex_pass], form)[0].integrals()) == 1
+
+
+def test_compute_form_data_with_fused_passes():
+    cell = triangle
+    V = VectorElement("Lagrange", cell, 1)
+    u = Coefficient(V)
+    v = TestFunction(V)
+    F = inner(grad(u) * grad(u).T, grad(v)) * dx + inner(avg(u), jump(v)) * dS
+    a = derivative(F, u)
+
+    for form in (F, a):
+        kwargs = dict(do_apply_function_pullbacks=True,
+                      do_apply_integral_scaling=True,
+                      do_apply_geometry_lowering=True)
+        fd = compute_form_data(form, **kwargs)
+        fd_fused = compute_form_data(form, do_fuse_passes=True, **kwargs)
+        assert repr(renumber_indices(fd.preprocessed_form)) == \
+            repr(renumber_indices(fd_fused.preprocessed_form))
+        assert len(fd_fused.pass_fusion_report.groups()) < \
+            len(fd_fused.pass_fusion_report.entries)
+
+
+def _integral_indices(form):
+    from ufl.classes import MultiIndex, Index
+    from ufl.corealg.traversal import unique_pre_traversal
+    return [set(i for o in unique_pre_traversal(itg.integrand()) if isinstance(o, MultiIndex)
+                for i in o if isinstance(i, Index))
+            for itg in form.integrals()]
+
+
+def test_compute_form_data_share_integrals():
+    cell = triangle
+    V = VectorElement("Lagrange", cell, 1)
+    u = Coefficient(V)
+    v = TestFunction(V)
+    F = sum(inner(dot(grad(u), u) * (i + 1), v) * ds(i) for i in range(4))
+    a = derivative(F, u)
+
+    kwargs = dict(do_apply_function_pullbacks=True,
+                  do_apply_integral_scaling=True,
+                  do_apply_geometry_lowering=True)
+    for fuse in (False, True):
+        fd = compute_form_data(a, do_fuse_passes=fuse, **kwargs)
+        fd_shared = compute_form_data(a, do_fuse_passes=fuse, do_share_integrals=True, **kwargs)
+        assert fd_shared.preprocessed_form.signature() == fd.preprocessed_form.signature()
+        assert [renumber_indices(itg.integrand()) for itg in fd_shared.preprocessed_form.integrals()] == \
+            [renumber_indices(itg.integrand()) for itg in fd.preprocessed_form.integrals()]
+
+        # By default each integral has its own indices
+        indices = _integral_indices(fd.preprocessed_form)
+        assert not any(indices[0] & s for s in indices[1:])
+        indices = _integral_indices(fd_shared.preprocessed_form)
+        assert any(indices[0] & s for s in indices[1:])
+        unshared = unshare_integral_indices(fd_shared.preprocessed_form)
+        assert repr(renumber_indices(unshared)) == repr(renumber_indices(fd.preprocessed_form))
+
+
+def test_compute_form_data_in_parallel():
+    from concurrent.futures import ProcessPoolExecutor
+    cell = triangle
+    V = VectorElement("Lagrange", cell, 1)
+    u = Coefficient(V)
+    v = TestFunction(V)
+    F = (inner(grad(u) * grad(u).T, grad(v)) * dx + inner(avg(u), jump(v)) * dS +
+         sum(inner(dot(grad(u), u) * (i + 1), v) * ds(i) for i in range(4)))
+    a = derivative(F, u)
+
+    kwargs = dict(do_apply_function_pullbacks=True,
+                  do_apply_integral_scaling=True,
+                  do_apply_geometry_lowering=True)
+    with ProcessPoolExecutor(2) as executor:
+        for form in (F, a):
+            for fuse in (False, True):
+                fd = compute_form_data(form, do_fuse_passes=fuse, **kwargs)
+                fd_parallel = compute_form_data(form, do_fuse_passes=fuse, executor=executor, **kwargs)
+                assert fd_parallel.preprocessed_form.signature() == fd.preprocessed_form.signature()
+                assert repr(renumber_indices(fd_parallel.preprocessed_form)) == \
+                    repr(renumber_indices(fd.preprocessed_form))
+                assert [(d.integral_type, d.subdomain_id, d.enabled_coefficients)
+                        for d in fd_parallel.integral_data] == \
+                    [(d.integral_type, d.subdomain_id, d.enabled_coefficients)
+                     for d in fd.integral_data]
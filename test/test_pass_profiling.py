@@ -0,0 +1,55 @@
+#!/usr/bin/env py.test
+# -*- coding: utf-8 -*-
+
+from ufl import *
+from ufl.algorithms import compute_form_data
+from ufl.algorithms.remove_complex_nodes import ComplexNodeRemoval
+from ufl.corealg.map_dag import map_expr_dag, collect_map_statistics
+
+
+def test_collect_map_statistics():
+    V = FiniteElement("Lagrange", triangle, 1)
+    u = Coefficient(V)
+    e = conj(u) * u + exp(u * u)
+
+    with collect_map_statistics() as outer:
+        map_expr_dag(ComplexNodeRemoval(), e)
+        with collect_map_statistics() as inner_statistics:
+            map_expr_dag(ComplexNodeRemoval(), e)
+    assert inner_statistics.calls == 1
+    assert outer.calls == 2
+    assert outer.nodes == 2 * inner_statistics.nodes > 0
+    # Removing conj makes the two products equal
+    assert inner_statistics.rcache_hits > 0
+    assert 0.0 < inner_statistics.rcache_hit_ratio() < 1.0
+
+
+def test_compute_form_data_pass_profile():
+    V = FiniteElement("Lagrange", triangle, 2)
+    u = Coefficient(V)
+    v = TestFunction(V)
+    F = inner(grad(u**2), grad(v)) * dx + u * v * ds
+
+    fd = compute_form_data(F)
+    assert not hasattr(fd, "pass_profile")
+
+    profiles = []
+    fd = compute_form_data(F, profile_callback=profiles.append)
+    entries = fd.pass_profile.entries
+    assert entries == profiles
+    names = [p.name for p in entries]
+    assert names[:3] == ["apply_algebra_lowering", "remove_complex_nodes", "apply_derivatives"]
+    assert names[-2:] == ["build_integral_data", "check_form_arity"]
+    for p in entries[:-2]:
+        assert p.time >= 0.0
+        assert p.nodes_in > 0 and p.nodes_out > 0
+        assert p.peak_dag_size <= max(p.nodes_in, p.nodes_out)
+    derivatives = entries[2]
+    assert derivatives.statistics.calls > 0
+    assert derivatives.nodes_out > derivatives.nodes_in
+    assert derivatives.as_dict()["nodes_mapped"] == derivatives.statistics.nodes
+    assert fd.pass_profile.total_time() >= fd.pass_profile.slowest().time
+    assert "apply_derivatives" in str(fd.pass_profile)
+
+    fd = compute_form_data(F, do_profile_passes=True, do_fuse_passes=True)
+    assert fd.pass_profile.entries[0].name == "apply_algebra_lowering+remove_complex_nodes+apply_derivatives"
@@ -551,3 +551,20 @@ def testFormData():
     form_data_restore = pickle.loads(form_data_pickle)
 
     assert(str(form_data) == str(form_data_restore))
+
+
+def testSortKeyNotPickled():
+    from ufl.sorting import expr_sort_key
+
+    element = FiniteElement("Lagrange", "triangle", 1)
+    f = Coefficient(element)
+    e = sin(f) * f + f**2
+
+    e_pickle = pickle.dumps(e, p)
+    key = expr_sort_key(e)
+    assert(pickle.dumps(e, p) == e_pickle)
+
+    e_restore = pickle.loads(e_pickle)
+    assert(e_restore == e)
+    assert(e_restore._sort_key is None)
+    assert(expr_sort_key(e_restore) == key)
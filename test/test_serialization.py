@@ -0,0 +1,59 @@
+#!/usr/bin/env py.test
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from ufl import *
+from ufl.algorithms import compute_form_data
+from ufl.algorithms.serialization import dumps, loads, dump, load
+
+
+def test_serialize_expression_preserves_sharing():
+    element = FiniteElement("Lagrange", triangle, 1)
+    f = Coefficient(element)
+    x = SpatialCoordinate(triangle)
+    a = sin(f * x[0]) + exp(x[1])
+    e = a * a + cos(a)
+
+    r = loads(dumps(e))
+    assert r == e and r is not e
+    p, c = r.ufl_operands
+    assert p.ufl_operands[0] is p.ufl_operands[1] is c.ufl_operands[0]
+
+
+def test_serialize_deep_expression():
+    f = Coefficient(FiniteElement("Lagrange", triangle, 1))
+    e = f
+    for i in range(5000):
+        e = sin(e) + f
+    assert loads(dumps(e)) == e
+
+
+def test_serialize_preprocessed_form(tmpdir):
+    element = VectorElement("Lagrange", tetrahedron, 2)
+    u = Coefficient(element)
+    v = TestFunction(element)
+    du = TrialFunction(element)
+    F = variable(Identity(3) + grad(u))
+    psi = exp(tr(F.T * F))
+    L = inner(diff(psi, F), grad(v)) * dx + inner(u, v) * ds(1, degree=2)
+    form = compute_form_data(derivative(L, u, du), do_apply_function_pullbacks=True,
+                             do_apply_integral_scaling=True, do_apply_geometry_lowering=True,
+                             do_estimate_degrees=True).preprocessed_form
+
+    data = dumps(form)
+    r = loads(data)
+    assert r.equals(form)
+    assert r.signature() == form.signature()
+    assert [itg.metadata() for itg in r.integrals()] == [itg.metadata() for itg in form.integrals()]
+
+    filename = str(tmpdir.join("form.ufl.bin"))
+    with open(filename, "wb") as f:
+        dump(form, f)
+    with open(filename, "rb") as f:
+        assert load(f).equals(form)
+    with open(filename, "rb") as f:
+        assert load(f, use_mmap=True).equals(form)
+
+    with pytest.raises(Exception):
+        loads(b"not ufl data")
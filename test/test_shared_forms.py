@@ -0,0 +1,66 @@
+#!/usr/bin/env py.test
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+
+import pytest
+
+from ufl import *
+from ufl.algorithms import compute_form_data
+
+pytest.importorskip("multiprocessing.shared_memory")
+
+from ufl.algorithms.shared_forms import publish_form, attach_form  # noqa: E402
+
+
+def _form():
+    element = VectorElement("Lagrange", triangle, 2)
+    u = Coefficient(element)
+    v = TestFunction(element)
+    du = TrialFunction(element)
+    F = Identity(2) + grad(u)
+    L = exp(tr(F.T * F)) * inner(F, grad(v)) * dx + inner(u, v) * ds(1)
+    return derivative(L, u, du)
+
+
+def _signature(name):
+    with attach_form(name) as shared:
+        return shared.form().signature()
+
+
+def test_publish_and_attach_form():
+    form = _form()
+    with publish_form(form) as segment:
+        with attach_form(segment.name) as shared:
+            assert shared.kind == "form"
+            assert shared.form().equals(form)
+            assert shared.form() is shared.form()
+            with pytest.raises(Exception):
+                shared.integral_data()
+
+        # Workers attach by name
+        ctx = multiprocessing.get_context("fork")
+        with ctx.Pool(2) as pool:
+            signatures = pool.map(_signature, [segment.name] * 3)
+        assert signatures == [form.signature()] * 3
+
+
+def test_publish_and_attach_integral_data():
+    fd = compute_form_data(_form(), do_apply_function_pullbacks=True,
+                           do_apply_integral_scaling=True, do_apply_geometry_lowering=True,
+                           do_estimate_degrees=True)
+    with publish_form(fd.integral_data) as segment:
+        with attach_form(segment.name) as shared:
+            assert shared.num_integral_data() == 2
+            # Only the integrands of the accessed integral data are built
+            itg_data = shared.integral_data(1)
+            reader = shared._reader
+            assert reader._nodes[reader._roots[0]] is None
+            assert itg_data == fd.integral_data[1]
+            assert itg_data.enabled_coefficients == fd.integral_data[1].enabled_coefficients
+        with pytest.raises(Exception):
+            shared.integral_data(0)
+        assert shared.integral_data(1) is itg_data
+
+        with attach_form(segment.name) as shared:
+            assert shared.integral_data() == fd.integral_data
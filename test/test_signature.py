@@ -506,3 +506,62 @@ def test_signature_of_forms_change_with_operators(self):
                 a = f*dx
                 yield a
     check_unique_signatures(forms())
+
+
+def test_signature_of_shared_subexpressions(self):
+    cell = triangle
+    V = FiniteElement("CG", cell, 1)
+    u = Coefficient(V)
+    v = Coefficient(V)
+
+    # Deep DAG with heavy sharing, the signature computation
+    # must scale with the DAG size
+    e = u
+    for k in range(40):
+        e = e*e + e
+    a = e*dx
+    b = e*dx + v*ds
+    self.assertTrue(a.signature() != b.signature())
+
+    # Index numbering is canonical within each integrand
+    i, j, k = indices(3)
+    w = as_vector((u, v))
+    s1 = w[i]*w[i]
+    s2 = w[j]*w[j]
+    s3 = w[k]*w[k]
+    self.assertEqual((s1*dx).signature(), (s2*dx).signature())
+    self.assertEqual((s1*dx + s2*ds).signature(), (s3*dx + s3*ds).signature())
+
+    # Coefficient renumbering is reflected in reused integrand digests
+    f = u*v*v*dx
+    g = v*u*u*dx
+    self.assertTrue(f.signature() != (f + g).signature())
+    self.assertEqual(replace(f, {u: v, v: u}).signature(), g.signature())
+
+
+def test_signature_digests_are_reused_across_forms(self):
+    from ufl.algorithms import signature
+    cell = triangle
+    V = FiniteElement("CG", cell, 1)
+    u = Coefficient(V)
+    e = u
+    for k in range(10):
+        e = e*e + e
+    a = e*dx
+    a.signature()
+    entry = signature._node_digests[e]
+
+    # Adding a coefficient does not change the numbers of the
+    # coefficients of e, so its digest is reused
+    w = Coefficient(V)
+    b = e*dx + w*ds
+    self.assertTrue(a.signature() != b.signature())
+    self.assertTrue(signature._node_digests[e] is entry)
+
+    # Renumbering the coefficients of e recomputes its digest
+    domain = u.ufl_domain()
+    d0 = signature.compute_expression_digest(e, {domain: 0, u: 0})
+    d1 = signature.compute_expression_digest(e, {domain: 0, u: 1})
+    self.assertTrue(d0 != d1)
+    self.assertTrue(signature._node_digests[e] is not entry)
+    self.assertEqual(signature.compute_expression_digest(e, {domain: 0, u: 0}), d0)
@@ -0,0 +1,93 @@
+#!/usr/bin/env py.test
+# -*- coding: utf-8 -*-
+
+from ufl import *
+from ufl.algorithms import compute_form_data
+from ufl.algorithms.simplification import simplify, Simplifier, default_rules, _factors
+from ufl.classes import Zero, Product, IndexSum, Indexed, ComponentTensor, MultiIndex, FixedIndex, Exp
+from ufl.corealg.map_dag import map_expr_dag
+from ufl.corealg.traversal import unique_pre_traversal
+
+
+def test_fold_constants_and_combine_terms():
+    V = FiniteElement("Lagrange", triangle, 1)
+    f = Coefficient(V)
+    g = Coefficient(V)
+
+    assert simplify(f - f) == Zero()
+    assert simplify((f + 1) - (1 + f)) == Zero()
+    assert simplify(f + 2 + (3 * f + 4) - 4 * f) == 6
+    assert simplify(f * g + 2 * (g * f)) == 3 * (f * g)
+    r = simplify(Product(Product(as_ufl(2), f), Product(as_ufl(3), g)))
+    assert set(_factors(r)) == {as_ufl(6), f, g}
+    assert simplify(conditional(lt(as_ufl(1), 2), f, g)) == f
+    assert simplify(sin(f) + 1) == sin(f) + 1
+
+    # Rules apply in the whole form
+    form = simplify((f - f) * dx + (f + f) * g * ds)
+    assert len(form.integrals()) == 1
+    assert form.integrals()[0].integrand() == 2 * f * g
+
+
+def test_collapse_indexed_tensors_and_contract_identity():
+    V = VectorElement("Lagrange", triangle, 1)
+    u = Coefficient(V)
+    f = Coefficient(FiniteElement("Lagrange", triangle, 1))
+    i, j, k = indices(3)
+
+    r = simplify(as_tensor(f * u[i], (i,))[j] * u[j])
+    assert not any(isinstance(o, ComponentTensor) for o in unique_pre_traversal(r))
+    assert simplify(as_tensor(grad(u)[i, j], (j, i))[0, 1]) == grad(u)[1, 0]
+    assert simplify(Indexed(as_vector([f, 2 * f]), MultiIndex((FixedIndex(1),))) + f) == 3 * f
+    assert simplify(Indexed(Identity(2), MultiIndex((FixedIndex(0), FixedIndex(1)))) * f) == Zero()
+
+    e = IndexSum(Product(grad(u)[i, j], Indexed(Identity(2), MultiIndex((j, k)))), MultiIndex((j,)))
+    assert simplify(e) == grad(u)[i, k]
+
+
+def test_simplify_preserves_values():
+    V = VectorElement("Lagrange", triangle, 1)
+    u = Coefficient(V)
+    F = Identity(2) + grad(u)
+    e = tr(F.T * F) - tr(F * F.T) + det(F) * (1 + dot(u, u)) - dot(u, u) * det(F)
+    e = compute_form_data(e * dx).preprocessed_form.integrals()[0].integrand()
+
+    def value(x, derivatives=()):
+        if derivatives == ():
+            return (x[0] ** 2 + 0.5 * x[1], x[0] * x[1] - 0.25)
+        elif derivatives == (0,):
+            return (2 * x[0], x[1])
+        elif derivatives == (1,):
+            return (0.5, x[0])
+        return (0.0, 0.0)
+
+    r = simplify(e)
+    x = (0.3, 0.7)
+    assert abs(r(x, {u: value}) - e(x, {u: value})) < 1e-12
+
+
+def test_simplifier_rules_and_budget():
+    V = FiniteElement("Lagrange", triangle, 1)
+    f = Coefficient(V)
+    e = exp(f) * exp(f)
+
+    # Custom rules are registered per expression class
+    def exp_product(o):
+        a, b = o.ufl_operands
+        if isinstance(a, Exp) and isinstance(b, Exp):
+            return exp(a.ufl_operands[0] + b.ufl_operands[0])
+
+    rules = default_rules + [(Product, exp_product)]
+    simplifier = Simplifier(rules)
+    assert map_expr_dag(simplifier, e) == exp(f + f)
+    assert simplifier.rewrites == 1
+    assert simplify(e, rules=rules) == exp(2 * f)
+
+    # The budget bounds the number of rewrites
+    e = sin(f - f) + cos(2 * f - 2 * f)
+    assert simplify(e) == 1
+    assert simplify(e, budget=1) != 1
+
+    fd = compute_form_data((f - f + 1) * f * dx, do_simplify=True, do_profile_passes=True)
+    assert fd.preprocessed_form.integrals()[0].integrand() == f
+    assert "simplify" in [p.name for p in fd.pass_profile.entries]
@@ -101,5 +101,61 @@ def test_str_list_matrix_with_zero():
     assert str(v) == ("[\n  [%s, %s],\n%s\n]" % (a, b, c))
 
 
+def test_repr_deeply_nested_expression():
+    x, y = SpatialCoordinate(triangle)
+    e = x
+    for i in range(3000):
+        e = sin(e)
+    r = repr(e)
+    assert r.startswith("Sin(Sin(") and r.count("Sin(") == 3000
+    s = str(e)
+    assert s.startswith("sin(sin(") and s.count("sin(") == 3000
+
+
+def test_dag_repr_and_str():
+    from ufl.algorithms import dag_repr, dag_str
+    f = Coefficient(FiniteElement("Lagrange", triangle, 1))
+    x, y = SpatialCoordinate(triangle)
+    assert dag_str(2*x) == str(2*x)
+    assert dag_repr(2*x) == repr(2*x)
+    assert dag_repr(x + y).startswith("let\n  e0 = SpatialCoordinate(")
+
+    a = sin(x * f) + cos(y)
+    e = a * a + a
+    assert dag_str(e) == "let\n  e0 = %s\nin e0 + e0 * e0" % (a,)
+    r = dag_repr(e)
+    assert r.count(repr(f)) == 1
+    assert r.endswith("in Sum(e1, Product(e1, e1))")
+
+    # The bindings are linear in the unique nodes, while str is
+    # exponential
+    for i in range(40):
+        e = e * e + e
+    lines = dag_str(e).split("\n")
+    assert len(lines) == 23 and len(lines[-1]) < 100
+    s = dag_str(e, max_length=100)
+    assert len(s) < 400 and s.endswith("...")
+
+
+def test_ufl_err_str_is_truncated():
+    from ufl.core.expr import ufl_err_str
+    x, y = SpatialCoordinate(triangle)
+    assert ufl_err_str(2*x) == str(2*x)
+    assert ufl_err_str([x, 2*y]) == "[%s, %s]" % (x, 2*y)
+    e = sin(x) + y
+    for i in range(100):
+        e = e * e + e
+    assert len(ufl_err_str(e)) < 1000
+    assert len(ufl_err_str(e*dx)) < 1000
+    assert ufl_err_str(e*dx).startswith("{ let\n")
+
+
+def test_str_nested_list_tensor():
+    x, y = SpatialCoordinate(triangle)
+    t = as_tensor([[[x, 1], [2, 3]], [[4, 5], [6, y]]])
+    assert str(t) == ("[\n  [\n    [%s, 1],\n    [2, 3]\n  ],\n"
+                      "  [\n    [4, 5],\n    [6, %s]\n  ]\n]" % (x, y))
+
+
 # FIXME: Add more tests for tensors collapsing
 #        partly or completely into Zero!
@@ -222,6 +222,7 @@ A very brief overview of the language contents follows:
     - energy_norm,
     - sensitivity_rhs
     - derivative
+    - reverse_derivative
 """
 
 # Copyright (C) 2008-2016 Martin Sandve Alnæs and Anders Logg
@@ -343,7 +344,7 @@ from ufl.integral import Integral
 import ufl.measureoperators as __measureoperators
 
 # Representations of transformed forms
-from ufl.formoperators import replace, derivative, action, energy_norm, rhs, lhs,\
+from ufl.formoperators import replace, derivative, reverse_derivative, action, energy_norm, rhs, lhs,\
 system, functional, adjoint, sensitivity_rhs, extract_blocks #, dirichlet_functional
 
 # Predefined convenience objects
@@ -407,7 +408,7 @@ __all__ = [
     'elem_mult', 'elem_div', 'elem_pow', 'elem_op',
     'Form',
     'Integral', 'Measure', 'register_integral_type', 'integral_types', 'custom_integral_types',
-    'replace', 'replace_integral_domains', 'derivative', 'action', 'energy_norm', 'rhs', 'lhs', 'extract_blocks',
+    'replace', 'replace_integral_domains', 'derivative', 'reverse_derivative', 'action', 'energy_norm', 'rhs', 'lhs', 'extract_blocks',
     'system', 'functional', 'adjoint', 'sensitivity_rhs',
     'dx', 'ds', 'dS', 'dP',
     'dc', 'dC', 'dO', 'dI', 'dX',
@@ -16,8 +16,7 @@ from ufl.core.operator import Operator
 from ufl.constantvalue import Zero, zero, ScalarValue, IntValue, ComplexValue, as_ufl
 from ufl.checks import is_ufl_scalar, is_true_ufl_scalar
 from ufl.index_combination_utils import merge_unique_indices
-from ufl.sorting import sorted_expr
-from ufl.precedence import parstr
+from ufl.sorting import cmp_expr
 
 # --- Algebraic operators ---
 
@@ -70,7 +69,8 @@ class Sum(Operator):
         else:
             # Otherwise sort operands in a canonical order
             # operands = (b, a)
-            a, b = sorted_expr((a, b))
+            if cmp_expr(b, a) < 0:
+                a, b = b, a
 
         # construct and initialize a new Sum object
         self = Operator.__new__(cls)
@@ -87,27 +87,8 @@ class Sum(Operator):
         return sum(o.evaluate(x, mapping, component,
                               index_values) for o in self.ufl_operands)
 
-    def __str__(self):
-        ops = [parstr(o, self) for o in self.ufl_operands]
-        if False:
-            # Implementation with line splitting:
-            limit = 70
-            delimop = " + \\\n    + "
-            op = " + "
-            s = ops[0]
-            n = len(s)
-            for o in ops[1:]:
-                m = len(o)
-                if n + m > limit:
-                    s += delimop
-                    n = m
-                else:
-                    s += op
-                    n += m
-                s += o
-            return s
-        # Implementation with no line splitting:
-        return "%s" % " + ".join(ops)
+    def _ufl_str_(self, operands, paroperands):
+        return " + ".join(paroperands)
 
 
 @ufl_type(num_ops=2,
@@ -155,7 +136,8 @@ class Product(Operator):
         else:  # a * b = b * a
             # Sort operands in a semi-canonical order
             # (NB! This is fragile! Small changes here can have large effects.)
-            a, b = sorted_expr((a, b))
+            if cmp_expr(b, a) < 0:
+                a, b = b, a
 
         # Construction
         self = Operator.__new__(cls)
@@ -193,9 +175,8 @@ class Product(Operator):
             tmp *= o.evaluate(x, mapping, (), index_values)
         return tmp
 
-    def __str__(self):
-        a, b = self.ufl_operands
-        return " * ".join((parstr(a, self), parstr(b, self)))
+    def _ufl_str_(self, operands, paroperands):
+        return " * ".join(paroperands)
 
 
 @ufl_type(num_ops=2,
@@ -259,9 +240,8 @@ class Division(Operator):
             e = complex(a) / complex(b)
         return e
 
-    def __str__(self):
-        return "%s / %s" % (parstr(self.ufl_operands[0], self),
-                            parstr(self.ufl_operands[1], self))
+    def _ufl_str_(self, operands, paroperands):
+        return "%s / %s" % paroperands
 
 
 @ufl_type(num_ops=2,
@@ -316,9 +296,8 @@ class Power(Operator):
         b = b.evaluate(x, mapping, component, index_values)
         return a**b
 
-    def __str__(self):
-        a, b = self.ufl_operands
-        return "%s ** %s" % (parstr(a, self), parstr(b, self))
+    def _ufl_str_(self, operands, paroperands):
+        return "%s ** %s" % paroperands
 
 
 @ufl_type(num_ops=1,
@@ -347,9 +326,8 @@ class Abs(Operator):
         a = self.ufl_operands[0].evaluate(x, mapping, component, index_values)
         return abs(a)
 
-    def __str__(self):
-        a, = self.ufl_operands
-        return "|%s|" % (parstr(a, self),)
+    def _ufl_str_(self, operands, paroperands):
+        return "|%s|" % paroperands
 
 
 @ufl_type(num_ops=1,
@@ -377,9 +355,8 @@ class Conj(Operator):
         a = self.ufl_operands[0].evaluate(x, mapping, component, index_values)
         return a.conjugate()
 
-    def __str__(self):
-        a, = self.ufl_operands
-        return "conj(%s)" % (parstr(a, self),)
+    def _ufl_str_(self, operands, paroperands):
+        return "conj(%s)" % paroperands
 
 
 @ufl_type(num_ops=1,
@@ -409,9 +386,8 @@ class Real(Operator):
         a = self.ufl_operands[0].evaluate(x, mapping, component, index_values)
         return a.real
 
-    def __str__(self):
-        a, = self.ufl_operands
-        return "Re[%s]" % (parstr(a, self),)
+    def _ufl_str_(self, operands, paroperands):
+        return "Re[%s]" % paroperands
 
 
 @ufl_type(num_ops=1,
@@ -439,6 +415,5 @@ class Imag(Operator):
         a = self.ufl_operands[0].evaluate(x, mapping, component, index_values)
         return a.imag
 
-    def __str__(self):
-        a, = self.ufl_operands
-        return "Im[%s]" % (parstr(a, self),)
+    def _ufl_str_(self, operands, paroperands):
+        return "Im[%s]" % paroperands
@@ -35,6 +35,7 @@ __all__ = [
     "expand_indices",
     "replace",
     "expand_derivatives",
+    "compute_reverse_derivatives",
     "extract_coefficients",
     "strip_variables",
     "post_traversal",
@@ -51,6 +52,10 @@ __all__ = [
     "compute_form_functional",
     "compute_form_signature",
     "tree_format",
+    "dag_repr",
+    "dag_str",
+    "evaluate_batch",
+    "compile_expression",
 ]
 
 # Utilities for traversing over expression trees in different ways
@@ -114,6 +119,11 @@ from ufl.algorithms.formsplitter import FormSplitter
 
 # Utilities for Automatic Functional Differentiation
 from ufl.algorithms.ad import expand_derivatives
+from ufl.algorithms.apply_reverse_derivatives import compute_reverse_derivatives
+
+# Vectorized evaluation of expressions in many points
+from ufl.algorithms.batch_evaluation import evaluate_batch
+from ufl.algorithms.expression_compiler import compile_expression
 
 # Utilities for form file handling
 from ufl.algorithms.formfiles import read_ufl_file
@@ -122,4 +132,4 @@ from ufl.algorithms.formfiles import load_forms
 
 # Utilities for UFL object printing
 # from ufl.formatting.printing import integral_info, form_info
-from ufl.formatting.printing import tree_format
+from ufl.formatting.printing import tree_format, dag_repr, dag_str
@@ -19,8 +19,14 @@ from ufl.core.terminal import Terminal, FormArgument
 from ufl.argument import Argument
 from ufl.coefficient import Coefficient
 from ufl.constant import Constant
+from ufl.geometry import GeometricQuantity
+from ufl.differentiation import CompoundDerivative
+from ufl.restriction import Restricted
+from ufl.domain import join_domains, sort_domains
+from ufl.form import Form
 from ufl.algorithms.traversal import iter_expressions
-from ufl.corealg.traversal import unique_pre_traversal, traverse_unique_terminals
+from ufl.corealg.traversal import unique_pre_traversal, unique_post_traversal, traverse_unique_terminals
+from ufl.corealg.dag_snapshot import DAGSnapshot
 
 
 # TODO: Some of these can possibly be optimised by implementing
@@ -41,6 +47,129 @@ def unique_tuple(objects):
     return tuple(unique_objects)
 
 
+# --- Analysis of all properties of a form in a single traversal ---
+
+class FormAnalysis(object):
+    """Properties of a Form, Integral or Expr collected in a single
+    traversal of the unique nodes of all its expressions.
+
+    The analysis of a form is cached, see ``Form.analysis``, and used by
+    the extraction functions of this module when given a form.
+    """
+
+    def __init__(self, a):
+        self._integration_domains = ()
+        if isinstance(a, Form):
+            self._integration_domains = tuple(itg.ufl_domain() for itg in a.integrals())
+
+        # Terminal objects for each terminal class, using the Python
+        # class such that subclasses not registered as ufl types are
+        # told apart from their base class
+        terminals = {}
+        # Classes of the operators
+        operator_classes = set()
+        # Maximal nesting of spatial derivatives below each node, only
+        # stored for nodes with nonzero order
+        orders = {}
+        restrictions = set()
+        max_order = 0
+
+        visited = set()
+        for e in iter_expressions(a):
+            for o in unique_post_traversal(e, visited):
+                cls = type(o)
+                if o._ufl_is_terminal_:
+                    objects = terminals.get(cls)
+                    if objects is None:
+                        objects = set()
+                        terminals[cls] = objects
+                    objects.add(o)
+                    continue
+                operator_classes.add(cls)
+                order = 0
+                if orders:
+                    for op in o.ufl_operands:
+                        k = orders.get(op)
+                        if k is not None and k > order:
+                            order = k
+                if issubclass(cls, CompoundDerivative):
+                    order += 1
+                elif issubclass(cls, Restricted):
+                    restrictions.add(o.side())
+                if order:
+                    orders[o] = order
+                    max_order = max(max_order, order)
+
+        self._terminals = terminals
+        self._operator_classes = operator_classes
+        self._restrictions = restrictions
+        self._max_derivative_order = max_order
+
+        # Derived quantities, computed on first request
+        self._arguments_and_coefficients = None
+        self._domains = None
+
+    def terminals(self, ufl_type):
+        "Return the set of terminals of class ufl_type or its subclasses."
+        return set(o for cls, objects in self._terminals.items()
+                   if issubclass(cls, ufl_type) for o in objects)
+
+    def has_type(self, ufl_type):
+        "Return if an object of class ufl_type is found."
+        classes = self._terminals if issubclass(ufl_type, Terminal) else self._operator_classes
+        return any(issubclass(cls, ufl_type) for cls in classes)
+
+    def arguments_and_coefficients(self):
+        "Return sorted lists of the arguments and coefficients, see ``extract_arguments_and_coefficients``."
+        if self._arguments_and_coefficients is None:
+            self._arguments_and_coefficients = _checked_arguments_and_coefficients(self.terminals(FormArgument))
+        arguments, coefficients = self._arguments_and_coefficients
+        return list(arguments), list(coefficients)
+
+    def constants(self):
+        "Return a sorted list of the constants."
+        return sorted_by_count(self.terminals(Constant))
+
+    def elements(self):
+        "Return a tuple of the elements of the arguments and coefficients, see ``extract_elements``."
+        arguments, coefficients = self.arguments_and_coefficients()
+        return tuple(f.ufl_element() for f in chain(arguments, coefficients))
+
+    def unique_elements(self):
+        "Return a tuple of the unique elements of the arguments and coefficients."
+        return unique_tuple(self.elements())
+
+    def domains(self):
+        "Return the sorted integration domains and domains of the terminals."
+        if self._domains is None:
+            domains = list(self._integration_domains)
+            for objects in self._terminals.values():
+                for t in objects:
+                    domains.extend(t.ufl_domains())
+            self._domains = sort_domains(join_domains(domains))
+        return self._domains
+
+    def max_derivative_order(self):
+        "Return the maximal nesting of spatial derivatives."
+        return self._max_derivative_order
+
+    def geometric_quantities(self):
+        "Return the set of geometric quantities."
+        return self.terminals(GeometricQuantity)
+
+    def restrictions(self):
+        "Return the set of restriction sides, ``'+'`` and ``'-'``, found."
+        return set(self._restrictions)
+
+
+def analyze(a):
+    """Return the :class:`FormAnalysis` of a, cached on a if it is a Form.
+    The argument a can be a Form, Integral or Expr."""
+    if isinstance(a, Form):
+        return a.analysis()
+    return FormAnalysis(a)
+
+
 # --- Utilities to extract information from an expression ---
 
 def __unused__extract_classes(a):
@@ -53,7 +182,11 @@ def __unused__extract_classes(a):
 
 def extract_type(a, ufl_type):
     """Build a set of all objects of class ufl_type found in a.
-    The argument a can be a Form, Integral or Expr."""
+    The argument a can be a Form, Integral, Expr or DAGSnapshot."""
+    if isinstance(a, DAGSnapshot):
+        return a.extract_type(ufl_type)
+    if isinstance(a, Form) and issubclass(ufl_type, Terminal):
+        return a.analysis().terminals(ufl_type)
     if issubclass(ufl_type, Terminal):
         # Optimization
         return set(o for e in iter_expressions(a)
@@ -68,6 +201,8 @@ def extract_type(a, ufl_type):
 def has_type(a, ufl_type):
     """Return if an object of class ufl_type can be found in a.
     The argument a can be a Form, Integral or Expr."""
+    if isinstance(a, Form):
+        return a.analysis().has_type(ufl_type)
     if issubclass(ufl_type, Terminal):
         # Optimization
         traversal = traverse_unique_terminals
@@ -111,9 +246,14 @@ def extract_arguments_and_coefficients(a):
 
     # This function is faster than extract_arguments + extract_coefficients
     # for large forms, and has more validation built in.
+    if isinstance(a, Form):
+        return a.analysis().arguments_and_coefficients()
+    return _checked_arguments_and_coefficients(extract_type(a, FormArgument))
+
 
-    # Extract lists of all form argument instances
-    terminals = extract_type(a, FormArgument)
+def _checked_arguments_and_coefficients(terminals):
+    """Build two sorted lists of the arguments and coefficients in
+    terminals, checking that their numbers and counts are unique."""
     arguments = [f for f in terminals if isinstance(f, Argument)]
     coefficients = [f for f in terminals if isinstance(f, Coefficient)]
 
@@ -143,6 +283,8 @@ The arguments found are:\n%s""" % "\n".join("  %s" % f for f in coefficients)
 
 def extract_elements(form):
     "Build sorted tuple of all elements used in form."
+    if isinstance(form, Form):
+        return form.analysis().elements()
     args = chain(*extract_arguments_and_coefficients(form))
     return tuple(f.ufl_element() for f in args)
 
@@ -32,11 +32,12 @@ from ufl.operators import (conditional, sign,
                            bessel_J, bessel_Y, bessel_I, bessel_K,
                            cell_avg, facet_avg)
 
+from collections import OrderedDict
 from math import pi
 
 from ufl.corealg.multifunction import MultiFunction
-from ufl.corealg.map_dag import map_expr_dag
-from ufl.algorithms.map_integrands import map_integrand_dags
+from ufl.corealg.map_dag import map_expr_dag, MapCache
+from ufl.algorithms.map_integrands import map_integrands, map_integrand_dags
 
 from ufl.checks import is_cellwise_constant
 from ufl.differentiation import CoordinateDerivative
@@ -52,6 +53,10 @@ from ufl.differentiation import CoordinateDerivative
 # have this bug.
 CONDITIONAL_WORKAROUND = False
 
+# Default bound on the number of nodes with memoized derivatives kept
+# by a DerivativeRuleDispatcher, None for no bound
+DERIVATIVE_MEMO_SIZE = 100000
+
 
 class GenericDerivativeRuleset(MultiFunction):
     def __init__(self, var_shape):
@@ -774,15 +779,21 @@ class GateauxDerivativeRuleset(GenericDerivativeRuleset):
             error("Expecting a coefficient-coefficient ExprMapping.")
 
         # The coefficient(s) to differentiate w.r.t. and the
-        # argument(s) s.t. D_w[v](e) = d/dtau e(w+tau v)|tau=0
+        # argument(s) s.t. D_w[v](e) = d/dtau e(w+tau v)|tau=0, the
+        # positions of the coefficients are looked up in the index of
+        # the ExprList, shared by all rulesets built from it
+        self._coefficients = coefficients
         self._w = coefficients.ufl_operands
         self._v = arguments.ufl_operands
-        self._w2v = {w: v for w, v in zip(self._w, self._v)}
 
-        # Build more convenient dict {f: df/dw} for each coefficient f
-        # where df/dw is nonzero
-        cd = coefficient_derivatives.ufl_operands
-        self._cd = {cd[2 * i]: cd[2 * i + 1] for i in range(len(cd) // 2)}
+        # Positions of coefficients which are neither a form argument
+        # nor a component of one, never found by lookup
+        self._other_positions = tuple(k for k, w in enumerate(self._w)
+                                      if not isinstance(w, (FormArgument, Indexed)))
+
+        # The dict {f: df/dw} for each coefficient f where df/dw is
+        # nonzero
+        self._cd = coefficient_derivatives.mapping()
 
     # Explicitly defining dg/dw == 0
     geometric_quantity = GenericDerivativeRuleset.independent_terminal
@@ -804,9 +815,9 @@ class GateauxDerivativeRuleset(GenericDerivativeRuleset):
         # Define dw/dw := d/ds [w + s v] = v
 
         # Return corresponding argument if we can find o among w
-        do = self._w2v.get(o)
-        if do is not None:
-            return do
+        positions = self._coefficients.positions(o)
+        if positions:
+            return self._v[positions[-1]]
 
         # Look for o among coefficient derivatives
         dos = self._cd.get(o)
@@ -892,8 +903,9 @@ class GateauxDerivativeRuleset(GenericDerivativeRuleset):
 
         # Find o among all w without any indexing, which makes this
         # easy
-        for (w, v) in zip(self._w, self._v):
-            if o == w and isinstance(v, FormArgument):
+        for k in self._coefficients.positions(o):
+            v = self._v[k]
+            if isinstance(v, FormArgument):
                 # Case: d/dt [w + t v]
                 return apply_grads(v)
 
@@ -932,7 +944,12 @@ class GateauxDerivativeRuleset(GenericDerivativeRuleset):
 
         # Accumulate contributions from variations in different
         # components
-        for (w, v) in zip(self._w, self._v):
+        positions = self._coefficients.component_positions(o)
+        if self._other_positions:
+            # Visit the other coefficients too, to report them below
+            positions = sorted(positions + self._other_positions)
+        for k in positions:
+            w, v = self._w[k], self._v[k]
 
             # Analyse differentiation variable coefficient
             if isinstance(w, FormArgument):
@@ -1023,8 +1040,20 @@ class GateauxDerivativeRuleset(GenericDerivativeRuleset):
 
 
 class DerivativeRuleDispatcher(MultiFunction):
-    def __init__(self):
+    """Apply the derivative rulesets to the operands of derivative nodes.
+
+    The rulesets and the derivatives they compute are memoized by
+    ruleset kind, ruleset parameters and operand, and reused for all
+    derivative nodes met by this dispatcher, also across integrals and
+    calls if the dispatcher is reused. At most *memo_size* nodes are
+    kept, least recently used rulesets being dropped first. A
+    *memo_size* of 0 disables the memo.
+    """
+    def __init__(self, memo_size=DERIVATIVE_MEMO_SIZE):
         MultiFunction.__init__(self)
+        # (kind, parameters) -> (ruleset, MapCache)
+        self._memo = OrderedDict()
+        self._memo_size = memo_size
 
     def terminal(self, o):
         return o
@@ -1034,22 +1063,50 @@ class DerivativeRuleDispatcher(MultiFunction):
 
     expr = MultiFunction.reuse_if_untouched
 
+    def _apply_ruleset(self, key, ruleset_class, parameters, f):
+        "Apply the memoized ruleset_class(*parameters) to f."
+        if self._memo_size == 0:
+            return map_expr_dag(ruleset_class(*parameters), f)
+
+        memo_key = (key,) + parameters
+        entry = self._memo.get(memo_key)
+        if entry is None:
+            entry = (ruleset_class(*parameters), MapCache())
+            self._memo[memo_key] = entry
+        else:
+            self._memo.move_to_end(memo_key)
+        rules, cache = entry
+        try:
+            result = map_expr_dag(rules, f, cache=cache)
+        except Exception:
+            # The cache is incomplete after an error
+            del self._memo[memo_key]
+            raise
+
+        # Keep the memo bounded, dropping the least recently used
+        # rulesets and finally the caches of the current one
+        if self._memo_size is not None:
+            size = sum(len(c) for r, c in self._memo.values())
+            while size > self._memo_size and len(self._memo) > 1:
+                r, c = self._memo.popitem(last=False)[1]
+                size -= len(c)
+            if size > self._memo_size:
+                cache.clear()
+        return result
+
     def grad(self, o, f):
-        rules = GradRuleset(o.ufl_shape[-1])
-        return map_expr_dag(rules, f)
+        return self._apply_ruleset("grad", GradRuleset, (o.ufl_shape[-1],), f)
 
     def reference_grad(self, o, f):
-        rules = ReferenceGradRuleset(o.ufl_shape[-1])  # FIXME: Look over this and test better.
-        return map_expr_dag(rules, f)
+        # FIXME: Look over this and test better.
+        return self._apply_ruleset("reference_grad", ReferenceGradRuleset, (o.ufl_shape[-1],), f)
 
     def variable_derivative(self, o, f, dummy_v):
-        rules = VariableRuleset(o.ufl_operands[1])
-        return map_expr_dag(rules, f)
+        return self._apply_ruleset("variable", VariableRuleset, (o.ufl_operands[1],), f)
 
     def coefficient_derivative(self, o, f, dummy_w, dummy_v, dummy_cd):
         dummy, w, v, cd = o.ufl_operands
-        rules = GateauxDerivativeRuleset(w, v, cd)
-        return map_expr_dag(rules, f)
+        return self._apply_ruleset("coefficient", GateauxDerivativeRuleset, (w, v, cd), f)
 
     def coordinate_derivative(self, o, f, dummy_w, dummy_v, dummy_cd):
         o_ = o.ufl_operands
@@ -1086,8 +1143,9 @@ class DerivativeRuleDispatcher(MultiFunction):
 
 
 def apply_derivatives(expression):
-    rules = DerivativeRuleDispatcher()
-    return map_integrand_dags(rules, expression)
+    # Use a dispatcher for each integrand, such that the integrals of
+    # a form don't share the derivatives computed for them
+    return map_integrands(lambda e: map_expr_dag(DerivativeRuleDispatcher(), e), expression)
 
 
 class CoordinateDerivativeRuleset(GenericDerivativeRuleset):
@@ -1113,15 +1171,16 @@ class CoordinateDerivativeRuleset(GenericDerivativeRuleset):
             error("Expecting a coefficient-coefficient ExprMapping.")
 
         # The coefficient(s) to differentiate w.r.t. and the
-        # argument(s) s.t. D_w[v](e) = d/dtau e(w+tau v)|tau=0
+        # argument(s) s.t. D_w[v](e) = d/dtau e(w+tau v)|tau=0, the
+        # positions of the coefficients are looked up in the index of
+        # the ExprList, shared by all rulesets built from it
+        self._coefficients = coefficients
         self._w = coefficients.ufl_operands
         self._v = arguments.ufl_operands
-        self._w2v = {w: v for w, v in zip(self._w, self._v)}
 
-        # Build more convenient dict {f: df/dw} for each coefficient f
-        # where df/dw is nonzero
-        cd = coefficient_derivatives.ufl_operands
-        self._cd = {cd[2 * i]: cd[2 * i + 1] for i in range(len(cd) // 2)}
+        # The dict {f: df/dw} for each coefficient f where df/dw is
+        # nonzero
+        self._cd = coefficient_derivatives.mapping()
 
     # Explicitly defining dg/dw == 0
     geometric_quantity = GenericDerivativeRuleset.independent_terminal
@@ -1136,10 +1195,10 @@ class CoordinateDerivativeRuleset(GenericDerivativeRuleset):
         error("CoordinateDerivative grad in physical space is not implemented.")
 
     def spatial_coordinate(self, o):
-        do = self._w2v.get(o)
+        positions = self._coefficients.positions(o)
         # d x /d x => Argument(x.function_space())
-        if do is not None:
-            return do
+        if positions:
+            return self._v[positions[-1]]
         else:
             error("Not implemented: CoordinateDerivative found a SpatialCoordinate that is different from the one being differentiated.")
 
@@ -1167,8 +1226,9 @@ class CoordinateDerivativeRuleset(GenericDerivativeRuleset):
 
         # Find o among all w without any indexing, which makes this
         # easy
-        for (w, v) in zip(self._w, self._v):
-            if o == w and isinstance(v, ReferenceValue) and isinstance(v.ufl_operands[0], FormArgument):
+        for k in self._coefficients.positions(o):
+            v = self._v[k]
+            if isinstance(v, ReferenceValue) and isinstance(v.ufl_operands[0], FormArgument):
                 # Case: d/dt [w + t v]
                 return apply_grads(v)
         return self.independent_terminal(o)
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""Reverse mode (adjoint) differentiation of functionals.
+
+Computes the Gateaux derivatives of a scalar functional with respect
+to several coefficients in a single backward sweep over each integrand
+DAG. The sweep computes the adjoint of each node, the derivative of the
+integrand with respect to the value of the node, from the adjoints of
+the nodes using it. The derivative with respect to a coefficient ``w``
+in the direction ``v`` is then the sum over each occurrence ``t`` of
+``w``, or of derivatives of ``w``, of the adjoint of ``t`` contracted
+with ``t`` evaluated for ``v``.
+
+The adjoints are shared between all coefficients, so differentiating
+with respect to many coefficients costs about as much as with respect
+to one, while forward mode differentiation traverses the integrand
+once per coefficient.
+
+Only real valued functionals are supported.
+"""
+
+# Copyright (C) 2019 The FEniCS Project
+#
+# This file is part of UFL (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+from ufl.log import error
+from ufl.form import Form
+from ufl.coefficient import Coefficient
+from ufl.core.multiindex import Index, FixedIndex, MultiIndex, indices
+from ufl.constantvalue import Zero, IntValue, Identity
+from ufl.tensors import as_tensor, as_vector
+from ufl.algebra import Product, Division
+from ufl.conditional import Conditional
+from ufl.indexed import Indexed
+from ufl.indexsum import IndexSum
+from ufl.classes import Grad, Restricted
+from ufl.corealg.multifunction import MultiFunction
+from ufl.corealg.traversal import unique_post_traversal
+from ufl.algorithms.apply_algebra_lowering import apply_algebra_lowering
+from ufl.algorithms.apply_derivatives import apply_derivatives, GenericDerivativeRuleset
+from ufl.algorithms.apply_restrictions import apply_restrictions
+
+# Types wrapping a coefficient in the derivatives of terminals left by
+# apply_derivatives and apply_restrictions
+_modifier_types = (Grad, Restricted)
+
+
+def _modified_terminal(o):
+    "Return the terminal wrapped by derivatives and restrictions in o."
+    while isinstance(o, _modifier_types):
+        o, = o.ufl_operands
+    return o
+
+
+def _replace_modified_terminal(o, terminal):
+    "Return o with the terminal wrapped by derivatives and restrictions replaced."
+    if isinstance(o, _modifier_types):
+        return o._ufl_expr_reconstruct_(_replace_modified_terminal(o.ufl_operands[0], terminal))
+    return terminal
+
+
+class PartialDerivatives(GenericDerivativeRuleset):
+    """The partial derivatives of pointwise scalar operators with respect
+    to their operands, computed from the forward mode rules by passing
+    the derivative 1 for one operand and 0 for the others."""
+
+    def __init__(self):
+        GenericDerivativeRuleset.__init__(self, var_shape=())
+
+    def partial(self, o, k):
+        "Return the partial derivative of o with respect to operand k."
+        units = [IntValue(1) if j == k else Zero() for j in range(len(o.ufl_operands))]
+        return self._handlers[o._ufl_typecode_](o, *units)
+
+
+class AdjointRules(MultiFunction):
+    """Rules for propagating the adjoint of a node to its operands.
+
+    The adjoint of a node has the free indices of the node. Products
+    are built with the Product class, the ``*`` operator would sum
+    over the free indices shared by the factors.
+
+    Each handler takes the node, its adjoint and the positions of the
+    operands depending on the differentiation coefficients, and returns
+    a list of (operand position, contribution) pairs for these operands.
+    """
+
+    def __init__(self):
+        MultiFunction.__init__(self)
+        self._partials = PartialDerivatives()
+
+    def expr(self, o, bar, ks):
+        error("Reverse mode differentiation of %s is not implemented." % o._ufl_class_.__name__)
+
+    def derivative(self, o, bar, ks):
+        error("Expecting derivatives to be applied before reverse mode differentiation, got %s."
+              % o._ufl_class_.__name__)
+
+    def _pointwise(self, o, bar, ks):
+        "Chain rule for scalar valued pointwise operators."
+        return [(k, Product(bar, self._partials.partial(o, k))) for k in ks]
+
+    math_function = _pointwise
+    abs = _pointwise
+    power = _pointwise
+    atan_2 = _pointwise
+    erf = _pointwise
+    max_value = _pointwise
+    min_value = _pointwise
+
+    def bessel_function(self, o, bar, ks):
+        if 0 in ks:
+            error("Differentiation of bessel function w.r.t. nu is not supported.")
+        return [(1, Product(bar, self._partials._handlers[o._ufl_typecode_](o, None, IntValue(1))))]
+
+    def sum(self, o, bar, ks):
+        return [(k, bar) for k in ks]
+
+    def product(self, o, bar, ks):
+        a, b = o.ufl_operands
+        return [(k, Product(bar, (b, a)[k])) for k in ks]
+
+    def division(self, o, bar, ks):
+        a, b = o.ufl_operands
+        return [(k, Division(bar, b) if k == 0 else Product(IntValue(-1), Product(bar, Division(o, b))))
+                for k in ks]
+
+    def _identity(self, o, bar, ks):
+        return [(0, bar)]
+
+    variable = _identity
+    index_sum = _identity
+    # Real valued functionals only
+    conj = _identity
+    real = _identity
+
+    def imag(self, o, bar, ks):
+        return []
+
+    def conditional(self, o, bar, ks):
+        c = o.ufl_operands[0]
+        zero = Zero(bar.ufl_shape, bar.ufl_free_indices, bar.ufl_index_dimensions)
+        return [(k, Conditional(c, bar, zero) if k == 1 else Conditional(c, zero, bar))
+                for k in ks if k > 0]
+
+    def indexed(self, o, bar, ks):
+        A, ii = o.ufl_operands
+        kk = []
+        for i, n in zip(ii, A.ufl_shape):
+            if isinstance(i, FixedIndex) or i in kk:
+                # Pick component i along this axis, or the diagonal
+                # for an index repeated in ii
+                k = Index()
+                bar = Product(bar, Identity(n)[i, k])
+                kk.append(k)
+            else:
+                kk.append(i)
+        return [(0, as_tensor(bar, tuple(kk)))]
+
+    def component_tensor(self, o, bar, ks):
+        A, ii = o.ufl_operands
+        return [(0, Indexed(bar, ii))]
+
+    def list_tensor(self, o, bar, ks):
+        return [(k, bar[k]) for k in ks]
+
+
+class ReverseDerivativeSweep(object):
+    """Backward sweep computing the adjoints of the nodes of an integrand
+    that depend on the given coefficients.
+
+    :arg coefficients: The coefficients to differentiate with respect to.
+    """
+
+    def __init__(self, coefficients):
+        self.coefficients = tuple(coefficients)
+        self.rules = AdjointRules()
+        self._ones = {}
+
+    def _ones_vector(self, n):
+        v = self._ones.get(n)
+        if v is None:
+            v = as_vector([1] * n)
+            self._ones[n] = v
+        return v
+
+    def _match_free_indices(self, c, o):
+        """Return c with the free indices of o, summing over free indices
+        not in o and broadcasting over free indices of o not in c."""
+        fi = c.ufl_free_indices
+        target = o.ufl_free_indices
+        if fi == target:
+            return c
+        for count in fi:
+            if count not in target:
+                c = IndexSum(c, MultiIndex((Index(count=count),)))
+        for count, dim in zip(target, o.ufl_index_dimensions):
+            if count not in fi:
+                c = c * self._ones_vector(dim)[Index(count=count)]
+        return c
+
+    def adjoints(self, integrand):
+        """Return a dict mapping each occurrence of the coefficients in
+        integrand, or derivatives of them, to its adjoint."""
+        if integrand.ufl_shape or integrand.ufl_free_indices:
+            error("Expecting scalar integrand without free indices in reverse mode differentiation.")
+
+        # Find the nodes depending on the coefficients, in post order
+        coefficients = set(self.coefficients)
+        active = set()
+        order = []
+        leaves = []
+        for o in unique_post_traversal(integrand):
+            if isinstance(o, _modifier_types) or o._ufl_is_terminal_:
+                t = _modified_terminal(o)
+                if not t._ufl_is_terminal_:
+                    error("Expecting derivatives and restrictions of terminals only, got %s." % (o,))
+                if t in coefficients:
+                    active.add(o)
+                    order.append(o)
+                    leaves.append(o)
+            elif any(op in active for op in o.ufl_operands):
+                active.add(o)
+                order.append(o)
+
+        # Accumulate adjoint contributions from the root down
+        contributions = {integrand: [IntValue(1)]}
+        bars = {}
+        leaf_set = set(leaves)
+        for o in reversed(order):
+            cs = contributions.pop(o, None)
+            if not cs:
+                continue
+            bar = cs[0]
+            for c in cs[1:]:
+                bar = bar + c
+            if isinstance(bar, Zero):
+                continue
+            if o in leaf_set:
+                bars[o] = bar
+                continue
+            operands = o.ufl_operands
+            ks = [k for k, op in enumerate(operands) if op in active]
+            for k, c in self.rules(o, bar, ks):
+                if not isinstance(c, Zero):
+                    op = operands[k]
+                    contributions.setdefault(op, []).append(self._match_free_indices(c, op))
+        return bars
+
+    def derivatives(self, integrand, arguments):
+        """Return the derivative of integrand with respect to each
+        coefficient in the direction of the corresponding argument."""
+        results = {w: [] for w in self.coefficients}
+        directions = dict(zip(self.coefficients, arguments))
+        for t, bar in self.adjoints(integrand).items():
+            w = _modified_terminal(t)
+            dt = _replace_modified_terminal(t, directions[w])
+            if dt.ufl_shape:
+                ii = indices(len(dt.ufl_shape))
+                results[w].append(bar[ii] * dt[ii])
+            else:
+                results[w].append(bar * dt)
+        derivatives = []
+        for w in self.coefficients:
+            d = Zero()
+            for term in results[w]:
+                d = d + term
+            derivatives.append(d)
+        return derivatives
+
+
+def compute_reverse_derivatives(form, coefficients, arguments):
+    """Compute the Gateaux derivatives of a functional with respect to
+    each of the coefficients, in the direction of the corresponding
+    arguments, in a single backward sweep over each integrand.
+
+    Returns a tuple of forms, one for each coefficient.
+    """
+    if not isinstance(form, Form):
+        error("Expecting a Form.")
+    if form.arguments():
+        error("Expecting a functional without arguments in reverse mode differentiation.")
+    if len(coefficients) != len(arguments):
+        error("Expecting one argument for each coefficient.")
+    for w in coefficients:
+        if not isinstance(w, Coefficient):
+            error("Can only differentiate with respect to a Coefficient in reverse mode, got %s."
+                  % (w,))
+
+    form = apply_restrictions(apply_derivatives(apply_algebra_lowering(form)))
+
+    sweep = ReverseDerivativeSweep(coefficients)
+    integrals = [[] for w in coefficients]
+    for itg in form.integrals():
+        for k, d in enumerate(sweep.derivatives(itg.integrand(), arguments)):
+            if not isinstance(d, Zero):
+                integrals[k].append(itg.reconstruct(integrand=d))
+    return tuple(Form(itgs) for itgs in integrals)
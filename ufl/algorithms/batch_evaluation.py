@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""Vectorized evaluation of expressions in many points at once.
+
+The evaluation is equivalent to calling ``expr(x, mapping)`` for each
+point, but each unique node of the expression DAG is evaluated once
+for the whole batch of points using NumPy array operations.
+
+The value of each node is represented by an array with axes
+``(point, shape..., free indices...)``, with the free indices in the
+sorted order of ``ufl_free_indices``.  The point axis has length one
+for values that are the same in all points.
+"""
+
+# Copyright (C) 2019 The FEniCS Project
+#
+# This file is part of UFL (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import itertools
+import math
+import string
+
+import numpy
+
+from ufl.log import error
+from ufl.constantvalue import as_ufl
+from ufl.core.multiindex import FixedIndex
+from ufl.corealg.multifunction import MultiFunction
+from ufl.corealg.map_dag import map_expr_dag
+from ufl.classes import Grad, ReferenceGrad, Restricted, Terminal, IntValue
+
+
+# Names of numpy functions for the unary math functions
+_math_functions = {
+    "sqrt": numpy.sqrt,
+    "exp": numpy.exp,
+    "ln": numpy.log,
+    "cos": numpy.cos,
+    "sin": numpy.sin,
+    "tan": numpy.tan,
+    "cosh": numpy.cosh,
+    "sinh": numpy.sinh,
+    "tanh": numpy.tanh,
+    "acos": numpy.arccos,
+    "asin": numpy.arcsin,
+    "atan": numpy.arctan,
+}
+
+
+def _as_array(value):
+    "Convert value to a float or complex array."
+    a = numpy.asarray(value)
+    if a.dtype.kind not in "fc":
+        a = a.astype(float)
+    return a
+
+
+def _align(value, rank, free_indices, target):
+    """Insert axes of length one for the indices in target that are not
+    in free_indices, both being sorted, such that the value broadcasts
+    against values with the target free indices."""
+    if free_indices == target:
+        return value
+    offset = 1 + rank
+    shape = list(value.shape[:offset])
+    k = offset
+    for i in target:
+        if i in free_indices:
+            shape.append(value.shape[k])
+            k += 1
+        else:
+            shape.append(1)
+    return value.reshape(shape)
+
+
+def _constant_value(t):
+    "Return the value of a terminal not in the mapping as a number."
+    try:
+        try:
+            return float(t)
+        except TypeError:
+            return complex(t)
+    except Exception:
+        error("Missing value for terminal %s in batch evaluation." % (t,))
+
+
+def _point_values(value, shape, num_points, component_first=False):
+    """Convert value given for each of num_points points, or once for
+    all points, to an array with a leading point axis.
+
+    If component_first is true, values for each point are given with
+    the point axis last, as returned by callables."""
+    a = _as_array(value)
+    if a.shape == shape:
+        return a.reshape((1,) + shape)
+    if component_first and a.shape == shape + (num_points,):
+        return numpy.moveaxis(a, -1, 0)
+    if not component_first and a.shape == (num_points,) + shape:
+        return a
+    error("Expecting value of shape %s for all points or %s for each point, got %s." % (
+        shape, (num_points,) + shape if not component_first else shape + (num_points,),
+        a.shape))
+
+
+def _batch_erf(a):
+    try:
+        import scipy.special
+        return scipy.special.erf(a)
+    except ImportError:
+        return numpy.vectorize(math.erf, otypes=[float])(a)
+
+
+def _batch_atan_2(a, b):
+    if numpy.iscomplexobj(a) or numpy.iscomplexobj(b):
+        error("Atan2 does not support complex numbers.")
+    return numpy.arctan2(a, b)
+
+
+class BatchEvaluator(MultiFunction):
+    """Evaluate each node of an expression in a batch of points.
+
+    :arg x: Array of shape ``(N, gdim)`` with the point coordinates.
+    :arg mapping: Dict from terminals to values, see :func:`evaluate_batch`.
+    """
+
+    def __init__(self, x, mapping):
+        MultiFunction.__init__(self)
+        self.x = x
+        self.mapping = mapping
+        self.num_points = x.shape[0]
+
+    def _point_values(self, value, shape, component_first=False):
+        return _point_values(value, shape, self.num_points, component_first)
+
+    def _mapped_value(self, o, derivative_shape=()):
+        "Evaluate terminal o, or derivatives of it, from the mapping."
+        shape = o.ufl_shape
+        f = self.mapping.get(o)
+        if f is None:
+            f = _constant_value(o)
+            if derivative_shape:
+                f = 0.0
+            return _as_array(f).reshape((1,) * (1 + len(shape) + len(derivative_shape)))
+
+        if not callable(f):
+            if derivative_shape:
+                return numpy.zeros((1,) + shape + derivative_shape)
+            return self._point_values(f, shape)
+
+        # Callables take the coordinates component first, like in
+        # pointwise evaluation where x[0] is the first coordinate
+        xt = self.x.T
+        if not derivative_shape:
+            return self._point_values(f(xt), shape, component_first=True)
+        values = [self._point_values(f(xt, d), shape, component_first=True)
+                  for d in itertools.product(*[range(n) for n in derivative_shape])]
+        values = numpy.broadcast_arrays(*values)
+        return numpy.stack(values, axis=-1).reshape(values[0].shape + derivative_shape)
+
+    # --- Terminals
+
+    def terminal(self, o):
+        return self._mapped_value(o)
+
+    def zero(self, o):
+        return numpy.zeros((1,) + o.ufl_shape + o.ufl_index_dimensions)
+
+    def scalar_value(self, o):
+        return _as_array(o._value).reshape((1,))
+
+    def identity(self, o):
+        return numpy.eye(o.ufl_shape[0]).reshape((1,) + o.ufl_shape)
+
+    def permutation_symbol(self, o):
+        values = numpy.zeros(o.ufl_shape)
+        for c in itertools.product(*[range(n) for n in o.ufl_shape]):
+            values[c] = o[c]
+        return values.reshape((1,) + o.ufl_shape)
+
+    def spatial_coordinate(self, o):
+        return self.x
+
+    def multi_index(self, o):
+        return o
+
+    def label(self, o):
+        return o
+
+    # --- Derivatives of terminals, as left by expand_derivatives
+
+    def _terminal_derivative(self, o):
+        f = o
+        while isinstance(f, (Grad, ReferenceGrad, Restricted)):
+            f, = f.ufl_operands
+        if not isinstance(f, Terminal):
+            error("Expecting derivatives of terminals only in batch evaluation, got %s." % (o,))
+        return self._mapped_value(f, o.ufl_shape[len(f.ufl_shape):])
+
+    grad = _terminal_derivative
+    reference_grad = _terminal_derivative
+
+    def reference_value(self, o, f):
+        error("Evaluate not implemented.")
+
+    # --- Algebra
+
+    def _binary(self, o, function, *ops):
+        target = o.ufl_free_indices
+        return function(*[_align(v, len(e.ufl_shape), e.ufl_free_indices, target)
+                          for e, v in zip(o.ufl_operands, ops)])
+
+    def sum(self, o, a, b):
+        return self._binary(o, numpy.add, a, b)
+
+    def product(self, o, a, b):
+        return self._binary(o, numpy.multiply, a, b)
+
+    def division(self, o, a, b):
+        return self._binary(o, numpy.true_divide, a, b)
+
+    def power(self, o, a, b):
+        return self._binary(o, numpy.power, a, b)
+
+    def abs(self, o, a):
+        return numpy.abs(a)
+
+    def conj(self, o, a):
+        return numpy.conj(a)
+
+    def real(self, o, a):
+        return numpy.real(a)
+
+    def imag(self, o, a):
+        return numpy.imag(a)
+
+    # --- Index notation and tensors
+
+    def indexed(self, o, A, ii):
+        operand = o.ufl_operands[0]
+        # Pick fixed components first
+        A = A[(slice(None),) + tuple(int(i) if isinstance(i, FixedIndex) else slice(None)
+                                     for i in ii)]
+        # Then map indices to free index axes, repeated indices
+        # picking the diagonal
+        labels = {}
+
+        def label(count):
+            if count not in labels:
+                labels[count] = string.ascii_letters[len(labels) + 1]
+            return labels[count]
+
+        subscripts = "a" + "".join(label(i.count()) for i in ii if not isinstance(i, FixedIndex))
+        subscripts += "".join(label(i) for i in operand.ufl_free_indices)
+        result = "a" + "".join(label(i) for i in o.ufl_free_indices)
+        return numpy.einsum(subscripts + "->" + result, A)
+
+    def index_sum(self, o, A, ii):
+        summand = o.ufl_operands[0]
+        axis = 1 + len(summand.ufl_shape) + summand.ufl_free_indices.index(ii[0].count())
+        return A.sum(axis=axis)
+
+    def component_tensor(self, o, A, ii):
+        fi = o.ufl_operands[0].ufl_free_indices
+        axes = ([0] + [1 + fi.index(i.count()) for i in ii] +
+                [1 + fi.index(i) for i in o.ufl_free_indices])
+        return A.transpose(axes)
+
+    def list_tensor(self, o, *ops):
+        return numpy.stack(numpy.broadcast_arrays(*ops), axis=1)
+
+    # --- Pass-through operators
+
+    def variable(self, o, a, label):
+        return a
+
+    def restricted(self, o, a):
+        return a
+
+    def cell_avg(self, o, a):
+        # Approximate evaluation, since we don't have a cell
+        return a
+
+    def facet_avg(self, o, a):
+        # Approximate evaluation, since we don't have a cell
+        return a
+
+    # --- Math functions
+
+    def math_function(self, o, a):
+        return _math_functions[o._name](a)
+
+    def atan_2(self, o, a, b):
+        return _batch_atan_2(a, b)
+
+    def erf(self, o, a):
+        return _batch_erf(a)
+
+    def bessel_function(self, o, nu, a):
+        try:
+            import scipy.special
+        except ImportError:
+            error("You must have scipy installed to evaluate bessel functions in python.")
+        name = o._name[-1]
+        if isinstance(o.ufl_operands[0], IntValue):
+            nu = int(o.ufl_operands[0])
+            functype = 'n' if name != 'i' else 'v'
+        else:
+            functype = 'v'
+        return getattr(scipy.special, name + functype)(nu, a)
+
+    # --- Conditions
+
+    def eq(self, o, a, b):
+        return numpy.equal(a, b)
+
+    def ne(self, o, a, b):
+        return numpy.not_equal(a, b)
+
+    def le(self, o, a, b):
+        return numpy.less_equal(a, b)
+
+    def ge(self, o, a, b):
+        return numpy.greater_equal(a, b)
+
+    def lt(self, o, a, b):
+        return numpy.less(a, b)
+
+    def gt(self, o, a, b):
+        return numpy.greater(a, b)
+
+    def and_condition(self, o, a, b):
+        return numpy.logical_and(a, b)
+
+    def or_condition(self, o, a, b):
+        return numpy.logical_or(a, b)
+
+    def not_condition(self, o, a):
+        return numpy.logical_not(a)
+
+    def conditional(self, o, c, t, f):
+        # Conditions are scalar, add axes to broadcast over the shape
+        # of the values, and align all by free index
+        rank = len(o.ufl_shape)
+        c = c.reshape(c.shape[:1] + (1,) * rank + c.shape[1:])
+        target = o.ufl_free_indices
+        c, t, f = [_align(v, rank, e.ufl_free_indices, target)
+                   for e, v in zip(o.ufl_operands, (c, t, f))]
+        return numpy.where(c, t, f)
+
+    def min_value(self, o, a, b):
+        return numpy.minimum(a, b)
+
+    def max_value(self, o, a, b):
+        return numpy.maximum(a, b)
+
+    def expr(self, o, *ops):
+        error("Batch evaluation of %s not available." % o._ufl_class_.__name__)
+
+
+def evaluate_batch(expression, x, mapping=None, component=()):
+    """Evaluate expression in a batch of points.
+
+    :arg expression: The UFL expression to evaluate.
+    :arg x: Array of shape ``(N, gdim)`` with the coordinates of the
+        N points, or of shape ``(N,)`` in 1D.
+    :arg mapping: Dict from terminals to their values. A value is either
+        an array of shape ``(N,) + shape`` with the value in each point,
+        an array of the terminal's shape with the value in all points,
+        or a callable. Callables are passed the coordinates as an array
+        of shape ``(gdim, N)``, such that ``x[0]`` is the first
+        coordinate of all points as in pointwise evaluation, and return
+        an array of shape ``shape + (N,)``.  For derivatives of the
+        terminal, the callable is called as ``f(x, derivatives)`` like
+        in pointwise evaluation.
+    :arg component: Optional component of the value to return.
+
+    Returns an array of shape ``(N,) + shape``, with shape being the
+    shape of the expression after taking the component.
+    """
+    from ufl.algorithms.ad import expand_derivatives
+    expression = expand_derivatives(as_ufl(expression))
+    if expression.ufl_free_indices:
+        error("Cannot evaluate expression with free indices.")
+
+    x = _as_array(x)
+    if x.ndim == 1:
+        x = x.reshape((x.shape[0], 1))
+    if x.ndim != 2:
+        error("Expecting coordinates as an array of shape (N, gdim).")
+
+    evaluator = BatchEvaluator(x, mapping or {})
+    value = map_expr_dag(evaluator, expression, compress=False)
+    value = numpy.broadcast_to(value, (x.shape[0],) + expression.ufl_shape)
+    if component:
+        value = value[(slice(None),) + tuple(component)]
+    return numpy.array(value)
@@ -1,13 +1,10 @@
 # -*- coding: utf-8 -*-
 
 
-from itertools import chain
-
 from ufl.log import UFLException
-from ufl.corealg.traversal import traverse_unique_terminals
 from ufl.corealg.multifunction import MultiFunction
-from ufl.corealg.map_dag import map_expr_dag
-from ufl.classes import Argument, Zero
+from ufl.corealg.map_dag import map_expr_dag, map_expr_dags
+from ufl.classes import Zero
 
 
 class ArityMismatch(UFLException):
@@ -21,52 +18,100 @@ def _afmt(atuple):
 
 
 class ArityChecker(MultiFunction):
+    """Compute the form arguments each node depends on, bottom up, and
+    check that the expression is linear in each of them.
+
+    The set of (argument, conjugated) pairs of a node is represented by
+    an integer used as a bitset, with bit ``2*k`` for argument ``k`` and
+    bit ``2*k + 1`` for its conjugate.  Arguments are numbered as they
+    are encountered, so the checker can be applied to many expressions
+    with ``map_expr_dags``, visiting each unique node once.
+    """
+
     def __init__(self, arguments):
         MultiFunction.__init__(self)
         self.arguments = arguments
-        self._et = ()
+        self._et = 0
+        # Argument for each argument position k
+        self._args = []
+        # Bit of the unconjugated argument for each argument
+        self._bits = {}
+        # Bits of the unconjugated arguments
+        self._plain = 0
+        # Bitset of argument numbers for each arity bitset
+        self._numbers = {}
+        for arg in arguments:
+            self._bit(arg)
+
+    def _bit(self, arg):
+        b = self._bits.get(arg)
+        if b is None:
+            b = 1 << (2 * len(self._args))
+            self._args.append(arg)
+            self._bits[arg] = b
+            self._plain |= b
+        return b
+
+    def arity_tuple(self, a):
+        "Return the arity bitset a as a sorted tuple of (argument, conjugated) pairs."
+        t = []
+        k = 0
+        while a:
+            if a & 1:
+                t.append((self._args[k // 2], bool(k % 2)))
+            a >>= 1
+            k += 1
+        return tuple(sorted(t, key=lambda x: (x[0].number(), x[0].part())))
+
+    def _argument_numbers(self, a):
+        n = self._numbers.get(a)
+        if n is None:
+            n = 0
+            for arg, conj in self.arity_tuple(a):
+                n |= 1 << arg.number()
+            self._numbers[a] = n
+        return n
 
     def terminal(self, o):
         return self._et
 
     def argument(self, o):
-        return ((o, False),)
-
-    def nonlinear_operator(self, o):
-        # Cutoff traversal by not having *ops in argument list of this
-        # handler.  Traverse only the terminals under here the fastest
-        # way we know of:
-        for t in traverse_unique_terminals(o):
-            if t._ufl_typecode_ == Argument._ufl_typecode_:
-                raise ArityMismatch("Applying nonlinear operator {0} to expression depending on form argument {1}.".format(o._ufl_class_.__name__, t))
+        return self._bit(o)
+
+    def nonlinear_operator(self, o, *ops):
+        if any(ops):
+            a = 0
+            for op in ops:
+                a |= op
+            raise ArityMismatch("Applying nonlinear operator {0} to expression depending on form argument {1}.".format(o._ufl_class_.__name__, self.arity_tuple(a)[0][0]))
         return self._et
 
     expr = nonlinear_operator
 
     def sum(self, o, a, b):
         if a != b:
-            raise ArityMismatch("Adding expressions with non-matching form arguments {0} vs {1}.".format(_afmt(a), _afmt(b)))
+            raise ArityMismatch("Adding expressions with non-matching form arguments {0} vs {1}.".format(_afmt(self.arity_tuple(a)), _afmt(self.arity_tuple(b))))
         return a
 
     def division(self, o, a, b):
         if b:
-            raise ArityMismatch("Cannot divide by form argument {0}.".format(b))
+            raise ArityMismatch("Cannot divide by form argument {0}.".format(self.arity_tuple(b)))
         return a
 
     def product(self, o, a, b):
         if a and b:
             # Check that we don't have test*test, trial*trial, even
             # for different parts in a block system
-            anumbers = set(x[0].number() for x in a)
-            for x in b:
-                if x[0].number() in anumbers:
-                    raise ArityMismatch("Multiplying expressions with overlapping form argument number {0}, argument is {1}.".format(x[0].number(), _afmt(x)))
-            # Combine argument lists
-            c = tuple(sorted(set(a + b), key=lambda x: (x[0].number(), x[0].part())))
-            # Check that we don't have any arguments shared between a
-            # and b
-            if len(c) != len(a) + len(b) or len(c) != len({x[0] for x in c}):
-                raise ArityMismatch("Multiplying expressions with overlapping form arguments {0} vs {1}.".format(_afmt(a), _afmt(b)))
+            overlap = self._argument_numbers(a) & self._argument_numbers(b)
+            if overlap:
+                for x in self.arity_tuple(b):
+                    if overlap & (1 << x[0].number()):
+                        raise ArityMismatch("Multiplying expressions with overlapping form argument number {0}, argument is {1}.".format(x[0].number(), _afmt((x,))))
+            # Combine argument sets, checking that no argument appears
+            # both conjugated and not
+            c = a | b
+            if c & (c >> 1) & self._plain:
+                raise ArityMismatch("Multiplying expressions with overlapping form arguments {0} vs {1}.".format(_afmt(self.arity_tuple(a)), _afmt(self.arity_tuple(b))))
             # It's fine for argument parts to overlap
             return c
         elif a:
@@ -101,7 +146,8 @@ class ArityChecker(MultiFunction):
 
     # Conj, is a sesquilinear operator
     def conj(self, o, a):
-        return tuple((a_[0], not a_[1]) for a_ in a)
+        # Swap the bits of each argument and its conjugate
+        return ((a & self._plain) << 1) | ((a >> 1) & self._plain)
 
     # Does it make sense to have a Variable(Argument)? I see no
     # problem.
@@ -111,7 +157,7 @@ class ArityChecker(MultiFunction):
     # Conditional is linear on each side of the condition
     def conditional(self, o, c, a, b):
         if c:
-            raise ArityMismatch("Condition cannot depend on form arguments ({0}).".format(_afmt(a)))
+            raise ArityMismatch("Condition cannot depend on form arguments ({0}).".format(_afmt(self.arity_tuple(a))))
         if a and isinstance(o.ufl_operands[2], Zero):
             # Allow conditional(c, arg, 0)
             return a
@@ -124,7 +170,7 @@ class ArityChecker(MultiFunction):
         else:
             # Do not allow e.g. conditional(c, test, trial),
             # conditional(c, test, nonzeroconstant)
-            raise ArityMismatch("Conditional subexpressions with non-matching form arguments {0} vs {1}.".format(_afmt(a), _afmt(b)))
+            raise ArityMismatch("Conditional subexpressions with non-matching form arguments {0} vs {1}.".format(_afmt(self.arity_tuple(a)), _afmt(self.arity_tuple(b))))
 
     def linear_indexed_type(self, o, a, i):
         return a
@@ -135,43 +181,72 @@ class ArityChecker(MultiFunction):
     component_tensor = linear_indexed_type
 
     def list_tensor(self, o, *ops):
-        args = set(chain(*ops))
+        args = 0
+        for op in ops:
+            args |= op
         if args:
             # Check that each list tensor component has the same
             # argument numbers (ignoring parts)
-            numbers = set(tuple(sorted(set(arg[0].number() for arg in op))) for op in ops)
-            if () in numbers:  # Allow e.g. <v[0], 0, v[1]> but not <v[0], u[0]>
-                numbers.remove(())
+            numbers = set(self._argument_numbers(op) for op in ops)
+            if 0 in numbers:  # Allow e.g. <v[0], 0, v[1]> but not <v[0], u[0]>
+                numbers.remove(0)
             if len(numbers) > 1:
+                numbers = set(tuple(sorted(set(arg.number() for arg, conj in self.arity_tuple(op))))
+                              for op in ops if op)
                 raise ArityMismatch("Listtensor components must depend on the same argument numbers, found {0}.".format(numbers))
 
             # Allow different parts with the same number
-            return tuple(sorted(args, key=lambda x: (x[0].number(), x[0].part())))
+            return args
         else:
             # No argument dependencies
             return self._et
 
 
+def _sorted_arguments(arguments):
+    return tuple(sorted(set(arguments), key=lambda x: (x.number(), x.part())))
+
+
+def _check_arities(rules, arities, arguments, complex_mode):
+    "Check the arity bitsets computed by rules for a list of integrands."
+    for a in set(arities):
+        arg_tuples = rules.arity_tuple(a)
+        args = tuple(x[0] for x in arg_tuples)
+        if args != arguments:
+            raise ArityMismatch("Integrand arguments {0} differ from form arguments {1}.".format(args, arguments))
+        if complex_mode:
+            # Check that the test function is conjugated and that any
+            # trial function is not conjugated. Further arguments are
+            # treated as trial funtions (i.e. no conjugation) but this
+            # might not be correct.
+            for arg, conj in arg_tuples:
+                if arg.number() == 0 and not conj:
+                    raise ArityMismatch("Failure to conjugate test function in complex Form")
+                elif arg.number() > 0 and conj:
+                    raise ArityMismatch("Argument {0} is spuriously conjugated in complex Form".format(arg))
+
+
 def check_integrand_arity(expr, arguments, complex_mode=False):
-    arguments = tuple(sorted(set(arguments),
-                             key=lambda x: (x.number(), x.part())))
+    arguments = _sorted_arguments(arguments)
+    rules = ArityChecker(arguments)
+    arity = map_expr_dag(rules, expr, compress=False)
+    _check_arities(rules, [arity], arguments, complex_mode)
+
+
+def check_integrands_arity(integrands, arguments, complex_mode=False):
+    """Check the arity of several integrands in a single sweep, visiting
+    subexpressions shared between the integrands once."""
+    arguments = _sorted_arguments(arguments)
     rules = ArityChecker(arguments)
-    arg_tuples = map_expr_dag(rules, expr, compress=False)
-    args = tuple(a[0] for a in arg_tuples)
-    if args != arguments:
-        raise ArityMismatch("Integrand arguments {0} differ from form arguments {1}.".format(args, arguments))
-    if complex_mode:
-        # Check that the test function is conjugated and that any
-        # trial function is not conjugated. Further arguments are
-        # treated as trial funtions (i.e. no conjugation) but this
-        # might not be correct.
-        for arg, conj in arg_tuples:
-            if arg.number() == 0 and not conj:
-                raise ArityMismatch("Failure to conjugate test function in complex Form")
-            elif arg.number() > 0 and conj:
-                raise ArityMismatch("Argument {0} is spuriously conjugated in complex Form".format(arg))
+    arities = map_expr_dags(rules, integrands, compress=False)
+    _check_arities(rules, arities, arguments, complex_mode)
 
 
 def check_form_arity(form, arguments, complex_mode=False):
-    for itg in form.integrals():
-        check_integrand_arity(itg.integrand(), arguments, complex_mode)
+    check_integrands_arity([itg.integrand() for itg in form.integrals()],
+                           arguments, complex_mode)
+
+
+def check_integral_data_arity(integral_data, arguments, complex_mode=False):
+    "Check the arity of the integrals in a list of IntegralData."
+    check_integrands_arity([itg.integrand() for ida in integral_data for itg in ida.integrals],
+                           arguments, complex_mode)
@@ -9,28 +9,38 @@ raw input form given by a user."""
 #
 # SPDX-License-Identifier:    LGPL-3.0-or-later
 
+from functools import partial
 from itertools import chain
 
-from ufl.log import error, info
+from ufl.log import error, info, warning
 from ufl.utils.sequences import max_degree
 
 from ufl.classes import GeometricFacetQuantity, Coefficient, Form, FunctionSpace
+from ufl.classes import CompoundTensorOperator, Div, NablaDiv, NablaGrad, Curl
+from ufl.classes import SpatialCoordinate, Jacobian, CellCoordinate
+from ufl.measure import integral_type_to_measure_name, custom_integral_types, point_integral_types
 from ufl.corealg.traversal import traverse_unique_terminals
 from ufl.algorithms.analysis import extract_coefficients, extract_sub_elements, unique_tuple
 from ufl.algorithms.formdata import FormData
-from ufl.algorithms.formtransformations import compute_form_arities
-from ufl.algorithms.check_arities import check_form_arity
+from ufl.algorithms.check_arities import check_integral_data_arity
 
 # These are the main symbolic processing steps:
-from ufl.algorithms.apply_function_pullbacks import apply_function_pullbacks
-from ufl.algorithms.apply_algebra_lowering import apply_algebra_lowering
-from ufl.algorithms.apply_derivatives import apply_derivatives, apply_coordinate_derivatives
+from ufl.algorithms.apply_function_pullbacks import FunctionPullbackApplier
+from ufl.algorithms.apply_algebra_lowering import LowerCompoundAlgebra
+from ufl.algorithms.apply_derivatives import DerivativeRuleDispatcher, CoordinateDerivativeRuleDispatcher
 from ufl.algorithms.apply_integral_scaling import apply_integral_scaling
-from ufl.algorithms.apply_geometry_lowering import apply_geometry_lowering
-from ufl.algorithms.apply_restrictions import apply_restrictions, apply_default_restrictions
-from ufl.algorithms.estimate_degrees import estimate_total_polynomial_degree
-from ufl.algorithms.remove_complex_nodes import remove_complex_nodes
-from ufl.algorithms.comparison_checker import do_comparison_check
+from ufl.algorithms.apply_geometry_lowering import GeometryLoweringApplier
+from ufl.algorithms.apply_restrictions import RestrictionPropagator, DefaultRestrictionApplier
+from ufl.algorithms.estimate_degrees import (DegreeEstimationCache, cap_degree, exceeds_degree,
+                                             estimate_degree_breakdown, DegreeBreakdown)
+from ufl.algorithms.remove_complex_nodes import ComplexNodeRemoval
+from ufl.algorithms.comparison_checker import CheckComparisons
+from ufl.algorithms.pass_fusion import (IntegrandPass, FormPass, apply_pass_pipeline,
+                                        apply_pass_pipeline_parallel, apply_pipeline_step,
+                                        plan_pass_fusion)
+from ufl.algorithms.pass_profiling import PassProfiler
+from ufl.algorithms.eliminate_common_subexpressions import eliminate_common_subexpressions
+from ufl.algorithms.simplification import simplify
 
 # See TODOs at the call sites of these below:
 from ufl.algorithms.domain_analysis import build_integral_data
@@ -160,15 +170,6 @@ def _check_facet_geometry(integral_data):
                         error("Integral of type %s cannot contain a %s." % (it, cls.__name__))
 
 
-def _check_form_arity(preprocessed_form):
-    # Check that we don't have a mixed linear/bilinear form or
-    # anything like that
-    # FIXME: This is slooow and should be moved to form compiler
-    # and/or replaced with something faster
-    if 1 != len(compute_form_arities(preprocessed_form)):
-        error("All terms in form must have same rank.")
-
-
 def _build_coefficient_replace_map(coefficients, element_mapping=None):
     """Create new Coefficient objects
     with count starting at 0. Return mapping from old
@@ -194,88 +195,160 @@ def _build_coefficient_replace_map(coefficients, element_mapping=None):
     return new_coefficients, replace_map
 
 
-def attach_estimated_degrees(form):
+def attach_estimated_degrees(form, max_degree=None, cache=None, policy="cap", breakdowns=None):
     """Attach estimated polynomial degree to a form's integrals.
 
     :arg form: The :class:`~.Form` to inspect.
+    :arg max_degree: Optional threshold for the estimated degrees.
+    :arg cache: The :class:`~.DegreeEstimationCache` memoizing the
+        degrees of subexpressions, to reuse them across calls. By
+        default a new one is used, only shared by the integrals.
+    :arg policy: What to do with degrees above max_degree, ``"cap"`` to
+        attach max_degree instead, ``"warn"`` to warn and ``"error"``
+        to fail, reporting the critical path of the integrand.
+    :arg breakdowns: Optional list to append a
+        :class:`~.DegreeBreakdown` for each integral to.
     :returns: A new Form with estimate degrees attached.
     """
+    if policy not in ("cap", "warn", "error"):
+        error("Unknown estimated degree policy '%s'." % (policy,))
     integrals = form.integrals()
+    if cache is None:
+        cache = DegreeEstimationCache()
+
+    # Estimate the degrees of all integrands together, such that
+    # subexpressions shared between integrals are estimated once
+    degrees = cache.estimate([integral.integrand() for integral in integrals])
 
     new_integrals = []
-    for integral in integrals:
+    for integral, degree in zip(integrals, degrees):
+        breakdown = None
+        if breakdowns is not None or (exceeds_degree(degree, max_degree) and policy != "cap"):
+            path = estimate_degree_breakdown(integral.integrand())[1]
+            breakdown = DegreeBreakdown(integral.integral_type(), integral.subdomain_id(), degree, path)
+            if breakdowns is not None:
+                breakdowns.append(breakdown)
+        if exceeds_degree(degree, max_degree):
+            if policy == "error":
+                error("Estimated polynomial degree exceeds %d in %s." % (max_degree, breakdown))
+            elif policy == "warn":
+                warning("Estimated polynomial degree exceeds %d in %s." % (max_degree, breakdown))
+            else:
+                degree = cap_degree(degree, max_degree)
         md = {}
         md.update(integral.metadata())
-        degree = estimate_total_polynomial_degree(integral.integrand())
         md["estimated_polynomial_degree"] = degree
         new_integrals.append(integral.reconstruct(metadata=md))
     return Form(new_integrals)
 
 
-def compute_form_data(form,
-                      # Default arguments configured to behave the way old FFC expects it:
-                      do_apply_function_pullbacks=False,
-                      do_apply_integral_scaling=False,
-                      do_apply_geometry_lowering=False,
-                      preserve_geometry_types=(),
-                      do_apply_default_restrictions=True,
-                      do_apply_restrictions=True,
-                      do_estimate_degrees=True,
-                      do_append_everywhere_integrals=True,
-                      complex_mode=False,
-                      ):
-
-    # TODO: Move this to the constructor instead
-    self = FormData()
-
-    # --- Store untouched form for reference.
-    # The user of FormData may get original arguments,
-    # original coefficients, and form signature from this object.
-    # But be aware that the set of original coefficients are not
-    # the same as the ones used in the final UFC form.
-    # See 'reduced_coefficients' below.
-    self.original_form = form
+def _geometry_lowering_rules(preserve_types, share_integrals=False):
+    "Return a factory for geometry lowering rules per integral type, see apply_geometry_lowering."
+    # If sharing results between integrals, one applier for each set
+    # of preserved types, such that integrals of different types can be
+    # lowered together
+    appliers = {}
 
-    # --- Pass form integrands through some symbolic manipulation
+    def rules(integral_type):
+        if integral_type in (custom_integral_types + point_integral_types):
+            automatic_preserve_types = [SpatialCoordinate, Jacobian]
+        else:
+            automatic_preserve_types = [CellCoordinate]
+        types = frozenset(preserve_types) | frozenset(automatic_preserve_types)
+        if not share_integrals:
+            return GeometryLoweringApplier(types)
+        if types not in appliers:
+            appliers[types] = GeometryLoweringApplier(types)
+        return appliers[types]
+    return rules
+
+
+def _build_symbolic_passes(original_form,
+                           do_apply_function_pullbacks,
+                           do_apply_integral_scaling,
+                           do_apply_geometry_lowering,
+                           preserve_geometry_types,
+                           do_apply_default_restrictions,
+                           do_apply_restrictions,
+                           do_estimate_degrees,
+                           do_append_everywhere_integrals,
+                           complex_mode,
+                           max_estimated_degree=None,
+                           estimated_degree_policy="cap",
+                           degree_breakdowns=None,
+                           degree_cache=None,
+                           do_share_integrals=False):
+    """Build the sequence of symbolic processing passes applied
+    to the form integrands by compute_form_data.
+
+    If degree_breakdowns is a list, the degree estimation pass appends
+    a DegreeBreakdown for each integral to it. The degree estimation
+    pass memoizes degrees in degree_cache if given. If
+    do_share_integrals is true, the derivative and geometry lowering
+    passes apply the same rules to all integrals, otherwise new rules
+    for each integral."""
+    passes = []
 
     # Note: Default behaviour here will process form the way that is
     # currently expected by vanilla FFC
 
+    interior_facet_types = [k for k in integral_type_to_measure_name.keys()
+                            if k.startswith("interior_facet")]
+    if do_share_integrals:
+        derivative_rules = DerivativeRuleDispatcher()
+    else:
+        # A dispatcher for each integral, such that the memoized
+        # derivatives are not shared between integrals
+        def derivative_rules(integral_type):
+            return DerivativeRuleDispatcher()
+    derivative_pass = IntegrandPass("apply_derivatives", derivative_rules,
+                                    rejects=("derivative",))
+    geometry_lowering_pass = IntegrandPass("apply_geometry_lowering",
+                                           _geometry_lowering_rules(preserve_geometry_types,
+                                                                    do_share_integrals),
+                                           keeps_zero_integrals=True)
+
     # Check that the form does not try to compare complex quantities:
     # if the quantites being compared are 'provably' real, wrap them
     # with Real, otherwise throw an error.
     if complex_mode:
-        form = do_comparison_check(form)
+        passes.append(IntegrandPass("do_comparison_check", CheckComparisons()))
 
     # Lower abstractions for tensor-algebra types into index notation,
     # reducing the number of operators later algorithms and form
     # compilers need to handle
-    form = apply_algebra_lowering(form)
+    passes.append(IntegrandPass("apply_algebra_lowering", LowerCompoundAlgebra(),
+                                eliminates=(CompoundTensorOperator, Div, NablaDiv, NablaGrad, Curl)))
 
     # After lowering to index notation, remove any complex nodes that
     # have been introduced but are not wanted when working in real mode,
     # allowing for purely real forms to be written
     if not complex_mode:
-        form = remove_complex_nodes(form)
+        passes.append(IntegrandPass("remove_complex_nodes", ComplexNodeRemoval()))
 
     # Apply differentiation before function pullbacks, because for
     # example coefficient derivatives are more complicated to derive
     # after coefficients are rewritten, and in particular for
     # user-defined coefficient relations it just gets too messy
-    form = apply_derivatives(form)
+    passes.append(derivative_pass)
 
     # --- Group form integrals
     # TODO: Refactor this, it's rather opaque what this does
     # TODO: Is self.original_form.ufl_domains() right here?
     #       It will matter when we start including 'num_domains' in ufc form.
-    form = group_form_integrals(form, self.original_form.ufl_domains(),
-                                do_append_everywhere_integrals=do_append_everywhere_integrals)
+    def _group_form_integrals(form):
+        return group_form_integrals(form, original_form.ufl_domains(),
+                                    do_append_everywhere_integrals=do_append_everywhere_integrals)
+    passes.append(FormPass("group_form_integrals", _group_form_integrals))
 
     # Estimate polynomial degree of integrands now, before applying
     # any pullbacks and geometric lowering.  Otherwise quad degrees
     # blow up horrifically.
     if do_estimate_degrees:
-        form = attach_estimated_degrees(form)
+        passes.append(FormPass("attach_estimated_degrees",
+                               partial(attach_estimated_degrees, max_degree=max_estimated_degree,
+                                       cache=degree_cache, policy=estimated_degree_policy,
+                                       breakdowns=degree_breakdowns)))
 
     if do_apply_function_pullbacks:
         # Rewrite coefficients and arguments in terms of their
@@ -284,49 +357,180 @@ def compute_form_data(form,
         # Decision: Not supporting grad(dolfin.Expression) without a
         #           Domain.  Current dolfin works if Expression has a
         #           cell but this should be changed to a mesh.
-        form = apply_function_pullbacks(form)
+        passes.append(IntegrandPass("apply_function_pullbacks", FunctionPullbackApplier()))
 
     # Scale integrals to reference cell frames
     if do_apply_integral_scaling:
-        form = apply_integral_scaling(form)
+        passes.append(FormPass("apply_integral_scaling", apply_integral_scaling))
 
     # Apply default restriction to fully continuous terminals
     if do_apply_default_restrictions:
-        form = apply_default_restrictions(form)
+        passes.append(IntegrandPass("apply_default_restrictions", DefaultRestrictionApplier(),
+                                    integral_types=interior_facet_types))
 
     # Lower abstractions for geometric quantities into a smaller set
     # of quantities, allowing the form compiler to deal with a smaller
     # set of types and treating geometric quantities like any other
     # expressions w.r.t. loop-invariant code motion etc.
     if do_apply_geometry_lowering:
-        form = apply_geometry_lowering(form, preserve_geometry_types)
+        passes.append(geometry_lowering_pass)
 
     # Apply differentiation again, because the algorithms above can
     # generate new derivatives or rewrite expressions inside
     # derivatives
     if do_apply_function_pullbacks or do_apply_geometry_lowering:
-        form = apply_derivatives(form)
+        passes.append(derivative_pass)
 
         # Neverending story: apply_derivatives introduces new Jinvs,
         # which needs more geometry lowering
         if do_apply_geometry_lowering:
-            form = apply_geometry_lowering(form, preserve_geometry_types)
+            passes.append(geometry_lowering_pass)
             # Lower derivatives that may have appeared
-            form = apply_derivatives(form)
+            passes.append(derivative_pass)
 
-    form = apply_coordinate_derivatives(form)
+    passes.append(IntegrandPass("apply_coordinate_derivatives", CoordinateDerivativeRuleDispatcher(),
+                                rejects=("derivative",)))
 
     # Propagate restrictions to terminals
     if do_apply_restrictions:
-        form = apply_restrictions(form)
+        passes.append(IntegrandPass("apply_restrictions", RestrictionPropagator(),
+                                    integral_types=interior_facet_types))
 
     # If in real mode, remove any complex nodes introduced during form processing.
     if not complex_mode:
-        form = remove_complex_nodes(form)
+        passes.append(IntegrandPass("remove_complex_nodes", ComplexNodeRemoval()))
+
+    return passes
+
+
+def compute_form_data(form,
+                      # Default arguments configured to behave the way old FFC expects it:
+                      do_apply_function_pullbacks=False,
+                      do_apply_integral_scaling=False,
+                      do_apply_geometry_lowering=False,
+                      preserve_geometry_types=(),
+                      do_apply_default_restrictions=True,
+                      do_apply_restrictions=True,
+                      do_estimate_degrees=True,
+                      do_append_everywhere_integrals=True,
+                      complex_mode=False,
+                      do_fuse_passes=False,
+                      cache=None,
+                      executor=None,
+                      do_profile_passes=False,
+                      profile_callback=None,
+                      do_eliminate_common_subexpressions=False,
+                      do_simplify=False,
+                      max_estimated_degree=None,
+                      estimated_degree_policy="cap",
+                      do_estimated_degree_breakdown=False,
+                      degree_cache=None,
+                      do_share_integrals=False,
+                      ):
+
+    pass_parameters = dict(do_apply_function_pullbacks=do_apply_function_pullbacks,
+                           do_apply_integral_scaling=do_apply_integral_scaling,
+                           do_apply_geometry_lowering=do_apply_geometry_lowering,
+                           preserve_geometry_types=preserve_geometry_types,
+                           do_apply_default_restrictions=do_apply_default_restrictions,
+                           do_apply_restrictions=do_apply_restrictions,
+                           do_estimate_degrees=do_estimate_degrees,
+                           do_append_everywhere_integrals=do_append_everywhere_integrals,
+                           complex_mode=complex_mode,
+                           max_estimated_degree=max_estimated_degree,
+                           estimated_degree_policy=estimated_degree_policy,
+                           do_share_integrals=do_share_integrals)
+
+    # Reuse form data from a persistent cache if provided, see
+    # ufl.algorithms.formdata_cache.FormDataCache. The passes are not
+    # run on a cache hit, so the cache is not read when profiling them.
+    profiling = do_profile_passes or profile_callback is not None
+    if cache is not None:
+        parameters = dict(pass_parameters,
+                          preserve_geometry_types=tuple(preserve_geometry_types),
+                          do_eliminate_common_subexpressions=do_eliminate_common_subexpressions,
+                          do_simplify=do_simplify,
+                          do_estimated_degree_breakdown=do_estimated_degree_breakdown)
+        self = None if profiling else cache.load(form, parameters)
+        if self is not None:
+            if do_fuse_passes:
+                # The grouping of the passes does not depend on the
+                # integrands, plan it without running the passes
+                passes = _build_symbolic_passes(form, **pass_parameters)
+                self.pass_fusion_report = plan_pass_fusion(passes)[1]
+            return self
+
+    # TODO: Move this to the constructor instead
+    self = FormData()
+
+    # --- Store untouched form for reference.
+    # The user of FormData may get original arguments,
+    # original coefficients, and form signature from this object.
+    # But be aware that the set of original coefficients are not
+    # the same as the ones used in the final UFC form.
+    # See 'reduced_coefficients' below.
+    self.original_form = form
+
+    # --- Pass form integrands through some symbolic manipulation
+    # Record the critical path of the estimated degree of each integral
+    # if requested, see ufl.algorithms.estimate_degrees.DegreeBreakdown
+    degree_breakdowns = None
+    if do_estimated_degree_breakdown:
+        degree_breakdowns = []
+        self.degree_breakdowns = degree_breakdowns
+    passes = _build_symbolic_passes(self.original_form, degree_breakdowns=degree_breakdowns,
+                                    degree_cache=degree_cache, **pass_parameters)
+
+    # Record time and work of each pass if requested, see
+    # ufl.algorithms.pass_profiling
+    profiler = None
+    if profiling:
+        profiler = PassProfiler(profile_callback)
+        self.pass_profile = profiler.report
+
+    if executor is not None:
+        # Apply the integrand passes to the integrals in parallel, the
+        # workers rebuild the passes which don't need the original form.
+        # Each integral is mapped by itself, also if do_share_integrals
+        pass_factory = partial(_build_symbolic_passes, None, **pass_parameters)
+        form, report = apply_pass_pipeline_parallel(passes, pass_factory, form, executor,
+                                                    fuse=do_fuse_passes, profiler=profiler)
+        if do_fuse_passes:
+            self.pass_fusion_report = report
+    elif do_fuse_passes:
+        # Apply compatible consecutive passes in a single traversal
+        # of each integrand
+        form, self.pass_fusion_report = apply_pass_pipeline(passes, form, profiler,
+                                                            share_integrals=do_share_integrals)
+    else:
+        for p in passes:
+            form = apply_pipeline_step(p if isinstance(p, FormPass) else [p], form, profiler,
+                                       share_integrals=do_share_integrals)
+
+    # Apply algebraic simplification rules if requested, see
+    # ufl.algorithms.simplification
+    if do_simplify:
+        if profiler is None:
+            form = simplify(form)
+        else:
+            form = profiler.apply("simplify", simplify, form)
+
+    # Merge subexpressions equal up to the naming of bound indices if
+    # requested, see ufl.algorithms.eliminate_common_subexpressions
+    if do_eliminate_common_subexpressions:
+        if profiler is None:
+            form, self.cse_report = eliminate_common_subexpressions(form, report=True)
+        else:
+            form, self.cse_report = profiler.timed("eliminate_common_subexpressions",
+                                                   eliminate_common_subexpressions, form, True)
 
     # --- Group integrals into IntegralData objects
     # Most of the heavy lifting is done above in group_form_integrals.
-    self.integral_data = build_integral_data(form.integrals())
+    if profiler is None:
+        self.integral_data = build_integral_data(form.integrals())
+    else:
+        self.integral_data = profiler.timed("build_integral_data", build_integral_data,
+                                            form.integrals())
 
     # --- Create replacements for arguments and coefficients
 
@@ -400,14 +604,19 @@ def compute_form_data(form,
     _check_elements(self)
     _check_facet_geometry(self.integral_data)
 
-    # TODO: This is a very expensive check... Replace with something
-    # faster!
-    preprocessed_form = reconstruct_form_from_integral_data(self.integral_data)
-
-    check_form_arity(preprocessed_form, self.original_form.arguments(), complex_mode)  # Currently testing how fast this is
+    # Check that each integrand is linear in the form arguments, in a
+    # single sweep over all integrands
+    if profiler is None:
+        check_integral_data_arity(self.integral_data, self.original_form.arguments(), complex_mode)
+    else:
+        profiler.timed("check_form_arity", check_integral_data_arity,
+                       self.integral_data, self.original_form.arguments(), complex_mode)
 
     # TODO: This member is used by unit tests, change the tests to
     # remove this!
-    self.preprocessed_form = preprocessed_form
+    self.preprocessed_form = reconstruct_form_from_integral_data(self.integral_data)
+
+    if cache is not None:
+        cache.store(self.original_form, parameters, self)
 
     return self
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Common subexpression elimination for expressions and forms.
+
+The result cache of ``map_expr_dags`` merges subexpressions which are
+equal after reconstruction.  Subexpressions produced separately, for
+example by the rules in ``apply_derivatives``, are however rarely equal
+because each ``IndexSum`` and ``ComponentTensor`` binds freshly created
+indices.  This pass renames the indices bound by these operators to
+canonical indices, chosen by the nesting depth of index bindings, such
+that equal subexpressions up to the naming of bound indices become equal
+and are merged.  Operand sorting in sums and products then also sees the
+canonical indices.
+
+In addition ``Indexed(ComponentTensor(A, ii), jj)`` is collapsed into
+``A`` with the indices ``ii`` replaced by ``jj``, if ``jj`` are free
+indices.
+"""
+
+# Copyright (C) 2019 The FEniCS Project
+#
+# This file is part of UFL (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+from ufl.log import error
+from ufl.core.expr import Expr
+from ufl.core.multiindex import Index, MultiIndex
+from ufl.tensors import ComponentTensor
+from ufl.form import Form
+from ufl.corealg.multifunction import MultiFunction
+from ufl.corealg.map_dag import map_expr_dags
+from ufl.corealg.traversal import unique_pre_traversal
+from ufl.algorithms.renumbering import substitute_free_indices
+
+
+class CommonSubexpressionEliminator(MultiFunction):
+    """Rules renaming bound indices to canonical indices and collapsing
+    indexed component tensors, to be applied with ``map_expr_dag``.
+
+    The canonical indices are created by the instance, so expressions
+    mapped with the same instance share them.
+    """
+
+    def __init__(self):
+        MultiFunction.__init__(self)
+        # Canonical index for each binding depth
+        self._canonical = []
+        # Maximal binding depth of the canonical indices in each result
+        self._depth = {}
+
+    def _canonical_indices(self, depth, n):
+        while len(self._canonical) < depth + n:
+            self._canonical.append(Index())
+        return self._canonical[depth:depth + n]
+
+    def _get_depth(self, o):
+        if o._ufl_is_terminal_:
+            return 0
+        return self._depth.get(o, 0)
+
+    def terminal(self, o):
+        return o
+
+    def expr(self, o, *ops):
+        r = self.reuse_if_untouched(o, *ops)
+        if not r._ufl_is_terminal_:
+            self._depth[r] = max(self._get_depth(op) for op in ops)
+        return r
+
+    def _bind(self, o, A, ii):
+        "Reconstruct the index binding o of A over ii with canonical indices."
+        depth = self._get_depth(A)
+        canonical = self._canonical_indices(depth, len(ii))
+        mapping = {i.count(): j for i, j in zip(ii, canonical) if i != j}
+        if mapping:
+            A = substitute_free_indices(A, mapping)
+            self._depth[A] = depth
+        r = o._ufl_expr_reconstruct_(A, MultiIndex(tuple(canonical)))
+        if not r._ufl_is_terminal_:
+            self._depth[r] = max(self._depth.get(r, 0), depth + len(ii))
+        return r
+
+    def index_sum(self, o, A, ii):
+        return self._bind(o, A, ii)
+
+    def component_tensor(self, o, A, ii):
+        return self._bind(o, A, ii)
+
+    def indexed(self, o, A, jj):
+        # Fixed indices are not substituted, picking several components
+        # of a tensor would copy the expression for each component
+        if (isinstance(A, ComponentTensor) and all(isinstance(j, Index) for j in jj) and
+                len(set(jj)) == len(jj) and
+                not any(j.count() in A.ufl_free_indices for j in jj)):
+            # A[jj] with A = as_tensor(B, ii) is B with ii replaced by jj
+            B, ii = A.ufl_operands
+            r = substitute_free_indices(B, {i.count(): j for i, j in zip(ii, jj)})
+            if not r._ufl_is_terminal_:
+                self._depth[r] = self._get_depth(B)
+            return r
+        return self.expr(o, A, jj)
+
+
+class CommonSubexpressionReport(object):
+    """Number of unique nodes in the integrands before and after
+    common subexpression elimination."""
+
+    def __init__(self, nodes_before, nodes_after):
+        self.nodes_before = nodes_before
+        self.nodes_after = nodes_after
+
+    def reduction(self):
+        "Return the relative reduction of the number of nodes."
+        if not self.nodes_before:
+            return 0.0
+        return 1.0 - self.nodes_after / self.nodes_before
+
+    def __str__(self):
+        return ("Common subexpression elimination: %d -> %d nodes (%.1f%% fewer)"
+                % (self.nodes_before, self.nodes_after, 100.0 * self.reduction()))
+
+
+def _count_unique_nodes(expressions):
+    visited = set()
+    for e in expressions:
+        for o in unique_pre_traversal(e, visited):
+            pass
+    return len(visited)
+
+
+def eliminate_common_subexpressions(expression, report=False):
+    """Merge subexpressions of an expression or of the integrands of a
+    form which are equal up to the naming of bound indices, and collapse
+    indexed component tensors.
+
+    The integrands of a form are mapped together, such that
+    subexpressions shared between integrals are also merged.  If report
+    is true, returns the result and a :class:`CommonSubexpressionReport`.
+    """
+    if isinstance(expression, Form):
+        integrals = expression.integrals()
+        expressions = [itg.integrand() for itg in integrals]
+    elif isinstance(expression, Expr):
+        expressions = [expression]
+    else:
+        error("Expecting Form or Expr, not %s." % (expression,))
+
+    results = map_expr_dags(CommonSubexpressionEliminator(), expressions)
+
+    if isinstance(expression, Form):
+        result = Form([itg.reconstruct(integrand=r) if r is not itg.integrand() else itg
+                       for itg, r in zip(integrals, results)])
+    else:
+        result, = results
+
+    if report:
+        return result, CommonSubexpressionReport(_count_unique_nodes(expressions),
+                                                 _count_unique_nodes(results))
+    return result
@@ -10,15 +10,22 @@
 # Modified by Anders Logg, 2009-2010
 # Modified by Jan Blechta, 2012
 
+from collections import OrderedDict
+
 from ufl.log import warning, error
 from ufl.form import Form
 from ufl.integral import Integral
 from ufl.algorithms.multifunction import MultiFunction
-from ufl.corealg.map_dag import map_expr_dags
+from ufl.corealg.map_dag import map_expr_dags, MapCache
 from ufl.checks import is_cellwise_constant
 from ufl.constantvalue import IntValue
 
 
+# Default bound on the number of nodes with memoized degrees kept by a
+# DegreeEstimationCache, None for no bound
+DEGREE_MEMO_SIZE = 100000
+
+
 class IrreducibleInt(int):
     """Degree type used by quadrilaterals.
 
@@ -310,8 +317,133 @@ class SumDegreeEstimator(MultiFunction):
         return self._max_degrees(v, *o)
 
 
+class DegreeEstimationCache(object):
+    """Memo of the estimated degrees of expression nodes, reused across
+    integrals and forms.
+
+    The degrees are memoized for each default degree and element
+    replace map, the parameters of the :class:`SumDegreeEstimator`. At
+    most *memo_size* nodes are kept, the least recently used parameters
+    being dropped first. A *memo_size* of 0 disables the memo.
+    """
+
+    def __init__(self, memo_size=DEGREE_MEMO_SIZE):
+        # (default_degree, element replacements) -> (estimator, MapCache)
+        self._memo = OrderedDict()
+        self._memo_size = memo_size
+
+    def __len__(self):
+        return sum(len(c) for r, c in self._memo.values())
+
+    def clear(self):
+        self._memo.clear()
+
+    def estimate(self, expressions, default_degree=1, element_replace_map={}):
+        "Return the estimated total polynomial degree of each expression."
+        if self._memo_size == 0:
+            return map_expr_dags(SumDegreeEstimator(default_degree, element_replace_map), expressions,
+                                 compress=False)
+
+        key = (default_degree, frozenset(element_replace_map.items()))
+        entry = self._memo.get(key)
+        if entry is None:
+            entry = (SumDegreeEstimator(default_degree, element_replace_map), MapCache())
+            self._memo[key] = entry
+        else:
+            self._memo.move_to_end(key)
+        rules, cache = entry
+        try:
+            degrees = map_expr_dags(rules, expressions, compress=False, cache=cache)
+        except Exception:
+            # The cache is incomplete after an error
+            del self._memo[key]
+            raise
+
+        # Keep the memo bounded, dropping the least recently used
+        # parameters and finally the cache of the current ones
+        if self._memo_size is not None:
+            size = len(self)
+            while size > self._memo_size and len(self._memo) > 1:
+                r, c = self._memo.popitem(last=False)[1]
+                size -= len(c)
+            if size > self._memo_size:
+                cache.clear()
+        return degrees
+
+
+def cap_degree(degree, max_degree):
+    """Return degree bounded by max_degree, in each direction for
+    tensor product degrees."""
+    if max_degree is None:
+        return degree
+    if isinstance(degree, tuple):
+        return tuple(cap_degree(d, max_degree) for d in degree)
+    if degree > max_degree:
+        return type(degree)(max_degree)
+    return degree
+
+
+def _degree_key(degree):
+    "Return a number ordering degrees, the largest direction of tensor product degrees."
+    if degree is None:
+        return -1
+    if isinstance(degree, tuple):
+        return max(degree)
+    return degree
+
+
+def exceeds_degree(degree, max_degree):
+    "Return if degree exceeds max_degree in any direction."
+    return max_degree is not None and _degree_key(degree) > max_degree
+
+
+class DegreeBreakdown(object):
+    """Estimated degree of an integrand and the critical path of
+    subexpressions driving it.
+
+    :arg integral_type: Integral type of the integral.
+    :arg subdomain_id: Subdomain id of the integral.
+    :arg degree: Estimated degree of the integrand.
+    :arg path: List of (expression, estimated degree) pairs, from the
+        integrand to a terminal, each followed by its operand of
+        highest degree.
+    """
+
+    def __init__(self, integral_type, subdomain_id, degree, path):
+        self.integral_type = integral_type
+        self.subdomain_id = subdomain_id
+        self.degree = degree
+        self.path = path
+
+    def path_str(self):
+        "Return the critical path as a compact string of node types and degrees."
+        return " -> ".join("%s(%s)" % (o._ufl_class_.__name__, d) for o, d in self.path)
+
+    def __str__(self):
+        return ("%s integral over subdomain %s, estimated degree %s: %s"
+                % (self.integral_type, self.subdomain_id, self.degree, self.path_str()))
+
+
+def estimate_degree_breakdown(e, default_degree=1, element_replace_map={}):
+    """Return the estimated total polynomial degree of expression e and
+    its critical path, the list of (subexpression, degree) pairs from e
+    to a terminal following the operand of highest degree."""
+    cache = MapCache()
+    degree, = map_expr_dags(SumDegreeEstimator(default_degree, element_replace_map), [e],
+                            compress=False, cache=cache)
+    degrees = cache.vcache
+    path = [(e, degree)]
+    while not e._ufl_is_terminal_:
+        operands = [op for op in e.ufl_operands if degrees.get(op) is not None]
+        if not operands:
+            break
+        e = max(operands, key=lambda op: _degree_key(degrees[op]))
+        path.append((e, degrees[e]))
+    return degree, path
+
+
 def estimate_total_polynomial_degree(e, default_degree=1,
-                                     element_replace_map={}):
+                                     element_replace_map={}, cache=None):
     """Estimate total polynomial degree of integrand.
 
     NB! Although some compound types are supported here,
@@ -321,15 +453,22 @@ def estimate_total_polynomial_degree(e, default_degree=1,
 
     For coefficients defined on an element with unspecified degree (None),
     the degree is set to the given default degree.
+
+    The degrees of subexpressions are memoized in the given
+    :class:`DegreeEstimationCache`, to reuse them across calls. By
+    default a new cache is used for each call, such that no references
+    to the expressions are kept.
     """
-    de = SumDegreeEstimator(default_degree, element_replace_map)
+    if cache is None:
+        cache = DegreeEstimationCache()
     if isinstance(e, Form):
         if not e.integrals():
             error("Got form with no integrals!")
-        degrees = map_expr_dags(de, [it.integrand() for it in e.integrals()])
+        expressions = [it.integrand() for it in e.integrals()]
     elif isinstance(e, Integral):
-        degrees = map_expr_dags(de, [e.integrand()])
+        expressions = [e.integrand()]
     else:
-        degrees = map_expr_dags(de, [e])
+        expressions = [e]
+    degrees = cache.estimate(expressions, default_degree, element_replace_map)
     degree = max(degrees) if degrees else default_degree
     return degree
@@ -0,0 +1,706 @@
+# -*- coding: utf-8 -*-
+"""Compilation of expressions to generated Python functions.
+
+An expression is lowered to Python code with one statement per
+scalar component of each operator node, with index notation and tensor
+construction resolved at code generation time.  The generated code is
+memoized per expression signature, so that repeated evaluation skips
+both the DAG traversal and the type dispatch of ``Expr.__call__``.
+
+The code is generated in two variants: for evaluation in a single
+point with Python scalars, giving the same results as
+``Expr.__call__``, and for evaluation in a batch of points with NumPy
+arrays as in :func:`ufl.algorithms.evaluate_batch`.  In a single
+point, only the branch of a conditional selected by its condition is
+evaluated, in a batch of points both branches are evaluated and
+combined with ``numpy.where``.
+
+.. code-block:: python
+
+    f = compile_expression(sin(x[0]) * u)
+    f((0.5, 0.3), {u: 2.0})          # Same as expr((0.5, 0.3), {u: 2.0})
+    f(points, {u: values})           # Arrays of shape (N, gdim) and (N,)
+"""
+
+# Copyright (C) 2019 The FEniCS Project
+#
+# This file is part of UFL (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import cmath
+import itertools
+import math
+import numbers
+from collections import OrderedDict
+from weakref import WeakKeyDictionary
+
+import numpy
+
+from ufl.log import error, warning
+from ufl.utils.stacks import StackDict
+from ufl.core.multiindex import FixedIndex
+from ufl.corealg.multifunction import MultiFunction
+from ufl.corealg.traversal import unique_post_traversal, traverse_unique_terminals
+from ufl.constantvalue import as_ufl
+from ufl.classes import (Grad, ReferenceGrad, Restricted, Terminal, IntValue,
+                         ConstantValue, SpatialCoordinate, MultiIndex, Label)
+from ufl.algorithms.signature import compute_expression_signature
+from ufl.algorithms.batch_evaluation import (_as_array, _constant_value, _point_values,
+                                             _batch_erf, _batch_atan_2)
+
+
+# --- Helper functions for evaluation in a single point, these mirror
+# --- the evaluate methods of the expression classes
+
+# Marks derivatives of terminals with a constant value in the mapping
+_ZERO_DERIVATIVE = object()
+
+
+def _scalar_lookup(mapping, t, x, derivatives):
+    f = mapping.get(t)
+    if f is None:
+        return None
+    if callable(f):
+        if derivatives:
+            return f(x, derivatives)
+        return f(x)
+    if derivatives:
+        return _ZERO_DERIVATIVE
+    return f
+
+
+def _scalar_component(f, t, x, mapping, component, derivatives):
+    if f is None:
+        # Not in the mapping, let the terminal evaluate itself
+        if derivatives:
+            return t.evaluate(x, mapping, component, StackDict(), derivatives)
+        return t.evaluate(x, mapping, component, StackDict())
+    if f is _ZERO_DERIVATIVE:
+        return 0.0
+    for c in component:
+        f = f[c]
+    return f
+
+
+def _scalar_coordinate(x, i):
+    return float(x[i])
+
+
+def _scalar_div(a, b):
+    # Avoiding integer division by casting to float
+    try:
+        return float(a) / float(b)
+    except TypeError:
+        return complex(a) / complex(b)
+
+
+def _scalar_math_function(name):
+    def f(a):
+        try:
+            if isinstance(a, numbers.Real):
+                return getattr(math, name)(a)
+            else:
+                return getattr(cmath, name)(a)
+        except ValueError:
+            warning('Value error in evaluation of function %s with argument %s.' % (name, a))
+            raise
+    return f
+
+
+def _scalar_ln(a):
+    try:
+        return math.log(a)
+    except TypeError:
+        return cmath.log(a)
+
+
+def _scalar_atan_2(a, b):
+    try:
+        return math.atan2(a, b)
+    except TypeError:
+        error('Atan2 does not support complex numbers.')
+    except ValueError:
+        warning('Value error in evaluation of function atan_2 with arguments %s, %s.' % (a, b))
+        raise
+
+
+def _erf(a):
+    from ufl.mathfunctions import _find_erf
+    erf = _find_erf()
+    if erf is None:
+        error("No python implementation of erf available on this system, cannot evaluate. Upgrade python or install scipy.")
+    return erf(a)
+
+
+def _bessel(name, nu, a):
+    try:
+        import scipy.special
+    except ImportError:
+        error("You must have scipy installed to evaluate bessel functions in python.")
+    return getattr(scipy.special, name)(nu, a)
+
+
+def _scalar_min_value(a, b):
+    try:
+        return min(a, b)
+    except ValueError:
+        warning('Value error in evaluation of min() of %s and %s.' % (a, b))
+        raise
+
+
+def _scalar_max_value(a, b):
+    try:
+        return max(a, b)
+    except ValueError:
+        warning('Value error in evaluation of max() of %s and %s.' % (a, b))
+        raise
+
+
+_scalar_namespace = {
+    "StackDict": StackDict,
+    "_lookup": _scalar_lookup,
+    "_component": _scalar_component,
+    "_coordinate": _scalar_coordinate,
+    "_div": _scalar_div,
+    "_ln": _scalar_ln,
+    "_atan_2": _scalar_atan_2,
+    "_erf": _erf,
+    "_bessel": _bessel,
+    "_eq": lambda a, b: bool(a == b),
+    "_ne": lambda a, b: bool(a != b),
+    "_le": lambda a, b: bool(a <= b),
+    "_ge": lambda a, b: bool(a >= b),
+    "_lt": lambda a, b: bool(a < b),
+    "_gt": lambda a, b: bool(a > b),
+    "_and": lambda a, b: bool(a and b),
+    "_or": lambda a, b: bool(a or b),
+    "_not": lambda a: bool(not a),
+    "_min_value": _scalar_min_value,
+    "_max_value": _scalar_max_value,
+}
+for _name in ("sqrt", "exp", "cos", "sin", "tan", "cosh", "sinh", "tanh", "acos", "asin", "atan"):
+    _scalar_namespace["_" + _name] = _scalar_math_function(_name)
+
+
+# --- Helper functions for evaluation in a batch of points, with the
+# --- coordinates passed component first as an array of shape (gdim, N)
+
+def _batch_lookup(mapping, t, x, derivatives):
+    f = mapping.get(t)
+    if f is None:
+        return _ZERO_DERIVATIVE if derivatives else _constant_value(t)
+    if callable(f):
+        if derivatives:
+            f = f(x, derivatives)
+        else:
+            f = f(x)
+        a = _point_values(f, t.ufl_shape, x.shape[1], component_first=True)
+    elif derivatives:
+        return _ZERO_DERIVATIVE
+    else:
+        a = _point_values(f, t.ufl_shape, x.shape[1])
+    # Point axis last, such that components are picked first
+    return numpy.moveaxis(a, 0, -1)
+
+
+def _batch_component(f, t, x, mapping, component, derivatives):
+    if f is _ZERO_DERIVATIVE:
+        return 0.0
+    for c in component:
+        f = f[c]
+    return f
+
+
+_batch_namespace = {
+    "StackDict": StackDict,
+    "_lookup": _batch_lookup,
+    "_component": _batch_component,
+    "_coordinate": lambda x, i: x[i],
+    "_div": numpy.true_divide,
+    "_sqrt": numpy.sqrt,
+    "_exp": numpy.exp,
+    "_ln": numpy.log,
+    "_cos": numpy.cos,
+    "_sin": numpy.sin,
+    "_tan": numpy.tan,
+    "_cosh": numpy.cosh,
+    "_sinh": numpy.sinh,
+    "_tanh": numpy.tanh,
+    "_acos": numpy.arccos,
+    "_asin": numpy.arcsin,
+    "_atan": numpy.arctan,
+    "_atan_2": _batch_atan_2,
+    "_erf": _batch_erf,
+    "_bessel": _bessel,
+    "_eq": numpy.equal,
+    "_ne": numpy.not_equal,
+    "_le": numpy.less_equal,
+    "_ge": numpy.greater_equal,
+    "_lt": numpy.less,
+    "_gt": numpy.greater,
+    "_and": numpy.logical_and,
+    "_or": numpy.logical_or,
+    "_not": numpy.logical_not,
+    "_where": numpy.where,
+    "_min_value": numpy.minimum,
+    "_max_value": numpy.maximum,
+}
+
+
+# --- Code generation
+
+def _components(shape):
+    "Iterate over all components of a shape in row-major order."
+    return itertools.product(*[range(n) for n in shape])
+
+
+def _literal(value):
+    "Return Python source for a number."
+    if isinstance(value, float) and not math.isfinite(value):
+        return "float(%r)" % repr(value)
+    return repr(value)
+
+
+class ExpressionCodeGenerator(MultiFunction):
+    """Generate code for the scalar components of each node.
+
+    The handlers return a dict mapping each component of a node,
+    followed by the values of its free indices, to the Python source
+    of the value, which is a variable name or a literal.
+    """
+
+    def __init__(self, terminals):
+        MultiFunction.__init__(self)
+        self.terminals = {t: k for k, t in enumerate(terminals)}
+        self.statements = []
+        self.dependencies = {}
+        self.lookups = {}
+        # Condition and branch values of the conditional statements
+        self.conditionals = {}
+
+    def emit(self, code, *operands):
+        "Add a statement computing code and return the variable name."
+        name = "v%d" % len(self.statements)
+        self.statements.append((name, code))
+        self.dependencies[name] = operands
+        return name
+
+    def _keys(self, o):
+        return _components(o.ufl_shape + o.ufl_index_dimensions)
+
+    def _map(self, o, template, *ops):
+        "Emit template applied to the same component of each operand."
+        values = {}
+        for key in self._keys(o):
+            args = [op[key] for op in ops]
+            values[key] = self.emit(template % tuple(args), *args)
+        return values
+
+    def _map_aligned(self, o, template, *ops):
+        """Emit template applied to operands, picking components by the
+        free index values of each operand."""
+        fi = o.ufl_free_indices
+        rank = len(o.ufl_shape)
+        operands = [(len(e.ufl_shape) == rank, [fi.index(i) for i in e.ufl_free_indices])
+                    for e in o.ufl_operands]
+        values = {}
+        for key in self._keys(o):
+            component, index_values = key[:rank], key[rank:]
+            args = [op[(component if shaped else ()) + tuple(index_values[p] for p in pos)]
+                    for op, (shaped, pos) in zip(ops, operands)]
+            values[key] = self.emit(template % tuple(args), *args)
+        return values
+
+    # --- Terminals
+
+    def _terminal_value(self, t, o):
+        "Emit lookup of the components of terminal t or derivatives o of it."
+        k = self.terminals[t]
+        rank = len(t.ufl_shape)
+        values = {}
+        for key in self._keys(o):
+            component = key[:rank]
+            derivatives = tuple(reversed(key[rank:]))
+            f = self.lookups.get((k, derivatives))
+            if f is None:
+                f = self.emit("_lookup(mapping, terminals[%d], x, %r)" % (k, derivatives))
+                self.lookups[(k, derivatives)] = f
+            values[key] = self.emit("_component(%s, terminals[%d], x, mapping, %r, %r)" % (
+                f, k, component, derivatives), f)
+        return values
+
+    def terminal(self, o):
+        return self._terminal_value(o, o)
+
+    def zero(self, o):
+        return {key: "0.0" for key in self._keys(o)}
+
+    def scalar_value(self, o):
+        return {(): _literal(o._value)}
+
+    def identity(self, o):
+        return {(a, b): "1" if a == b else "0" for a, b in self._keys(o)}
+
+    def permutation_symbol(self, o):
+        return {key: repr(o[key]) for key in self._keys(o)}
+
+    def spatial_coordinate(self, o):
+        return {(i,): self.emit("_coordinate(x, %d)" % i) for i, in self._keys(o)}
+
+    def multi_index(self, o):
+        return o
+
+    def label(self, o):
+        return o
+
+    # --- Derivatives of terminals, as left by expand_derivatives
+
+    def _terminal_derivative(self, o, *ops):
+        t = o
+        while isinstance(t, (Grad, ReferenceGrad, Restricted)):
+            t, = t.ufl_operands
+        if not isinstance(t, Terminal):
+            error("Expecting derivatives of terminals only in compiled expressions, got %s." % (o,))
+        return self._terminal_value(t, o)
+
+    grad = _terminal_derivative
+    reference_grad = _terminal_derivative
+
+    # --- Algebra
+
+    def sum(self, o, a, b):
+        return self._map_aligned(o, "%s + %s", a, b)
+
+    def product(self, o, a, b):
+        return self._map_aligned(o, "%s * %s", a, b)
+
+    def division(self, o, a, b):
+        return self._map_aligned(o, "_div(%s, %s)", a, b)
+
+    def power(self, o, a, b):
+        return self._map_aligned(o, "%s ** %s", a, b)
+
+    def abs(self, o, a):
+        return self._map(o, "abs(%s)", a)
+
+    def conj(self, o, a):
+        return self._map(o, "%s.conjugate()", a)
+
+    def real(self, o, a):
+        return self._map(o, "%s.real", a)
+
+    def imag(self, o, a):
+        return self._map(o, "%s.imag", a)
+
+    # --- Index notation and tensors, resolved at code generation time
+
+    def indexed(self, o, A, ii):
+        operand = o.ufl_operands[0]
+        fi = o.ufl_free_indices
+        values = {}
+        for key in self._keys(o):
+            index_values = dict(zip(fi, key))
+            component = tuple(int(i) if isinstance(i, FixedIndex) else index_values[i.count()]
+                              for i in ii)
+            values[key] = A[component + tuple(index_values[i] for i in operand.ufl_free_indices)]
+        return values
+
+    def index_sum(self, o, A, ii):
+        summand = o.ufl_operands[0]
+        rank = len(o.ufl_shape)
+        fi = o.ufl_free_indices
+        sfi = summand.ufl_free_indices
+        i = ii[0].count()
+        values = {}
+        for key in self._keys(o):
+            component, index_values = key[:rank], dict(zip(fi, key[rank:]))
+            terms = []
+            for k in range(o.dimension()):
+                index_values[i] = k
+                terms.append(A[component + tuple(index_values[j] for j in sfi)])
+            values[key] = self.emit(" + ".join(terms), *terms)
+        return values
+
+    def component_tensor(self, o, A, ii):
+        fi = o.ufl_free_indices
+        afi = o.ufl_operands[0].ufl_free_indices
+        rank = len(o.ufl_shape)
+        values = {}
+        for key in self._keys(o):
+            index_values = dict(zip(fi, key[rank:]))
+            index_values.update(zip([i.count() for i in ii], key[:rank]))
+            values[key] = A[tuple(index_values[i] for i in afi)]
+        return values
+
+    def list_tensor(self, o, *ops):
+        return {key: ops[key[0]][key[1:]] for key in self._keys(o)}
+
+    # --- Pass-through operators
+
+    def variable(self, o, a, label):
+        return a
+
+    def restricted(self, o, a):
+        return a
+
+    def cell_avg(self, o, a):
+        return a
+
+    def facet_avg(self, o, a):
+        return a
+
+    # --- Math functions
+
+    def math_function(self, o, a):
+        return self._map(o, "_%s(%%s)" % o._name, a)
+
+    def atan_2(self, o, a, b):
+        return self._map(o, "_atan_2(%s, %s)", a, b)
+
+    def erf(self, o, a):
+        return self._map(o, "_erf(%s)", a)
+
+    def bessel_function(self, o, nu, a):
+        name = o._name[-1]
+        if isinstance(o.ufl_operands[0], IntValue):
+            nu = {(): repr(int(o.ufl_operands[0]))}
+            functype = 'n' if name != 'i' else 'v'
+        else:
+            functype = 'v'
+        return self._map(o, "_bessel(%r, %%s, %%s)" % (name + functype), nu, a)
+
+    # --- Conditions
+
+    def binary_condition(self, o, a, b):
+        name = {"==": "eq", "!=": "ne", "<=": "le", ">=": "ge", "<": "lt", ">": "gt",
+                "&&": "and", "||": "or"}[o._name]
+        return {(): self.emit("_%s(%s, %s)" % (name, a[()], b[()]), a[()], b[()])}
+
+    def not_condition(self, o, a):
+        return {(): self.emit("_not(%s)" % a[()], a[()])}
+
+    def conditional(self, o, c, t, f):
+        c = c[()]
+        values = {}
+        for key in self._keys(o):
+            v = self.emit("_where(%s, %s, %s)" % (c, t[key], f[key]), c, t[key], f[key])
+            self.conditionals[v] = (c, t[key], f[key])
+            values[key] = v
+        return values
+
+    def min_value(self, o, a, b):
+        return self._map(o, "_min_value(%s, %s)", a, b)
+
+    def max_value(self, o, a, b):
+        return self._map(o, "_max_value(%s, %s)", a, b)
+
+    def expr(self, o, *ops):
+        error("Compilation of %s not available." % o._ufl_class_.__name__)
+
+    def _render(self, targets, available, indent, lines):
+        """Append the statements computing targets which are not
+        available to lines, evaluating only the selected branch of
+        conditionals."""
+        # Statements needed unconditionally, not following branches
+        needed = set()
+        stack = [v for v in targets if v in self.dependencies]
+        while stack:
+            v = stack.pop()
+            if v in needed or v in available:
+                continue
+            needed.add(v)
+            if v in self.conditionals:
+                deps = self.conditionals[v][:1]
+            else:
+                deps = self.dependencies[v]
+            stack.extend(u for u in deps if u in self.dependencies)
+
+        # Statement names are numbered in dependency order
+        available = set(available)
+        ind = "    " * indent
+        for v in sorted(needed, key=lambda v: int(v[1:])):
+            if v in self.conditionals:
+                c, t, f = self.conditionals[v]
+                lines.append("%sif %s:" % (ind, c))
+                self._render([t], available, indent + 1, lines)
+                lines.append("%s    %s = %s" % (ind, v, t))
+                lines.append("%selse:" % ind)
+                self._render([f], available, indent + 1, lines)
+                lines.append("%s    %s = %s" % (ind, v, f))
+            else:
+                lines.append("%s%s = %s" % (ind, v, self._code[v]))
+            available.add(v)
+
+    def generate(self, expression, name, lazy_conditionals=True):
+        """Return the source of a function evaluating all components of
+        expression.
+
+        If lazy_conditionals is true, the branches of conditionals are
+        evaluated in ``if`` statements, otherwise both are evaluated
+        and passed to ``_where``.
+        """
+        if not self.statements:
+            values = {}
+            for node in unique_post_traversal(expression):
+                values[node] = self(node, *[values[op] for op in node.ufl_operands])
+            self._results = [values[expression][key] for key in self._keys(expression)]
+            self._code = dict(self.statements)
+        results = self._results
+
+        lines = ["def %s(x, mapping, terminals):" % name]
+        if lazy_conditionals:
+            self._render(results, (), 1, lines)
+        else:
+            # Skip statements the results do not depend on
+            used = set()
+            stack = [r for r in results if r in self.dependencies]
+            while stack:
+                v = stack.pop()
+                if v not in used:
+                    used.add(v)
+                    stack.extend(u for u in self.dependencies[v] if u in self.dependencies)
+            lines += ["    %s = %s" % (v, code) for v, code in self.statements if v in used]
+        lines.append("    return [%s]" % ", ".join(results))
+        return "\n".join(lines) + "\n"
+
+
+# --- Caches of generated code and compiled expressions
+
+# Maximal number of expression signatures with generated code kept
+COMPILED_CODE_CACHE_SIZE = 1000
+
+# Map from expression signature to generated code, least recently used
+# first
+_compiled_code = OrderedDict()
+
+# Map from expressions to compiled expressions
+_compiled_expressions = WeakKeyDictionary()
+
+
+class _GeneratedCode(object):
+    """Generated sources for an expression signature, with functions
+    for each evaluation mode."""
+
+    def __init__(self, source, batch_source):
+        self.source = source
+        self.batch_source = batch_source
+        self.functions = {}
+
+    def function(self, batch):
+        f = self.functions.get(batch)
+        if f is None:
+            namespace = dict(_batch_namespace if batch else _scalar_namespace)
+            source = self.batch_source if batch else self.source
+            exec(compile(source, "<ufl compiled expression>", "exec"), namespace)
+            f = namespace["compiled_expression"]
+            self.functions[batch] = f
+        return f
+
+
+class CompiledExpression(object):
+    """An expression compiled to a Python function.
+
+    Call with a point and a mapping as ``Expr.__call__``, or with an
+    array of shape ``(N, gdim)``, or ``(N,)`` in 1D, of points and a
+    mapping as :func:`ufl.algorithms.evaluate_batch`.
+
+    The expression is not referenced, such that compiled expressions
+    cached for an expression do not keep it alive.
+    """
+
+    def __init__(self, shape, terminals, generated):
+        self.ufl_shape = shape
+        self.terminals = terminals
+        self._generated = generated
+
+    @property
+    def source(self):
+        "The generated Python source for evaluation in a single point."
+        return self._generated.source
+
+    @property
+    def batch_source(self):
+        "The generated Python source for evaluation in a batch of points."
+        return self._generated.batch_source
+
+    def __call__(self, x, mapping=None, component=()):
+        if mapping is None:
+            mapping = {}
+        shape = self.ufl_shape
+        if isinstance(x, numpy.ndarray):
+            if x.ndim == 1:
+                x = x.reshape((x.shape[0], 1))
+            if x.ndim != 2:
+                error("Expecting coordinates as an array of shape (N, gdim).")
+            xt = _as_array(x).T
+            values = self._generated.function(True)(xt, mapping, self.terminals)
+            values = numpy.broadcast_arrays(numpy.empty(x.shape[0]), *values)[1:]
+            result = numpy.array(values).T.reshape((x.shape[0],) + shape)
+            if component:
+                result = result[(slice(None),) + tuple(component)]
+            return result
+
+        if len(component) != len(shape):
+            error("Can only evaluate scalars, expecting a component "
+                  "tuple of length %d, not %s." % (len(shape), component))
+        values = self._generated.function(False)(x, mapping, self.terminals)
+        k = 0
+        for c, n in zip(component, shape):
+            k = k * n + c
+        return values[k]
+
+
+def _signature_renumbering(terminals):
+    "Number terminals and their domains by first occurrence."
+    renumbering = {}
+    for t in terminals:
+        for d in t.ufl_domains():
+            if d not in renumbering:
+                renumbering[d] = len(renumbering)
+        renumbering[t] = len(renumbering)
+    return renumbering
+
+
+def compile_expression(expression):
+    """Compile expression to a :class:`CompiledExpression`.
+
+    Derivatives are expanded first, as in ``Expr.__call__``.  The
+    generated code is shared between expressions with the same
+    signature, and the result is cached for each expression object.
+    The generated code of at most ``COMPILED_CODE_CACHE_SIZE``
+    signatures is kept, the least recently used being dropped first.
+    """
+    expression = as_ufl(expression)
+    compiled = _compiled_expressions.get(expression)
+    if compiled is not None:
+        return compiled
+
+    from ufl.algorithms.ad import expand_derivatives
+    expanded = expand_derivatives(expression)
+    if expanded.ufl_free_indices:
+        error("Cannot evaluate expression with free indices.")
+
+    # Terminals looked up at evaluation time, in order of first
+    # occurrence which is the same for expressions with equal signature
+    all_terminals = [t for t in traverse_unique_terminals(expanded)
+                     if not isinstance(t, (MultiIndex, Label))]
+    terminals = [t for t in all_terminals
+                 if not isinstance(t, (ConstantValue, SpatialCoordinate))]
+
+    signature = compute_expression_signature(expanded, _signature_renumbering(all_terminals))
+    generated = _compiled_code.get(signature)
+    if generated is None:
+        generator = ExpressionCodeGenerator(terminals)
+        generated = _GeneratedCode(
+            generator.generate(expanded, "compiled_expression"),
+            generator.generate(expanded, "compiled_expression", lazy_conditionals=False))
+        _compiled_code[signature] = generated
+        while len(_compiled_code) > COMPILED_CODE_CACHE_SIZE:
+            _compiled_code.popitem(last=False)
+    else:
+        _compiled_code.move_to_end(signature)
+
+    compiled = CompiledExpression(expanded.ufl_shape, tuple(terminals), generated)
+    _compiled_expressions[expression] = compiled
+    return compiled
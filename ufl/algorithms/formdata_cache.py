@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""Persistent on-disk cache of the FormData computed by compute_form_data."""
+
+# Copyright (C) 2019 The FEniCS Project
+#
+# This file is part of UFL (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import copy
+import hashlib
+import os
+import pickle
+import tempfile
+
+import ufl
+from ufl.log import warning, debug
+from ufl.integral import Integral
+from ufl.corealg.map_dag import map_expr_dag
+from ufl.algorithms.formdata import FormData
+from ufl.algorithms.replace import Replacer
+from ufl.algorithms.domain_analysis import reconstruct_form_from_integral_data
+
+# Increase this whenever the contents of FormData change in a way
+# that makes previously stored data invalid
+FORMDATA_CACHE_VERSION = 2
+
+# Attributes of FormData that are not stored but rebuilt on load
+_rebuilt_attributes = ("original_form", "preprocessed_form")
+
+# Attributes of FormData describing the run of compute_form_data
+# rather than its result, which are not stored
+_run_attributes = ("pass_profile", "pass_fusion_report")
+
+
+def _form_objects(form):
+    """Return the coefficients and domains of a form, in the
+    canonical order used by the form signature."""
+    renumbering = form._compute_renumbering()
+    domains = tuple(sorted((d for d in renumbering if d not in form.coefficient_numbering()),
+                           key=lambda d: renumbering[d]))
+    return form.coefficients(), domains
+
+
+def _strip_subdomain_data(integral):
+    "Return integral without subdomain data, which is not part of the signature."
+    return Integral(integral.integrand(), integral.integral_type(),
+                    integral.ufl_domain(), integral.subdomain_id(),
+                    integral.metadata(), None)
+
+
+class FormDataCache(object):
+    """An opt-in persistent cache of ``FormData`` objects, stored as
+    files in a directory and keyed by the form signature and the
+    parameters passed to ``compute_form_data``.
+
+    Pass an instance as the *cache* argument of ``compute_form_data``.
+    On a cache hit, the symbolic preprocessing is skipped and the
+    stored data is bound to the coefficients of the form being
+    processed. Stored data for forms over other domains
+    (meshes with a different ``ufl_id``) is not reused.
+
+    The pass profile is not stored, and the cache is not read when
+    profiling the passes of ``compute_form_data``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, form, parameters):
+        "Return the cache key for processing form with the given parameters."
+        h = hashlib.sha512()
+        h.update(repr((FORMDATA_CACHE_VERSION, ufl.__version__)).encode("utf-8"))
+        h.update(form.signature().encode("utf-8"))
+        h.update(repr(sorted(parameters.items())).encode("utf-8"))
+        return h.hexdigest()
+
+    def _filename(self, key):
+        return os.path.join(self.path, key + ".pickle")
+
+    def load(self, form, parameters):
+        "Return cached form data for form, or None if not found."
+        key = self.key(form, parameters)
+        try:
+            with open(self._filename(key), "rb") as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+        if data.get("version") != FORMDATA_CACHE_VERSION or data.get("key") != key:
+            return None
+        return self._rebuild_form_data(form, data)
+
+    def store(self, form, parameters, form_data):
+        "Store form data for form in the cache."
+        key = self.key(form, parameters)
+        attributes = {name: value for name, value in vars(form_data).items()
+                      if name not in _rebuilt_attributes and name not in _run_attributes}
+        integral_data = []
+        for itg_data in form_data.integral_data:
+            itg_data = copy.copy(itg_data)
+            itg_data.integrals = [_strip_subdomain_data(itg) for itg in itg_data.integrals]
+            integral_data.append(itg_data)
+        attributes["integral_data"] = integral_data
+        data = {"version": FORMDATA_CACHE_VERSION,
+                "key": key,
+                "form_objects": _form_objects(form),
+                "attributes": attributes}
+        try:
+            buf = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            warning("Unable to store form data in cache: %s" % (e,))
+            return
+
+        # Write to a temporary file and move it in place to avoid
+        # other processes reading partially written files
+        fd, tmpname = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(buf)
+            os.replace(tmpname, self._filename(key))
+        except OSError as e:
+            warning("Unable to store form data in cache: %s" % (e,))
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+
+    def _rebuild_form_data(self, form, data):
+        coefficients, domains = _form_objects(form)
+        old_coefficients, old_domains = data["form_objects"]
+        if len(coefficients) != len(old_coefficients) or domains != old_domains:
+            debug("Form data cache entry does not match form objects.")
+            return None
+
+        # Map the stored coefficients to the ones of the form, these
+        # may differ in count but not in signature
+        mapping = {}
+        for old, new in zip(old_coefficients, coefficients):
+            if old != new:
+                mapping[old] = new
+
+        form_data = FormData()
+        vars(form_data).update(data["attributes"])
+        form_data.original_form = form
+
+        subdomain_data = form.subdomain_data()
+        replacer = Replacer(mapping) if mapping else None
+        for itg_data in form_data.integral_data:
+            sd = subdomain_data[itg_data.domain].get(itg_data.integral_type)
+            integrals = []
+            for itg in itg_data.integrals:
+                integrand = itg.integrand()
+                if replacer is not None:
+                    integrand = map_expr_dag(replacer, integrand)
+                integrals.append(itg.reconstruct(integrand=integrand, subdomain_data=sd))
+            itg_data.integrals = integrals
+            if mapping:
+                itg_data.integral_coefficients = set(mapping.get(c, c) for c in itg_data.integral_coefficients)
+
+        if mapping:
+            form_data.reduced_coefficients = [mapping.get(c, c) for c in form_data.reduced_coefficients]
+            form_data.function_replace_map = {mapping.get(k, k): v
+                                              for k, v in form_data.function_replace_map.items()}
+
+        form_data.preprocessed_form = reconstruct_form_from_integral_data(form_data.integral_data)
+        return form_data
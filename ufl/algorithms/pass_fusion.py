@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+"""Pipeline of symbolic processing passes over form integrands, with
+compatible consecutive passes fused into a single DAG traversal."""
+
+# Copyright (C) 2019 The FEniCS Project
+#
+# This file is part of UFL (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+from ufl.log import error
+from ufl.form import Form
+from ufl.constantvalue import Zero
+from ufl.core.multiindex import Index, MultiIndex
+from ufl.variable import Label
+from ufl.corealg.multifunction import MultiFunction
+from ufl.corealg.traversal import unique_pre_traversal
+from ufl.corealg.map_dag import map_expr_dag, map_expr_dags_fused, fusion_blocking_types
+
+# Classes of objects with a global counter that passes may create new
+# objects of, these counters are synchronized with worker processes
+_counted_classes = (Index, Label)
+
+
+class IntegrandPass(object):
+    """A pass applying a function to each integrand DAG of a form.
+
+    :arg name: Name of the pass, used in the fusion report.
+    :arg rules: A ``MultiFunction`` (or plain function) applied to the
+        integrands, or a callable taking the integral type and returning
+        the function to apply for integrals of that type.
+    :arg integral_types: If given, only integrals of these types are mapped.
+    :arg eliminates: Expression types that can not appear in the output
+        of this pass. Later passes with cutoff handlers for only these
+        types can still be fused with this pass.
+    :arg rejects: Handler names of this pass that only raise an error.
+        Cutoff handlers with these names do not prevent fusion.
+    :arg keeps_zero_integrals: Whether integrals with a zero integrand
+        are kept in the form. By default they are removed, like
+        :func:`~ufl.algorithms.map_integrands.map_integrand_dags` does.
+    """
+
+    def __init__(self, name, rules, integral_types=None,
+                 eliminates=(), rejects=(), keeps_zero_integrals=False):
+        self.name = name
+        self.integral_types = integral_types
+        self.eliminates = tuple(eliminates)
+        self.rejects = tuple(rejects)
+        self.keeps_zero_integrals = keeps_zero_integrals
+        if isinstance(rules, MultiFunction):
+            self._rules = rules
+            self._rules_factory = None
+        else:
+            self._rules = None
+            self._rules_factory = rules
+
+    def applies_to(self, integral_type):
+        return self.integral_types is None or integral_type in self.integral_types
+
+    def rules(self, integral_type):
+        "Return the function to apply to integrands of the given type."
+        if self._rules is not None:
+            return self._rules
+        return self._rules_factory(integral_type)
+
+    def blocking_types(self):
+        """Return the expression types that prevent this pass from being
+        fused after another pass."""
+        rules = self.rules(None)
+        handler_names = MultiFunction._handlers_cache.get(type(rules), ((),))[0]
+        return tuple(cls for cls in fusion_blocking_types(rules)
+                     if handler_names[cls._ufl_typecode_] not in self.rejects)
+
+
+class FormPass(object):
+    """A pass applying a function to the whole form.
+
+    Form passes can not be fused and act as barriers between
+    groups of fused integrand passes.
+    """
+
+    def __init__(self, name, function):
+        self.name = name
+        self.function = function
+
+
+class PassFusionReport(object):
+    """Report of how the passes of a pipeline have been grouped.
+
+    The member ``entries`` is a list of tuples
+    ``(pass name, group number, reason)``, where the reason
+    explains why a pass was or was not fused with the previous pass.
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def add(self, name, group, reason):
+        self.entries.append((name, group, reason))
+
+    def groups(self):
+        "Return a list with a tuple of pass names for each traversal group."
+        groups = []
+        for name, group, reason in self.entries:
+            if group is None:
+                continue
+            if group == len(groups):
+                groups.append(())
+            groups[group] += (name,)
+        return groups
+
+    def fused(self):
+        "Return the names of the passes which were fused with the previous pass."
+        return [name for name, group, reason in self.entries
+                if reason == "fused"]
+
+    def __str__(self):
+        lines = []
+        for name, group, reason in self.entries:
+            g = "-" if group is None else str(group)
+            lines.append("%s  %s: %s" % (g, name, reason))
+        return "\n".join(lines)
+
+
+def plan_pass_fusion(passes):
+    """Group a sequence of passes into fused traversals.
+
+    Returns a list of steps, each being either a :class:`FormPass`
+    or a list of :class:`IntegrandPass` objects to run in a single
+    traversal, and a :class:`PassFusionReport`.
+    """
+    report = PassFusionReport()
+    steps = []
+    group = None
+    num_groups = 0
+    eliminated = ()
+    for p in passes:
+        if isinstance(p, FormPass):
+            report.add(p.name, None, "form level pass, not fusable")
+            steps.append(p)
+            group = None
+            continue
+        elif not isinstance(p, IntegrandPass):
+            error("Expecting IntegrandPass or FormPass.")
+
+        reason = None
+        if group is None:
+            if steps:
+                reason = "previous pass is a form level pass"
+            else:
+                reason = "first pass"
+        else:
+            blocking = [cls.__name__ for cls in p.blocking_types()
+                        if not issubclass(cls, eliminated)]
+            if blocking:
+                reason = ("cutoff handlers for %s" % ", ".join(sorted(blocking)))
+
+        if reason is None:
+            group.append(p)
+            eliminated += p.eliminates
+            report.add(p.name, num_groups - 1, "fused")
+        else:
+            group = [p]
+            eliminated = p.eliminates
+            steps.append(group)
+            report.add(p.name, num_groups, reason)
+            num_groups += 1
+
+    return steps, report
+
+
+def apply_fused_passes(group, form, share_integrals=False):
+    """Apply a group of integrand passes to a form in a single traversal per integrand.
+
+    Each integrand is mapped separately, as when applying the passes to
+    one integral at a time. If share_integrals is true, integrands
+    mapped by the same functions are instead mapped together, such that
+    subexpressions shared between integrals are mapped once and the
+    results, including the indices created for them, are shared between
+    the integrals. Integrals with a zero integrand are removed, unless
+    all passes of the group keep them.
+    """
+    if not isinstance(form, Form):
+        error("Expecting a Form.")
+    integrals = form.integrals()
+
+    # Group integrands by the functions to apply
+    batches = {}
+    for k, itg in enumerate(integrals):
+        it = itg.integral_type()
+        functions = [p.rules(it) for p in group if p.applies_to(it)]
+        if functions:
+            key = tuple(id(f) for f in functions) if share_integrals else k
+            batches.setdefault(key, (functions, []))[1].append(k)
+
+    integrands = [itg.integrand() for itg in integrals]
+    for functions, positions in batches.values():
+        results = map_expr_dags_fused(functions, [integrands[k] for k in positions])
+        for k, integrand in zip(positions, results):
+            integrands[k] = integrand
+
+    keep_zero = all(p.keeps_zero_integrals for p in group)
+    new_integrals = []
+    for itg, integrand in zip(integrals, integrands):
+        if integrand is not itg.integrand():
+            itg = itg.reconstruct(integrand)
+        if keep_zero or not isinstance(itg.integrand(), Zero):
+            new_integrals.append(itg)
+    return Form(new_integrals)
+
+
+def apply_pipeline_step(step, form, profiler=None, share_integrals=False):
+    """Apply a step of a pass pipeline, a :class:`FormPass` or a group
+    of integrand passes, to a form.
+
+    If a :class:`~ufl.algorithms.pass_profiling.PassProfiler` is
+    given, the step is profiled. See :func:`apply_fused_passes` for
+    share_integrals.
+    """
+    if isinstance(step, FormPass):
+        name, function = step.name, step.function
+    else:
+        name = "+".join(p.name for p in step)
+
+        def function(form):
+            return apply_fused_passes(step, form, share_integrals)
+    if profiler is None:
+        return function(form)
+    return profiler.apply(name, function, form)
+
+
+def apply_pass_pipeline(passes, form, profiler=None, share_integrals=False):
+    """Apply a sequence of passes to a form, fusing consecutive
+    integrand passes into single traversals where possible.
+
+    See :func:`apply_fused_passes` for share_integrals.
+
+    Returns the processed form and a :class:`PassFusionReport`.
+    """
+    steps, report = plan_pass_fusion(passes)
+    for step in steps:
+        form = apply_pipeline_step(step, form, profiler, share_integrals)
+    return form, report
+
+
+def _pipeline_steps(passes, fuse):
+    "Return the steps of a pass pipeline, and the fusion report if fusing."
+    if fuse:
+        return plan_pass_fusion(passes)
+    return [p if isinstance(p, FormPass) else [p] for p in passes], None
+
+
+def _apply_integrand_segment(task):
+    """Apply a segment of integrand pass groups to an integrand, in a
+    worker process. The passes are rebuilt from the pass factory.
+
+    Returns the integrand and the values of the global counters after
+    each pass group."""
+    pass_factory, fuse, segment, integral_type, integrand, counts = task
+    for cls, count in zip(_counted_classes, counts):
+        cls._globalcount = count
+    steps, report = _pipeline_steps(pass_factory(), fuse)
+    created = []
+    for k in segment:
+        functions = [p.rules(integral_type) for p in steps[k] if p.applies_to(integral_type)]
+        if functions:
+            integrand, = map_expr_dags_fused(functions, [integrand])
+        created.append(tuple(cls._globalcount for cls in _counted_classes))
+    return integrand, created
+
+
+class CountRenumberer(MultiFunction):
+    "Renumber indices and labels with counts in the given mappings."
+
+    def __init__(self, index_counts, label_counts):
+        MultiFunction.__init__(self)
+        self.index_counts = index_counts
+        self.label_counts = label_counts
+
+    expr = MultiFunction.reuse_if_untouched
+
+    def terminal(self, o):
+        return o
+
+    def multi_index(self, o):
+        if not any(isinstance(i, Index) and i.count() in self.index_counts for i in o):
+            return o
+        return MultiIndex(tuple(Index(count=self.index_counts[i.count()])
+                                if isinstance(i, Index) and i.count() in self.index_counts else i
+                                for i in o))
+
+    def zero(self, o):
+        fi = o.ufl_free_indices
+        if not any(i in self.index_counts for i in fi):
+            return o
+        fi = sorted((self.index_counts.get(i, i), d) for i, d in zip(fi, o.ufl_index_dimensions))
+        return Zero(o.ufl_shape, tuple(i for i, d in fi), tuple(d for i, d in fi))
+
+    def label(self, o):
+        count = self.label_counts.get(o.count())
+        if count is None:
+            return o
+        return Label(count=count)
+
+
+def unshare_integral_indices(form):
+    """Return form with the indices and labels found in more than one
+    integral replaced by new ones in all but the first of them.
+
+    Mapping the integrands of a form together shares the results for
+    subexpressions common to several integrals, including the indices
+    these results are built with. This gives each integral its own
+    indices, as when processing the integrals one at a time like
+    :func:`apply_pass_pipeline_parallel` does, at the cost of
+    rebuilding the shared subexpressions for each integral.
+    """
+    seen_indices = set()
+    seen_labels = set()
+    new_integrals = []
+    for itg in form.integrals():
+        integrand = itg.integrand()
+        indices = set()
+        labels = set()
+        for o in unique_pre_traversal(integrand):
+            if isinstance(o, MultiIndex):
+                indices.update(i.count() for i in o if isinstance(i, Index))
+            elif isinstance(o, Zero):
+                indices.update(o.ufl_free_indices)
+            elif isinstance(o, Label):
+                labels.add(o.count())
+        shared_indices = sorted(indices & seen_indices)
+        shared_labels = sorted(labels & seen_labels)
+        seen_indices.update(indices)
+        seen_labels.update(labels)
+        if shared_indices or shared_labels:
+            renumberer = CountRenumberer({c: Index().count() for c in shared_indices},
+                                         {c: Label().count() for c in shared_labels})
+            itg = itg.reconstruct(map_expr_dag(renumberer, integrand))
+        new_integrals.append(itg)
+    return Form(new_integrals)
+
+
+def apply_pass_pipeline_parallel(passes, pass_factory, form, executor, fuse=True,
+                                 profiler=None):
+    """Apply a sequence of passes to a form, applying the integrand
+    passes to the integrals in parallel.
+
+    :arg passes: The passes, as for :func:`apply_pass_pipeline`.
+    :arg pass_factory: A picklable callable returning passes equivalent
+        to *passes*, called in the worker processes.
+    :arg form: The form to process.
+    :arg executor: A ``concurrent.futures.Executor``, typically a
+        ``ProcessPoolExecutor``.
+    :arg fuse: Whether to fuse compatible consecutive integrand passes.
+    :arg profiler: Optional :class:`~ufl.algorithms.pass_profiling.PassProfiler`.
+        Each segment of consecutive integrand passes is profiled as a
+        single step, without statistics of the work in the workers.
+
+    Consecutive integrand passes are applied to each integrand in a
+    single task. The results are collected in the order of the
+    integrals, and the indices and labels created by the passes are
+    renumbered in the order they would be created by applying the
+    passes one at a time to each integral. The processed integrands
+    are the same as when applying the passes serially, up to the
+    numbering of indices and labels of results that serial processing
+    shares between integrals.
+
+    Returns the processed form and a :class:`PassFusionReport`, or
+    None if not fusing.
+    """
+    steps, report = _pipeline_steps(passes, fuse)
+
+    # Split steps into form passes and segments of consecutive
+    # integrand pass groups
+    segments = []
+    for k, step in enumerate(steps):
+        if isinstance(step, FormPass):
+            segments.append(step)
+        elif segments and not isinstance(segments[-1], FormPass):
+            segments[-1].append(k)
+        else:
+            segments.append([k])
+
+    def apply_segment(form, segment):
+        base = tuple(cls._globalcount for cls in _counted_classes)
+        integrals = form.integrals()
+        tasks = [(pass_factory, fuse, segment, itg.integral_type(), itg.integrand(), base)
+                 for itg in integrals]
+        results = list(executor.map(_apply_integrand_segment, tasks))
+
+        # Map the counts of objects created by each pass group in the
+        # workers to the counts they get when processing serially
+        mappings = [tuple({} for cls in _counted_classes) for r in results]
+        next_count = list(base)
+        for j in range(len(segment)):
+            for (integrand, created), itg_mappings in zip(results, mappings):
+                for c, mapping in enumerate(itg_mappings):
+                    start = base[c] if j == 0 else created[j - 1][c]
+                    for n in range(start, created[j][c]):
+                        if n != next_count[c]:
+                            mapping[n] = next_count[c]
+                        next_count[c] += 1
+        for cls, count in zip(_counted_classes, next_count):
+            cls._globalcount = max(cls._globalcount, count)
+
+        keep_zero = all(p.keeps_zero_integrals for k in segment for p in steps[k])
+        new_integrals = []
+        for itg, (integrand, created), itg_mappings in zip(integrals, results, mappings):
+            if isinstance(integrand, Zero) and not keep_zero:
+                continue
+            if any(itg_mappings):
+                integrand = map_expr_dag(CountRenumberer(*itg_mappings), integrand)
+            new_integrals.append(itg.reconstruct(integrand))
+        return Form(new_integrals)
+
+    for segment in segments:
+        if isinstance(segment, FormPass):
+            form = apply_pipeline_step(segment, form, profiler)
+        elif profiler is None:
+            form = apply_segment(form, segment)
+        else:
+            name = "+".join(p.name for k in segment for p in steps[k])
+            form = profiler.apply(name, lambda f: apply_segment(f, segment), form)
+
+    return form, report
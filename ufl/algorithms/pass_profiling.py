@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Profiling of the symbolic processing passes applied by compute_form_data."""
+
+# Copyright (C) 2019 The FEniCS Project
+#
+# This file is part of UFL (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import time
+
+from ufl.corealg.traversal import unique_pre_traversal
+from ufl.corealg.map_dag import collect_map_statistics
+
+
+def _dag_sizes(form):
+    """Return the number of unique nodes in all integrands of form, and
+    the largest number of unique nodes in a single integrand."""
+    unique_nodes = set()
+    largest = 0
+    for itg in form.integrals():
+        nodes = set(unique_pre_traversal(itg.integrand()))
+        largest = max(largest, len(nodes))
+        unique_nodes.update(nodes)
+    return len(unique_nodes), largest
+
+
+class PassProfile(object):
+    """Profile of a single step of the symbolic processing.
+
+    :arg name: Name of the step, passes fused into a single traversal
+        are joined by ``+``.
+    :arg time: Wall time of the step in seconds.
+    :arg num_integrals: Number of integrals before the step.
+    :arg nodes_in: Number of unique integrand nodes before the step.
+    :arg nodes_out: Number of unique integrand nodes after the step.
+    :arg peak_dag_size: Largest number of unique nodes of a single
+        integrand before or after the step.
+    :arg statistics: :class:`~ufl.corealg.map_dag.MapStatistics` of the
+        ``map_expr_dags`` calls made by the step, or None.
+    """
+
+    def __init__(self, name, time, num_integrals=None, nodes_in=None, nodes_out=None,
+                 peak_dag_size=None, statistics=None):
+        self.name = name
+        self.time = time
+        self.num_integrals = num_integrals
+        self.nodes_in = nodes_in
+        self.nodes_out = nodes_out
+        self.peak_dag_size = peak_dag_size
+        self.statistics = statistics
+
+    def as_dict(self):
+        "Return the profile as a dict of plain values."
+        d = dict(name=self.name, time=self.time, num_integrals=self.num_integrals,
+                 nodes_in=self.nodes_in, nodes_out=self.nodes_out,
+                 peak_dag_size=self.peak_dag_size)
+        s = self.statistics
+        if s is not None:
+            d.update(map_calls=s.calls, nodes_mapped=s.nodes,
+                     vcache_hits=s.vcache_hits, rcache_hits=s.rcache_hits,
+                     vcache_hit_ratio=s.vcache_hit_ratio(),
+                     rcache_hit_ratio=s.rcache_hit_ratio())
+        return d
+
+    def __str__(self):
+        s = "%-40s %9.4f s" % (self.name, self.time)
+        if self.nodes_in is not None:
+            s += "  nodes %7d -> %7d  peak %7d" % (self.nodes_in, self.nodes_out, self.peak_dag_size)
+        if self.statistics is not None and self.statistics.calls:
+            s += "  rcache hits %5.1f%%" % (100.0 * self.statistics.rcache_hit_ratio())
+        return s
+
+
+class PassProfilingReport(object):
+    """Report of the time spent and work done by each step of
+    compute_form_data.
+
+    The member ``entries`` is the list of :class:`PassProfile` objects
+    in the order the steps were applied.
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def total_time(self):
+        "Return the total wall time of the profiled steps."
+        return sum(p.time for p in self.entries)
+
+    def slowest(self):
+        "Return the profile of the slowest step."
+        return max(self.entries, key=lambda p: p.time)
+
+    def as_dicts(self):
+        "Return a list with a dict of plain values for each step."
+        return [p.as_dict() for p in self.entries]
+
+    def __str__(self):
+        lines = [str(p) for p in self.entries]
+        lines.append("%-40s %9.4f s" % ("total", self.total_time()))
+        return "\n".join(lines)
+
+
+class PassProfiler(object):
+    """Apply processing steps to a form and record a :class:`PassProfile`
+    for each in a :class:`PassProfilingReport`.
+
+    :arg callback: Optional callable, called with each
+        :class:`PassProfile` as soon as the step is done.
+    """
+
+    def __init__(self, callback=None):
+        self.report = PassProfilingReport()
+        self.callback = callback
+
+    def _add(self, profile):
+        self.report.entries.append(profile)
+        if self.callback is not None:
+            self.callback(profile)
+
+    def apply(self, name, function, form):
+        """Apply function to form, returning the processed form, and record
+        the wall time, DAG sizes and map statistics."""
+        nodes_in, largest_in = _dag_sizes(form)
+        num_integrals = len(form.integrals())
+        with collect_map_statistics() as statistics:
+            t0 = time.perf_counter()
+            form = function(form)
+            elapsed = time.perf_counter() - t0
+        nodes_out, largest_out = _dag_sizes(form)
+        self._add(PassProfile(name, elapsed, num_integrals, nodes_in, nodes_out,
+                              max(largest_in, largest_out), statistics))
+        return form
+
+    def timed(self, name, function, *args):
+        "Call function with args, returning the result, and record the wall time."
+        t0 = time.perf_counter()
+        result = function(*args)
+        self._add(PassProfile(name, time.perf_counter() - t0))
+        return result
@@ -12,7 +12,7 @@ from ufl.core.expr import Expr
 from ufl.core.multiindex import Index, FixedIndex, MultiIndex
 from ufl.variable import Label, Variable
 from ufl.algorithms.transformer import ReuseTransformer, apply_transformer
-from ufl.classes import Zero
+from ufl.classes import Zero, Indexed
 
 
 class VariableRenumberingTransformer(ReuseTransformer):
@@ -72,3 +72,50 @@ def renumber_indices(expr):
         if num_free_indices != len(result.ufl_free_indices):
             error("The number of free indices left in expression should be invariant w.r.t. renumbering.")
     return result
+
+
+def substitute_free_indices(expr, mapping):
+    """Return expr with free indices replaced, mapping is a dict from
+    index counts to ``Index`` or ``FixedIndex`` objects.
+
+    Only the nodes which have one of the replaced indices as a free
+    index are rebuilt, indices bound inside expr are not replaced.
+    """
+    counts = set(mapping)
+
+    def affected(o):
+        if o._ufl_is_terminal_:
+            return isinstance(o, Zero) and not counts.isdisjoint(o.ufl_free_indices)
+        return not counts.isdisjoint(o.ufl_free_indices)
+
+    if not affected(expr):
+        return expr
+
+    # Rebuild the affected nodes in post order
+    replaced = {}
+    stack = [(expr, False)]
+    while stack:
+        o, visited = stack.pop()
+        if id(o) in replaced:
+            continue
+        if not visited:
+            stack.append((o, True))
+            stack.extend((op, False) for op in o.ufl_operands
+                         if id(op) not in replaced and affected(op))
+            continue
+
+        if isinstance(o, Zero):
+            fi = [(mapping.get(i, Index(count=i)), d)
+                  for i, d in zip(o.ufl_free_indices, o.ufl_index_dimensions)]
+            fi = sorted((i.count(), d) for i, d in fi if isinstance(i, Index))
+            r = Zero(o.ufl_shape, tuple(i for i, d in fi), tuple(d for i, d in fi))
+        elif o._ufl_is_terminal_:
+            error("Not expecting free indices in terminal %s." % (o,))
+        else:
+            ops = [replaced.get(id(op), op) for op in o.ufl_operands]
+            if isinstance(o, Indexed):
+                ops[1] = MultiIndex(tuple(mapping.get(i.count(), i) if isinstance(i, Index) else i
+                                          for i in ops[1]))
+            r = o._ufl_expr_reconstruct_(*ops)
+        replaced[id(o)] = r
+    return replaced[id(expr)]
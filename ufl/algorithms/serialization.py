@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""Compact binary serialization of expression DAGs and forms.
+
+Plain ``pickle`` serializes an expression by recursing over the
+operands of each node, storing the class and constructor arguments of
+every object.  This can overflow the stack for deep expressions.
+Here the unique nodes are instead stored once, as a table in
+topological order, with operands given as integer positions in the
+table:
+
+- a header with the format version and the sizes of the sections,
+- ``classes``: int32 array with the class number of each node,
+- ``operand_offsets`` and ``operand_indices``: int64 arrays, the
+  operands of node ``k`` are the nodes
+  ``operand_indices[operand_offsets[k]:operand_offsets[k+1]]``,
+- ``roots``: int64 array with the positions of the serialized
+  expressions,
+- a pickled table with the node classes, the terminals in node order
+  and the integral data of forms.  The terminals are pickled together,
+  so finite elements, function spaces and domains shared between
+  terminals are stored once.
+
+The arrays are aligned to 8 bytes and read without copying from any
+object supporting the buffer protocol, such as a memory map of a file.
+Loading rebuilds the nodes in table order, operands before operators,
+so shared subexpressions are rebuilt once and no recursion is needed.
+"""
+
+# Copyright (C) 2019 The FEniCS Project
+#
+# This file is part of UFL (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import mmap
+import pickle
+import struct
+import sys
+from array import array
+
+from ufl.log import error
+from ufl.core.expr import Expr
+from ufl.corealg.dag_snapshot import DAGSnapshot
+from ufl.form import Form
+from ufl.integral import Integral
+
+FORMAT_VERSION = 1
+
+_magic = b"UFLDAG\0\0"
+
+# Format version, byte order, number of nodes, number of operand
+# indices, number of roots, size of the pickled table
+_header = struct.Struct("<QQQQQQ")
+
+_byteorders = {"little": 0, "big": 1}
+
+
+def _padding(n):
+    return -n % 8
+
+
+def _serialize(expressions, data):
+    """Serialize the DAG of expressions together with picklable data
+    describing them, to be read with :class:`DAGReader`."""
+    snapshot = DAGSnapshot(expressions)
+
+    # Number the classes of the nodes, class numbers are local to the
+    # serialized data since typecodes can depend on the import order
+    classes = []
+    class_numbers = {}
+    node_classes = array("i")
+    terminals = []
+    for o in snapshot.nodes:
+        cls = o._ufl_class_
+        k = class_numbers.get(cls)
+        if k is None:
+            k = len(classes)
+            class_numbers[cls] = k
+            classes.append(cls)
+        node_classes.append(k)
+        if o._ufl_is_terminal_:
+            terminals.append(o)
+
+    operand_offsets = array("q", snapshot.operand_offsets)
+    operand_indices = array("q", snapshot.operand_indices)
+    roots = array("q", snapshot.roots)
+    table = pickle.dumps((classes, terminals, data), pickle.HIGHEST_PROTOCOL)
+
+    parts = [_magic,
+             _header.pack(FORMAT_VERSION, _byteorders[sys.byteorder], len(snapshot),
+                          len(operand_indices), len(roots), len(table))]
+    for a in (node_classes, operand_offsets, operand_indices, roots):
+        b = a.tobytes()
+        parts.append(b)
+        parts.append(b"\0" * _padding(len(b)))
+    parts.append(table)
+    return b"".join(parts)
+
+
+class DAGReader(object):
+    """Reader of serialized expression DAGs, rebuilding the expressions
+    on request.
+
+    The arrays of the node table are read in place from the buffer and
+    only the pickled table is unpickled up front.  The member ``data``
+    is the data serialized with the expressions.
+
+    :arg buffer: Object supporting the buffer protocol, like bytes or
+        a memory map.
+    """
+
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+        if view.format != "B":
+            view = view.cast("B")
+        if bytes(view[:len(_magic)]) != _magic:
+            error("Invalid serialized UFL data.")
+        offset = len(_magic)
+        version, byteorder, num_nodes, num_indices, num_roots, table_size = \
+            _header.unpack_from(view, offset)
+        if version != FORMAT_VERSION:
+            error("Unsupported serialized UFL data format version %d." % version)
+        if byteorder != _byteorders[sys.byteorder]:
+            error("Serialized UFL data has a different byte order.")
+        offset += _header.size
+
+        self._views = [view]
+        sections = []
+        for typecode, itemsize, n in (("i", 4, num_nodes), ("q", 8, num_nodes + 1),
+                                      ("q", 8, num_indices), ("q", 8, num_roots)):
+            size = itemsize * n
+            sections.append(view[offset:offset + size].cast(typecode))
+            offset += size + _padding(size)
+        self._views.extend(sections)
+        node_classes, self._operand_offsets, self._operand_indices, self._roots = sections
+        table = view[offset:offset + table_size]
+        self._views.append(table)
+        self._classes, terminals, self.data = pickle.loads(table)
+
+        # Place the terminals, operators are built on request
+        self._nodes = [None] * num_nodes
+        terminals = iter(terminals)
+        for k, c in enumerate(node_classes):
+            if self._classes[c]._ufl_is_terminal_:
+                self._nodes[k] = next(terminals)
+        self._node_classes = node_classes
+
+    def num_expressions(self):
+        "Return the number of serialized expressions."
+        return len(self._roots)
+
+    def expression(self, i):
+        """Return serialized expression number i, building the nodes it
+        needs which are not built yet, operands before operators."""
+        nodes = self._nodes
+        root = self._roots[i]
+        if nodes[root] is None:
+            offsets = self._operand_offsets
+            indices = self._operand_indices
+            needed = {root}
+            stack = [root]
+            while stack:
+                k = stack.pop()
+                for j in indices[offsets[k]:offsets[k + 1]]:
+                    if nodes[j] is None and j not in needed:
+                        needed.add(j)
+                        stack.append(j)
+            classes = self._classes
+            node_classes = self._node_classes
+            for k in sorted(needed):
+                operands = [nodes[j] for j in indices[offsets[k]:offsets[k + 1]]]
+                nodes[k] = classes[node_classes[k]](*operands)
+        return nodes[root]
+
+    def expressions(self):
+        "Return all serialized expressions."
+        return [self.expression(i) for i in range(self.num_expressions())]
+
+    def release(self):
+        """Release the views of the buffer, after which no more
+        expressions can be built."""
+        for v in reversed(self._views):
+            v.release()
+        self._views = []
+
+
+def _integral(integrand, integral_data):
+    return Integral(integrand, *integral_data)
+
+
+def _integral_data(integral):
+    return (integral.integral_type(), integral.ufl_domain(), integral.subdomain_id(),
+            integral.metadata(), integral.subdomain_data())
+
+
+def dumps(obj):
+    """Serialize an Expr or a Form to bytes, see :func:`loads`.
+
+    Each unique node of the expressions is stored once, equal
+    subexpressions are merged.
+    """
+    if isinstance(obj, Form):
+        integrals = obj.integrals()
+        return _serialize([itg.integrand() for itg in integrals],
+                          [_integral_data(itg) for itg in integrals])
+    elif isinstance(obj, Expr):
+        return _serialize([obj], None)
+    error("Expecting Form or Expr, not %s." % (obj,))
+
+
+def loads(data):
+    """Rebuild an Expr or a Form from data serialized with
+    :func:`dumps`, in time linear in the number of unique nodes.
+
+    The data can be any object supporting the buffer protocol, like
+    bytes or a memory map.
+    """
+    reader = DAGReader(data)
+    try:
+        expressions = reader.expressions()
+        if reader.data is None:
+            result, = expressions
+            return result
+        return Form([_integral(e, itg_data) for e, itg_data in zip(expressions, reader.data)])
+    finally:
+        reader.release()
+
+
+def dump(obj, file):
+    "Serialize an Expr or a Form to a binary file object, see :func:`dumps`."
+    file.write(dumps(obj))
+
+
+def load(file, use_mmap=False):
+    """Rebuild an Expr or a Form serialized to a binary file object,
+    see :func:`loads`.
+
+    If use_mmap is true, the file is memory mapped instead of read,
+    which requires a real file.
+    """
+    if not use_mmap:
+        return loads(file.read())
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        view = memoryview(m)
+        try:
+            return loads(view)
+        finally:
+            view.release()
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""Transfer of forms to worker processes through shared memory.
+
+A form, or the integral data of a form computed by compute_form_data,
+is published once in the serialization format of
+:mod:`ufl.algorithms.serialization` into a named
+``multiprocessing.shared_memory`` segment.  Worker processes attach to
+the segment by name, read the node table in place and rebuild the
+integrands they access, instead of each unpickling its own copy of the
+form.  Requires Python 3.8 or later.
+
+Example::
+
+    with publish_form(form) as segment:
+        pool.map(work, [segment.name] * n)
+
+    def work(name):
+        with attach_form(name) as shared:
+            form = shared.form()
+"""
+
+# Copyright (C) 2019 The FEniCS Project
+#
+# This file is part of UFL (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+from ufl.log import error
+from ufl.form import Form
+from ufl.algorithms.domain_analysis import IntegralData
+from ufl.algorithms.serialization import DAGReader, _serialize, _integral, _integral_data
+
+# Names of the segments published by this process
+_published = set()
+
+
+def _shared_memory():
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        error("Sharing forms between processes requires multiprocessing.shared_memory, "
+              "available from Python 3.8.")
+    return shared_memory
+
+
+class SharedFormSegment(object):
+    """Shared memory segment with a published form or integral data,
+    owned by the publishing process.
+
+    The member ``name`` is the name workers attach to with
+    :func:`attach_form`.  Use as a context manager, or call
+    :meth:`close` and :meth:`unlink` when the workers are done.
+    """
+
+    def __init__(self, shm, size):
+        self._shm = shm
+        self.name = shm.name
+        self.size = size
+
+    def close(self):
+        "Close the segment in this process."
+        self._shm.close()
+
+    def unlink(self):
+        "Destroy the segment, after all processes have closed it."
+        _published.discard(self.name)
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        self.unlink()
+
+
+def publish_form(obj, name=None):
+    """Publish a Form or the list of IntegralData of a form in a new
+    shared memory segment, returning a :class:`SharedFormSegment`.
+
+    :arg name: Name of the segment, a unique name is chosen if None.
+    """
+    if isinstance(obj, Form):
+        integrals = obj.integrals()
+        data = ("form", [_integral_data(itg) for itg in integrals])
+    elif isinstance(obj, (list, tuple)) and all(isinstance(itg_data, IntegralData) for itg_data in obj):
+        integrals = [itg for itg_data in obj for itg in itg_data.integrals]
+        data = ("integral_data",
+                [(itg_data.domain, itg_data.integral_type, itg_data.subdomain_id,
+                  itg_data.metadata, itg_data.integral_coefficients,
+                  itg_data.enabled_coefficients,
+                  [_integral_data(itg) for itg in itg_data.integrals])
+                 for itg_data in obj])
+    else:
+        error("Expecting a Form or a list of IntegralData.")
+
+    buffer = _serialize([itg.integrand() for itg in integrals], data)
+    shm = _shared_memory().SharedMemory(name=name, create=True, size=len(buffer))
+    shm.buf[:len(buffer)] = buffer
+    _published.add(shm.name)
+    return SharedFormSegment(shm, len(buffer))
+
+
+class SharedForm(object):
+    """A form or integral data attached from a shared memory segment,
+    see :func:`attach_form`.
+
+    Nothing is rebuilt when attaching.  The integrands are rebuilt on
+    the first access to the form or an integral data and cached, only
+    building the nodes they need.
+    """
+
+    def __init__(self, name):
+        shared_memory = _shared_memory()
+        if name in _published:
+            shm = shared_memory.SharedMemory(name=name)
+        else:
+            try:
+                shm = shared_memory.SharedMemory(name=name, track=False)
+            except TypeError:
+                # Before Python 3.13 attaching registers the segment
+                # for destruction when this process exits
+                shm = shared_memory.SharedMemory(name=name)
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(shm._name, "shared_memory")
+        self._shm = shm
+        self._reader = DAGReader(shm.buf)
+        self.kind, self._data = self._reader.data
+        self._form = None
+        self._integral_data = {}
+
+    def _expression(self, i):
+        if self._reader is None:
+            error("Cannot rebuild expressions after detaching from the shared segment.")
+        return self._reader.expression(i)
+
+    def form(self):
+        "Return the published form."
+        if self.kind != "form":
+            error("The shared segment holds integral data, not a form.")
+        if self._form is None:
+            self._form = Form([_integral(self._expression(i), itg_data)
+                               for i, itg_data in enumerate(self._data)])
+        return self._form
+
+    def num_integral_data(self):
+        "Return the number of published integral data."
+        if self.kind != "integral_data":
+            error("The shared segment holds a form, not integral data.")
+        return len(self._data)
+
+    def integral_data(self, i=None):
+        """Return the published IntegralData number i, or the list of
+        all if i is None."""
+        if i is None:
+            return [self.integral_data(j) for j in range(self.num_integral_data())]
+        self.num_integral_data()
+        result = self._integral_data.get(i)
+        if result is None:
+            (domain, integral_type, subdomain_id, metadata, integral_coefficients,
+             enabled_coefficients, integrals) = self._data[i]
+            first = sum(len(d[-1]) for d in self._data[:i])
+            integrals = [_integral(self._expression(first + j), itg_data)
+                         for j, itg_data in enumerate(integrals)]
+            result = IntegralData(domain, integral_type, subdomain_id, integrals, metadata)
+            result.integral_coefficients = integral_coefficients
+            result.enabled_coefficients = enabled_coefficients
+            self._integral_data[i] = result
+        return result
+
+    def close(self):
+        """Detach from the segment. Expressions already rebuilt stay
+        valid."""
+        if self._reader is not None:
+            self._reader.release()
+            self._reader = None
+            self._shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def attach_form(name):
+    "Attach to a segment published with :func:`publish_form`, returning a :class:`SharedForm`."
+    return SharedForm(name)
@@ -8,13 +8,16 @@
 # SPDX-License-Identifier:    LGPL-3.0-or-later
 
 import hashlib
+from collections import OrderedDict
+from weakref import WeakKeyDictionary
+
 from ufl.classes import (Label,
                          Index, MultiIndex,
                          Coefficient, Argument,
-                         GeometricQuantity, ConstantValue, Constant,
+                         GeometricQuantity, ConstantValue, Constant, Zero,
                          ExprList, ExprMapping)
 from ufl.log import error
-from ufl.corealg.traversal import traverse_unique_terminals, pre_traversal
+from ufl.corealg.traversal import traverse_unique_terminals
 from ufl.algorithms.domain_analysis import canonicalize_metadata
 
 
@@ -93,53 +96,138 @@ def compute_terminal_hashdata(expressions, renumbering):
     return terminal_hashdata
 
 
-def compute_expression_hashdata(expression, terminal_hashdata):
-    # The hashdata computed here can be interpreted as prefix operator
-    # notation, i.e. we store the equivalent of '+ * a b * c d' for
-    # the expression (a*b)+(c*d)
-    expression_hashdata = []
-    for expr in pre_traversal(expression):
+# Memo of node digests across integrands and forms, mapping each
+# expression node to (renumbering dependencies, digest, variables)
+_node_digests = WeakKeyDictionary()
+
+
+class _RenumberingRecorder(object):
+    "Record the numbers looked up in a renumbering, by repr of the renumbered object."
+    def __init__(self, renumbering):
+        self._renumbering = renumbering
+        self.used = []
+
+    def __getitem__(self, key):
+        number = self._renumbering[key]
+        self.used.append((repr(key), number))
+        return number
+
+
+def _terminal_digest_data(expr, renumbering):
+    """Return the hash data, the renumbering dependencies and the
+    variables of a terminal.
+
+    Indices and labels are variables, numbered in the hash data by their
+    position in the variables of the terminal."""
+    dependencies = ()
+    if isinstance(expr, MultiIndex):
+        variables = tuple(OrderedDict.fromkeys(i for i in expr if isinstance(i, Index)))
+        data = tuple(-(variables.index(i) + 1) if isinstance(i, Index) else int(i)
+                     for i in expr)
+    elif isinstance(expr, Label):
+        variables = (("label", expr.count()),)
+        data = "L"
+    elif isinstance(expr, Zero) and expr.ufl_free_indices:
+        variables = tuple(Index(count=i) for i in expr.ufl_free_indices)
+        data = ("Zero", expr.ufl_shape, expr.ufl_index_dimensions)
+    elif isinstance(expr, (ConstantValue, Coefficient, Constant, Argument, GeometricQuantity)):
+        variables = ()
+        recorder = _RenumberingRecorder(renumbering)
+        data = expr._ufl_signature_data_(recorder)
+        dependencies = tuple(OrderedDict.fromkeys(recorder.used))
+    else:
+        error("Unknown terminal type %s" % type(expr))
+    return data, dependencies, variables
+
+
+def compute_expression_digest(expression, renumbering):
+    """Compute a digest of an expression with terminals renumbered.
+
+    The digest of a node is computed from its typecode and the digests
+    of its operands, or from the signature data for terminals, such
+    that each shared subexpression is only hashed once (a Merkle tree
+    over the DAG). Free indices and labels are numbered by their first
+    occurrence in each node, the digest of a node including the
+    positions of the variables of each operand among those of the node,
+    so the digests don't depend on index and label counts. The digests
+    are memoized for each node, across integrands and forms, and reused
+    while the numbers of the objects they depend on are unchanged.
+    """
+    numbers = {repr(k): v for k, v in renumbering.items()}
+
+    # The current memo entries of the nodes met, by id, or None
+    entries = {}
+
+    def current_entry(expr):
+        key = id(expr)
+        if key not in entries:
+            entry = _node_digests.get(expr)
+            if entry is not None and not all(numbers.get(k) == v for k, v in entry[0]):
+                entry = None
+            entries[key] = entry
+        return entries[key]
+
+    # Post order traversal not descending into nodes with memoized
+    # digests
+    stack = [expression]
+    while stack:
+        expr = stack[-1]
+        if current_entry(expr) is not None:
+            stack.pop()
+            continue
+        missing = [op for op in expr.ufl_operands if current_entry(op) is None]
+        if missing:
+            stack.extend(missing)
+            continue
+        stack.pop()
+        h = hashlib.blake2b(digest_size=32)
         if expr._ufl_is_terminal_:
-            data = terminal_hashdata[expr]
+            data, dependencies, variables = _terminal_digest_data(expr, renumbering)
+            h.update(b"t")
+            h.update(str(data).encode("utf-8"))
         else:
-            data = expr._ufl_typecode_  # TODO: Use expr._ufl_signature_data_()? More extensible, but more overhead.
-        expression_hashdata.append(data)
-    # Oneliner: TODO: Benchmark, maybe use a generator?
-    # expression_hashdata = [(terminal_hashdata[expr] if expr._ufl_is_terminal_ else expr._ufl_typecode_)
-    #                       for expr in pre_traversal(expression)]
-    return expression_hashdata
+            ops = expr.ufl_operands
+            h.update(("o%d:%d" % (expr._ufl_typecode_, len(ops))).encode("utf-8"))
+            dependencies = OrderedDict()
+            numbering = OrderedDict()
+            for op in ops:
+                op_dependencies, op_digest, op_variables = entries[id(op)]
+                if op_dependencies:
+                    dependencies.update((d, None) for d in op_dependencies)
+                h.update(op_digest)
+                if op_variables:
+                    h.update(str(tuple(numbering.setdefault(v, len(numbering))
+                                       for v in op_variables)).encode("utf-8"))
+                else:
+                    h.update(b"()")
+            dependencies = tuple(dependencies)
+            if isinstance(expr, (ExprList, ExprMapping)):
+                variables = tuple(numbering)
+            else:
+                # Indices bound by this node are not variables of the node
+                free = expr.ufl_free_indices
+                variables = tuple(v for v in numbering
+                                  if not isinstance(v, Index) or v.count() in free)
+        entry = (dependencies, h.digest(), variables)
+        _node_digests[expr] = entry
+        entries[id(expr)] = entry
+    return entries[id(expression)][1]
 
 
 def compute_expression_signature(expr, renumbering):  # FIXME: Fix callers
     # FIXME: Rewrite in terms of compute_form_signature?
-
-    # Build hashdata for all terminals first
-    terminal_hashdata = compute_terminal_hashdata([expr], renumbering)
-
-    # Build hashdata for full expression
-    expression_hashdata = compute_expression_hashdata(expr, terminal_hashdata)
-
-    # Pass it through a seriously overkill hashing algorithm
-    # (should we use sha1 instead?)
-    data = str(expression_hashdata).encode("utf-8")
+    data = compute_expression_digest(expr, renumbering).hex().encode("utf-8")
     return hashlib.sha512(data).hexdigest()
 
 
 def compute_form_signature(form, renumbering):  # FIXME: Fix callers
-    # Extract integrands
-    integrals = form.integrals()
-    integrands = [integral.integrand() for integral in integrals]
-
-    # Build hashdata for all terminals first, with on-the-fly
-    # replacement of functions and index labels.
-    terminal_hashdata = compute_terminal_hashdata(integrands, renumbering)
-
     # Build hashdata for each integral
     hashdata = []
-    for integral in integrals:
-        # Compute hash data for expression, this is the expensive part
-        integrand_hashdata = compute_expression_hashdata(integral.integrand(),
-                                                         terminal_hashdata)
+    for integral in form.integrals():
+        # Compute digest of integrand with on-the-fly replacement of
+        # functions and index labels, this is the expensive part
+        integrand_hashdata = compute_expression_digest(integral.integrand(),
+                                                       renumbering).hex()
 
         domain_hashdata = integral.ufl_domain()._ufl_signature_data_(renumbering)
 
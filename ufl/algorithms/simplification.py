@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""Rule based algebraic simplification of expressions.
+
+A :class:`Simplifier` applies rewrite rules to the nodes of an
+expression DAG bottom up.  A rule is a function taking a node, whose
+operands are already simplified, and returning an equivalent
+expression or None if it does not apply.  Rules are registered per
+expression class and apply to its subclasses, like the handlers of a
+``MultiFunction``.  The rules of a node are applied until none applies
+to the result, and the traversal is repeated until the expression does
+not change, bounded by a number of iterations and of rewrites.
+
+The default rules fold constant subexpressions, combine constants and
+like terms of nested sums and products, collapse indexed component and
+list tensors and contract identity matrices in index sums.
+Collapsing indexed component tensors can leave copies of a
+subexpression which differ only in the naming of free indices, these
+are merged by ``eliminate_common_subexpressions``.
+"""
+
+# Copyright (C) 2019 The FEniCS Project
+#
+# This file is part of UFL (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+from ufl.log import error
+from ufl.core.expr import Expr
+from ufl.core.multiindex import Index, FixedIndex, MultiIndex
+from ufl.constantvalue import Zero, ScalarValue, Identity, IntValue, as_ufl
+from ufl.algebra import Sum, Product, Division, Power, Abs, Conj, Real, Imag
+from ufl.mathfunctions import MathFunction, Atan2
+from ufl.conditional import Conditional, MinValue, MaxValue
+from ufl.indexed import Indexed
+from ufl.indexsum import IndexSum
+from ufl.tensors import ComponentTensor, ListTensor
+from ufl.sorting import sorted_expr
+from ufl.form import Form
+from ufl.corealg.multifunction import MultiFunction
+from ufl.corealg.map_dag import map_expr_dag
+from ufl.algorithms.map_integrands import map_integrands
+from ufl.algorithms.renumbering import substitute_free_indices
+
+
+def _is_constant(o):
+    "Check if o is a scalar constant without free indices."
+    if isinstance(o, ScalarValue):
+        return True
+    return isinstance(o, Zero) and o.ufl_shape == () and o.ufl_free_indices == ()
+
+
+def _zero_like(o):
+    return Zero(o.ufl_shape, o.ufl_free_indices, o.ufl_index_dimensions)
+
+
+# --- Default rules
+
+def fold_constants(o):
+    "Evaluate a pointwise operator with constant operands."
+    if not all(_is_constant(op) for op in o.ufl_operands):
+        return None
+    try:
+        value = o.evaluate((), {}, (), {})
+    except (ValueError, ZeroDivisionError, ArithmeticError):
+        return None
+    return as_ufl(value)
+
+
+def fold_conditional(o):
+    "Select the branch of a conditional with a constant condition."
+    condition, true_value, false_value = o.ufl_operands
+    if true_value == false_value:
+        return true_value
+    if not all(_is_constant(op) for op in condition.ufl_operands):
+        return None
+    return true_value if condition.evaluate((), {}, (), {}) else false_value
+
+
+def _factors(o):
+    "Return the factors of the nested products in o."
+    factors = []
+    stack = [o]
+    while stack:
+        f = stack.pop()
+        if isinstance(f, Product):
+            stack.extend(reversed(f.ufl_operands))
+        else:
+            factors.append(f)
+    return factors
+
+
+def _build_product(factors):
+    p = factors[0]
+    for f in factors[1:]:
+        p = Product(p, f)
+    return p
+
+
+def _split_coefficient(t):
+    "Split a term into a constant coefficient and the rest."
+    if isinstance(t, Product):
+        factors = _factors(t)
+        constants = [f for f in factors if _is_constant(f)]
+        rest = [f for f in factors if not _is_constant(f)]
+        if constants and rest:
+            c = 1
+            for f in constants:
+                c *= f.evaluate((), {}, (), {})
+            return c, _build_product(rest)
+    return 1, t
+
+
+def _scaled_terms(o):
+    """Return (coefficient, term) pairs for the terms of o, flattening
+    nested sums and sums scaled by a constant."""
+    terms = []
+    stack = [(1, o)]
+    while stack:
+        c, t = stack.pop()
+        if isinstance(t, Sum):
+            stack.extend((c, s) for s in reversed(t.ufl_operands))
+            continue
+        d, r = _split_coefficient(t)
+        if isinstance(r, Sum):
+            stack.append((c * d, r))
+        else:
+            terms.append((c, t))
+    return terms
+
+
+def combine_sum_terms(o):
+    """Flatten nested sums, fold the constant terms and combine terms
+    which differ only in a constant factor, cancelling ``x - x``."""
+    constant = 0
+    num_constants = 0
+    coefficients = {}
+    terms = _scaled_terms(o)
+    for c, t in terms:
+        if _is_constant(t):
+            constant += c * t.evaluate((), {}, (), {})
+            num_constants += 1
+        else:
+            d, t = _split_coefficient(t)
+            coefficients[t] = coefficients.get(t, 0) + c * d
+
+    # Keep o unless terms were combined
+    if num_constants < 2 and len(coefficients) + num_constants == len(terms):
+        return None
+
+    result = []
+    for t in sorted_expr(list(coefficients.keys())):
+        c = coefficients[t]
+        if c == 1:
+            result.append(t)
+        elif c != 0:
+            result.append(as_ufl(c) * t)
+    if constant != 0:
+        result.append(as_ufl(constant))
+    if not result:
+        return _zero_like(o)
+    s = result[0]
+    for t in result[1:]:
+        s = Sum(s, t)
+    return s
+
+
+def combine_product_factors(o):
+    "Flatten nested products and fold their constant factors."
+    factors = _factors(o)
+    constants = [f for f in factors if _is_constant(f)]
+    if len(constants) < 2:
+        return None
+    c = 1
+    for f in constants:
+        c *= f.evaluate((), {}, (), {})
+    if c == 0:
+        return _zero_like(o)
+    rest = [f for f in factors if not _is_constant(f)]
+    if c != 1:
+        rest.insert(0, as_ufl(c))
+    # The product of the factors has the free indices of o
+    return _build_product(rest) if rest else as_ufl(c)
+
+
+def collapse_indexed(o):
+    """Collapse indexing of component tensors, list tensors and
+    identity matrices."""
+    A, jj = o.ufl_operands
+    if isinstance(A, ComponentTensor):
+        if any(isinstance(j, Index) and j.count() in A.ufl_free_indices for j in jj):
+            return None
+        free = [j for j in jj if isinstance(j, Index)]
+        if len(set(free)) != len(free):
+            return None
+        B, ii = A.ufl_operands
+        # Picking components of a general tensor expression would copy
+        # the expression for each component, only collapse chains of
+        # indexing with fixed indices
+        if len(free) < len(jj) and not isinstance(B, Indexed):
+            return None
+        return substitute_free_indices(B, {i.count(): j for i, j in zip(ii, jj)})
+    elif isinstance(A, ListTensor) and isinstance(jj[0], FixedIndex):
+        B = A.ufl_operands[int(jj[0])]
+        if len(jj) == 1:
+            return B
+        return Indexed(B, MultiIndex(jj.indices()[1:]))
+    elif isinstance(A, Identity) and all(isinstance(j, FixedIndex) for j in jj):
+        return IntValue(1) if int(jj[0]) == int(jj[1]) else Zero()
+    return None
+
+
+def contract_identity(o):
+    "Rewrite ``sum_j A[..., j, ...] * I[j, k]`` as ``A[..., k, ...]``."
+    summand, (j,) = o.ufl_operands
+    factors = _factors(summand)
+    for n, f in enumerate(factors):
+        if not (isinstance(f, Indexed) and isinstance(f.ufl_operands[0], Identity)):
+            continue
+        a, b = f.ufl_operands[1]
+        if a == j and b != j:
+            k = b
+        elif b == j and a != j:
+            k = a
+        else:
+            continue
+        rest = factors[:n] + factors[n + 1:]
+        if not rest or any(isinstance(k, Index) and k.count() in r.ufl_free_indices
+                           for r in rest):
+            continue
+        if not any(j.count() in r.ufl_free_indices for r in rest):
+            continue
+        return substitute_free_indices(_build_product(rest), {j.count(): k})
+    return None
+
+
+default_rules = [
+    ((Sum, Product, Division, Power, Abs, Conj, Real, Imag, MathFunction,
+      Atan2, MinValue, MaxValue), fold_constants),
+    (Conditional, fold_conditional),
+    (Sum, combine_sum_terms),
+    (Product, combine_product_factors),
+    (Indexed, collapse_indexed),
+    (IndexSum, contract_identity),
+]
+
+
+class Simplifier(MultiFunction):
+    """Apply rewrite rules to the nodes of an expression, to be used
+    with ``map_expr_dag``.
+
+    :arg rules: Sequence of (expression class or tuple of classes, rule)
+        pairs, by default ``default_rules``.
+    :arg budget: Maximal number of rewrites, unlimited if None.
+    """
+
+    def __init__(self, rules=None, budget=None):
+        MultiFunction.__init__(self)
+        self._rules = [[] for i in range(Expr._ufl_num_typecodes_)]
+        self.budget = budget
+        self.rewrites = 0
+        for classes, rule in default_rules if rules is None else rules:
+            self.register_rule(classes, rule)
+
+    def register_rule(self, classes, rule):
+        """Register rule for the given expression class or tuple of
+        classes and their subclasses.  Rules of a class are tried in
+        order of registration."""
+        if isinstance(classes, type):
+            classes = (classes,)
+        for classobject in Expr._ufl_all_classes_:
+            if issubclass(classobject, classes):
+                self._rules[classobject._ufl_typecode_].append(rule)
+
+    def budget_exhausted(self):
+        return self.budget is not None and self.rewrites >= self.budget
+
+    def expr(self, o, *ops):
+        o = self.reuse_if_untouched(o, *ops)
+        rules = self._rules[o._ufl_typecode_]
+        while rules and not self.budget_exhausted():
+            for rule in rules:
+                r = rule(o)
+                if r is not None and r is not o:
+                    self.rewrites += 1
+                    o = r
+                    rules = self._rules[o._ufl_typecode_]
+                    break
+            else:
+                break
+        return o
+
+
+def simplify(expr, rules=None, max_iterations=10, budget=None):
+    """Simplify an expression or the integrands of a form by applying
+    rewrite rules until a fixed point is reached.
+
+    :arg rules: Sequence of (expression class, rule) pairs, see
+        :class:`Simplifier`.
+    :arg max_iterations: Maximal number of traversals of each integrand.
+    :arg budget: Maximal number of rewrites of each integrand, unlimited
+        if None.
+    """
+    if isinstance(expr, Form):
+        return map_integrands(lambda e: simplify(e, rules, max_iterations, budget), expr)
+    if not isinstance(expr, Expr):
+        error("Expecting Form or Expr, not %s." % (expr,))
+    simplifier = Simplifier(rules, budget)
+    for i in range(max_iterations):
+        result = map_expr_dag(simplifier, expr)
+        if result is expr or result == expr or simplifier.budget_exhausted():
+            return result
+        expr = result
+    return expr
@@ -35,8 +35,8 @@ class CellAvg(Operator):
         return self.ufl_operands[0].evaluate(x, mapping, component,
                                              index_values)
 
-    def __str__(self):
-        return "cell_avg(%s)" % (self.ufl_operands[0],)
+    def _ufl_str_(self, operands, paroperands):
+        return "cell_avg(%s)" % operands
 
 
 @ufl_type(inherit_shape_from_operand=0,
@@ -62,5 +62,5 @@ class FacetAvg(Operator):
         "Performs an approximate symbolic evaluation, since we dont have a cell."
         return self.ufl_operands[0].evaluate(x, mapping, component, index_values)
 
-    def __str__(self):
-        return "facet_avg(%s)" % (self.ufl_operands[0],)
+    def _ufl_str_(self, operands, paroperands):
+        return "facet_avg(%s)" % operands
@@ -12,7 +12,6 @@ from ufl.core.expr import ufl_err_str
 from ufl.core.ufl_type import ufl_type
 from ufl.core.operator import Operator
 from ufl.constantvalue import as_ufl
-from ufl.precedence import parstr
 from ufl.exprequals import expr_equals
 from ufl.checks import is_true_ufl_scalar
 
@@ -67,9 +66,8 @@ class BinaryCondition(Condition):
             if left.ufl_free_indices != () or right.ufl_free_indices != ():
                 error("Expecting scalar arguments.")
 
-    def __str__(self):
-        return "%s %s %s" % (parstr(self.ufl_operands[0], self),
-                             self._name, parstr(self.ufl_operands[1], self))
+    def _ufl_str_(self, operands, paroperands):
+        return "%s %s %s" % (paroperands[0], self._name, paroperands[1])
 
 
 # Not associating with __eq__, the concept of equality with == is
@@ -201,8 +199,8 @@ class NotCondition(Condition):
         a = self.ufl_operands[0].evaluate(x, mapping, component, index_values)
         return bool(not a)
 
-    def __str__(self):
-        return "!(%s)" % (str(self.ufl_operands[0]),)
+    def _ufl_str_(self, operands, paroperands):
+        return "!(%s)" % operands
 
 
 # --- Conditional expression (condition ? true_value : false_value) ---
@@ -242,8 +240,8 @@ class Conditional(Operator):
             a = self.ufl_operands[2]
         return a.evaluate(x, mapping, component, index_values)
 
-    def __str__(self):
-        return "%s ? %s : %s" % tuple(parstr(o, self) for o in self.ufl_operands)
+    def _ufl_str_(self, operands, paroperands):
+        return "%s ? %s : %s" % paroperands
 
 
 # --- Specific functions higher level than a conditional ---
@@ -269,8 +267,8 @@ class MinValue(Operator):
             raise
         return res
 
-    def __str__(self):
-        return "min_value(%s, %s)" % self.ufl_operands
+    def _ufl_str_(self, operands, paroperands):
+        return "min_value(%s, %s)" % operands
 
 
 @ufl_type(is_scalar=True, num_ops=1)
@@ -294,5 +292,5 @@ class MaxValue(Operator):
             raise
         return res
 
-    def __str__(self):
-        return "max_value(%s, %s)" % self.ufl_operands
+    def _ufl_str_(self, operands, paroperands):
+        return "max_value(%s, %s)" % operands
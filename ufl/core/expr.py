@@ -87,6 +87,7 @@ class Expr(object):
     # save memory by skipping the per-instance dict.
 
     __slots__ = ("_hash",
+                 "_sort_key",
                  "__weakref__")
     # _ufl_noslots_ = True
 
@@ -103,6 +104,23 @@ class Expr(object):
 
     def __init__(self):
         self._hash = None
+        self._sort_key = None
+
+    def __getstate__(self):
+        "Return the state of the expression for pickling, without the cached sort key."
+        state = dict((name, getattr(self, name)) for name in _slot_names(type(self))
+                     if name != "_sort_key" and hasattr(self, name))
+        return (getattr(self, "__dict__", None), state)
+
+    def __setstate__(self, state):
+        "Restore the state of the expression from pickling."
+        d, state = state
+        if d:
+            self.__dict__.update(d)
+        for name, value in state.items():
+            setattr(self, name, value)
+        if not hasattr(self, "_sort_key"):
+            self._sort_key = None
 
     # This shows the principal behaviour of the hash function attached
     # in ufl_type:
@@ -372,7 +390,8 @@ class Expr(object):
 
     def _ufl_err_str_(self):
         "Return a short string to represent this Expr in an error message."
-        return "<%s id=%d>" % (self._ufl_class_.__name__, id(self))
+        from ufl.formatting.printing import dag_str
+        return dag_str(self, max_length=_err_str_length)
 
     # --- Special functions used for processing expressions ---
 
@@ -422,6 +441,20 @@ class Expr(object):
         return find_geometric_dimension(self)
 
 
+def _slot_names(cls):
+    "Return the names of the slots of instances of cls."
+    names = cls.__dict__.get("_ufl_slot_names_")
+    if names is None:
+        names = []
+        for c in cls.__mro__:
+            slots = c.__dict__.get("__slots__", ())
+            if isinstance(slots, str):
+                slots = (slots,)
+            names.extend(name for name in slots if name != "__weakref__")
+        cls._ufl_slot_names_ = names = tuple(names)
+    return names
+
+
 # Initializing traits here because Expr is not defined in the class
 # declaration
 Expr._ufl_class_ = Expr
@@ -429,8 +462,15 @@ Expr._ufl_all_handler_names_.add(Expr)
 Expr._ufl_all_classes_.append(Expr)
 
 
+# Length after which strings in error messages are truncated
+_err_str_length = 200
+
+
 def ufl_err_str(expr):
     if hasattr(expr, "_ufl_err_str_"):
         return expr._ufl_err_str_()
+    elif isinstance(expr, (list, tuple)):
+        s = ", ".join(ufl_err_str(e) for e in expr)
+        return "[%s]" % s if isinstance(expr, list) else "(%s)" % s
     else:
         return repr(expr)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""Optional hash-consing (interning) of operator objects.
+
+When interning is enabled, constructing an operator of the same type
+and with the same operands as an existing live operator returns the
+existing object, such that structurally equal expressions are the same
+object. Operator operands are compared by identity, which by induction
+is structural equality. Multi-indices, constant values and geometric
+quantities are compared by type and value, such that for example
+``a[i] is a[i]`` even though each ``MultiIndex((i,))`` is a new object.
+Form arguments and other terminals are compared by identity, since
+distinct but equal form arguments must not be merged. Equality checks of such
+expressions are then resolved by the identity fast path in
+``expr_equals``, and the memory of large generated expressions with
+repeated subexpressions is shared.
+
+Interning is off by default, and enabling it does not affect objects
+created before. Terminal objects are not interned themselves, an
+interned operator may hold another multi-index, constant value or
+geometric quantity equal to the one it was constructed with.
+
+.. code-block:: python
+
+    enable_expr_interning()
+    # ... build expressions
+    disable_expr_interning()
+"""
+
+# Copyright (C) 2019 The FEniCS Project
+#
+# This file is part of UFL (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+from weakref import WeakValueDictionary
+
+# The global intern table, mapping (class, operand keys) -> operator,
+# or None when interning is disabled
+_intern_table = None
+
+# Backup of the original __new__ and __init__ class dict entries for
+# each class with an interning constructor attached.  Note that the
+# replacement __new__ is never removed again, as CPython can not
+# restore the default object.__new__ behaviour once __new__ has been
+# assigned, instead it falls back to the regular constructor when
+# interning is disabled.
+_regular_new = {}
+_regular_init = {}
+
+# The set of classes with interning currently enabled
+_interning_classes = set()
+
+# Terminal types compared by value in the keys of the intern table,
+# set when enabling interning
+_value_terminal_types = ()
+
+
+def _noop_init(self, *args):
+    "Replacement __init__ for interned types, initialization happens in __new__."
+    pass
+
+
+def _make_interning_new(cls, regular_new, regular_init):
+    # Calling object.__new__ with arguments is an error when
+    # __new__ is overridden
+    if regular_new is object.__new__:
+        def construct(c, *args):
+            return object.__new__(c)
+    else:
+        construct = regular_new
+
+    def __new__(c, *args):
+        "Replacement constructor with interning, attached by enable_expr_interning."
+        self = construct(c, *args)
+        if _intern_table is None:
+            return self
+
+        # Objects which are already initialized are returned from
+        # simplifications in __new__, these are left untouched
+        if not isinstance(self, c) or hasattr(self, "_hash"):
+            return self
+
+        # Initialize here because we may return another object
+        if c.__init__ is _noop_init:
+            regular_init(self, *args)
+        if c is not cls:
+            # Subclasses defined outside UFL may carry more state
+            return self
+
+        # Keyed on operand identity, or value for some terminals, the
+        # operands are kept alive by the interned object as long as
+        # the entry exists
+        key = (cls,) + tuple((type(op), op) if isinstance(op, _value_terminal_types) else id(op)
+                             for op in self.ufl_operands)
+        existing = _intern_table.get(key)
+        if existing is not None:
+            return existing
+        _intern_table[key] = self
+        return self
+
+    return __new__
+
+
+def _regular_attribute(cls, name):
+    "Look up attribute in the class hierarchy, bypassing interning constructors."
+    regular = _regular_new if name == "__new__" else _regular_init
+    for base in cls.__mro__:
+        if base in regular:
+            value = regular[base]
+        else:
+            value = base.__dict__.get(name)
+        if value is not None:
+            if isinstance(value, staticmethod):
+                value = value.__func__
+            return value
+
+
+def attach_interning_constructor(cls):
+    "Replace constructors of operator type cls with interning versions."
+    if cls._ufl_is_terminal_ or cls._ufl_is_abstract_ or cls in _interning_classes:
+        return
+    if cls not in _regular_new:
+        regular_new = _regular_attribute(cls, "__new__")
+        regular_init = _regular_attribute(cls, "__init__")
+        _regular_new[cls] = cls.__dict__.get("__new__")
+        _regular_init[cls] = cls.__dict__.get("__init__")
+        cls.__new__ = staticmethod(_make_interning_new(cls, regular_new, regular_init))
+    cls.__init__ = _noop_init
+    _interning_classes.add(cls)
+
+
+def detach_interning_constructor(cls):
+    "Restore regular initialization of type cls."
+    _interning_classes.remove(cls)
+    init = _regular_init[cls]
+    if init is None:
+        delattr(cls, "__init__")
+    else:
+        cls.__init__ = init
+
+
+def interning_enabled():
+    "Return True if operator interning is enabled."
+    return _intern_table is not None
+
+
+def enable_expr_interning():
+    "Turn on interning of operator objects."
+    global _intern_table, _value_terminal_types
+    if _intern_table is not None:
+        return
+    _intern_table = WeakValueDictionary()
+    from ufl.core.expr import Expr
+    from ufl.core.multiindex import MultiIndex
+    from ufl.constantvalue import ConstantValue
+    from ufl.geometry import GeometricQuantity
+    _value_terminal_types = (MultiIndex, ConstantValue, GeometricQuantity)
+    for cls in Expr._ufl_all_classes_:
+        attach_interning_constructor(cls)
+
+
+def disable_expr_interning():
+    "Turn off interning of operator objects and clear the intern table."
+    global _intern_table
+    if _intern_table is None:
+        return
+    _intern_table = None
+    for cls in list(_interning_classes):
+        detach_interning_constructor(cls)
+
+
+def intern_table_size():
+    "Return the number of live interned operator objects."
+    return 0 if _intern_table is None else len(_intern_table)
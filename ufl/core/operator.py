@@ -11,6 +11,7 @@
 
 from ufl.core.expr import Expr
 from ufl.core.ufl_type import ufl_type
+from ufl.precedence import parenthesize, assign_precedences, build_precedence_list
 
 
 # --- Base class for operator objects ---
@@ -41,9 +42,67 @@ class Operator(Expr):
         "Compute a hash code for this expression. Used by sets and dicts."
         return hash((self._ufl_typecode_,) + tuple(hash(o) for o in self.ufl_operands))
 
+    def _ufl_repr_(self, operands):
+        "Return the repr string of this operator from the reprs of its operands."
+        # This should work for most cases
+        return "%s(%s)" % (self._ufl_class_.__name__, ", ".join(operands))
+
+    def _ufl_str_(self, operands, paroperands):
+        """Return the pretty print string of this operator from the
+        strings of its operands, as they are and parenthesized where
+        the precedence of this operator requires, see ufl.precedence.parstr."""
+        raise NotImplementedError(self.__class__._ufl_str_)
+
     def __repr__(self):
         "Default repr string construction for operators."
-        # This should work for most cases
-        r = "%s(%s)" % (self._ufl_class_.__name__,
-                        ", ".join(repr(op) for op in self.ufl_operands))
-        return r
+        return format_operands_first(self, "__repr__", repr_from_operands)
+
+    def __str__(self):
+        "Default pretty print string construction for operators."
+        return format_operands_first(self, "__str__", str_from_operands)
+
+
+def repr_from_operands(o, operands):
+    "Return the repr string of an operator from the reprs of its operands."
+    return o._ufl_repr_(operands)
+
+
+def str_from_operands(o, operands, precedences=None):
+    """Return the pretty print string of an operator from the strings of
+    its operands. The operands are parenthesized by the precedences of
+    their expressions, or by the given precedences."""
+    if not hasattr(Operator, "_precedence"):
+        assign_precedences(build_precedence_list())
+    if precedences is None:
+        precedences = [op._precedence for op in o.ufl_operands]
+    paroperands = tuple(parenthesize(s, p, o._precedence) for s, p in zip(operands, precedences))
+    return o._ufl_str_(tuple(operands), paroperands)
+
+
+def format_operands_first(expr, method, build):
+    """Return the string of expr given by the method named method,
+    "__str__" or "__repr__".
+
+    The strings of operators using the default method of Operator are
+    built by build(o, operand_strings) from the strings of their
+    operands, without recursion and formatting each unique
+    subexpression once."""
+    default = getattr(Operator, method)
+    strings = {}
+    lifo = [expr]
+    while lifo:
+        o = lifo[-1]
+        if id(o) in strings:
+            lifo.pop()
+            continue
+        if getattr(type(o), method) is not default:
+            strings[id(o)] = getattr(o, method)()
+            lifo.pop()
+            continue
+        deps = [op for op in o.ufl_operands if id(op) not in strings]
+        if deps:
+            lifo.extend(deps)
+            continue
+        strings[id(o)] = build(o, [strings[id(op)] for op in o.ufl_operands])
+        lifo.pop()
+    return strings[id(expr)]
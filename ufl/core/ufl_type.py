@@ -10,6 +10,7 @@
 
 from ufl.core.expr import Expr
 from ufl.core.compute_expr_hash import compute_expr_hash
+from ufl.core.interning import interning_enabled, attach_interning_constructor
 from ufl.utils.formatting import camel2underscore
 
 
@@ -369,6 +370,10 @@ def ufl_type(is_abstract=False,
         check_implements_required_properties(cls)
         check_type_traits_consistency(cls)
 
+        # Types defined while interning is enabled must intern as well
+        if interning_enabled():
+            attach_interning_constructor(cls)
+
         return cls
 
     return _ufl_type_decorator_
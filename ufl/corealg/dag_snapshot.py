@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Flattened, array-backed snapshot of an expression DAG.
+
+A snapshot stores the unique nodes of one or more expressions in
+topological order (operands before the operators using them) together
+with integer arrays describing the graph:
+
+- ``typecodes``: the typecode of each node,
+- ``operand_offsets`` and ``operand_indices``: the operands of node
+  ``k`` are the nodes ``operand_indices[operand_offsets[k]:operand_offsets[k+1]]``
+  (compressed sparse row layout),
+- ``terminal_positions``: the positions of the terminal nodes.
+
+Building a snapshot costs one traversal of the expressions.  Repeated
+traversals of the same expressions can then iterate over integer
+indices, without allocating operand lists or hashing expression nodes.
+"""
+
+# Copyright (C) 2019 The FEniCS Project
+#
+# This file is part of UFL (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+from array import array
+
+from ufl.log import error
+from ufl.corealg.traversal import unique_post_traversal
+
+
+class DAGSnapshot(object):
+    """Flattened snapshot of the DAG of a sequence of expressions.
+
+    The member ``nodes`` is the list of unique nodes in topological
+    order, and ``roots`` the positions of the expressions.
+    """
+
+    __slots__ = ("nodes", "roots", "typecodes", "operand_offsets",
+                 "operand_indices", "terminal_positions", "_positions")
+
+    def __init__(self, expressions):
+        nodes = []
+        positions = {}
+        typecodes = array("i")
+        operand_offsets = array("l", [0])
+        operand_indices = array("l")
+        terminal_positions = array("l")
+
+        visited = set()
+        for expression in expressions:
+            for v in unique_post_traversal(expression, visited):
+                if v in positions:
+                    continue
+                k = len(nodes)
+                positions[v] = k
+                nodes.append(v)
+                typecodes.append(v._ufl_typecode_)
+                operand_indices.extend([positions[u] for u in v.ufl_operands])
+                operand_offsets.append(len(operand_indices))
+                if v._ufl_is_terminal_:
+                    terminal_positions.append(k)
+
+        self.nodes = nodes
+        self.roots = [positions[expression] for expression in expressions]
+        self.typecodes = typecodes
+        self.operand_offsets = operand_offsets
+        self.operand_indices = operand_indices
+        self.terminal_positions = terminal_positions
+        self._positions = positions
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def position(self, expression):
+        "Return the position of expression in the snapshot."
+        k = self._positions.get(expression)
+        if k is None:
+            error("Expression is not part of the DAG snapshot.")
+        return k
+
+    def operands(self, k):
+        "Return the positions of the operands of node k."
+        return self.operand_indices[self.operand_offsets[k]:self.operand_offsets[k + 1]]
+
+    def terminals(self):
+        "Return the unique terminals in the snapshot."
+        nodes = self.nodes
+        return [nodes[k] for k in self.terminal_positions]
+
+    def extract_type(self, ufl_type):
+        "Return the set of nodes in the snapshot of class ufl_type."
+        if ufl_type._ufl_is_terminal_:
+            candidates = self.terminals()
+        else:
+            candidates = self.nodes
+        return set(o for o in candidates if isinstance(o, ufl_type))
+
+    def post_order(self, root, cutoff_types=None, visited=None):
+        """Yield the positions of the nodes reachable from position root,
+        operands before operators, visiting each node once.
+
+        The order is the same as for ``unique_post_traversal``, or as
+        for ``cutoff_unique_post_traversal`` if cutoff_types is given.
+        A ``bytearray`` of visited flags can be shared between calls.
+        """
+        if visited is None:
+            visited = bytearray(len(self.nodes))
+        typecodes = self.typecodes
+        offsets = self.operand_offsets
+        indices = self.operand_indices
+
+        if cutoff_types is None:
+            # Operands in order, root marked as visited up front
+            visited[root] = 1
+            stack = [root]
+            next_operand = [offsets[root]]
+            while stack:
+                k = stack[-1]
+                j = next_operand[-1]
+                end = offsets[k + 1]
+                while j < end:
+                    d = indices[j]
+                    j += 1
+                    if not visited[d]:
+                        break
+                else:
+                    yield k
+                    visited[k] = 1
+                    stack.pop()
+                    next_operand.pop()
+                    continue
+                next_operand[-1] = j
+                stack.append(d)
+                next_operand.append(offsets[d])
+        else:
+            # Operands in reversed order, stopping at cutoff types
+            stack = [root]
+            next_operand = [offsets[root + 1]]
+            while stack:
+                k = stack[-1]
+                if cutoff_types[typecodes[k]]:
+                    yield k
+                    visited[k] = 1
+                    stack.pop()
+                    next_operand.pop()
+                    continue
+                j = next_operand[-1]
+                begin = offsets[k]
+                while j > begin:
+                    j -= 1
+                    d = indices[j]
+                    if not visited[d]:
+                        break
+                else:
+                    yield k
+                    visited[k] = 1
+                    stack.pop()
+                    next_operand.pop()
+                    continue
+                next_operand[-1] = j
+                stack.append(d)
+                next_operand.append(offsets[d + 1])
@@ -9,37 +9,163 @@
 #
 # Modified by Massimiliano Leoni, 2016
 
+from contextlib import contextmanager
+
+from ufl.log import error
 from ufl.core.expr import Expr
 from ufl.corealg.traversal import unique_post_traversal, cutoff_unique_post_traversal
 from ufl.corealg.multifunction import MultiFunction
 
 
-def map_expr_dag(function, expression, compress=True):
+class MapStatistics(object):
+    """Counters of the work done by :func:`map_expr_dags`, accumulated
+    over all calls made while collecting, see :func:`collect_map_statistics`.
+
+    - ``calls``: number of calls,
+    - ``nodes``: number of nodes the function was applied to,
+    - ``vcache_hits``: number of nodes reached again after being mapped,
+    - ``rcache_hits``: number of results replaced by an equal earlier result,
+    - ``results``: number of unique results,
+    - ``peak_nodes``: largest number of nodes mapped in a single call.
+    """
+
+    __slots__ = ("calls", "nodes", "vcache_hits", "rcache_hits", "results", "peak_nodes")
+
+    def __init__(self):
+        self.calls = 0
+        self.nodes = 0
+        self.vcache_hits = 0
+        self.rcache_hits = 0
+        self.results = 0
+        self.peak_nodes = 0
+
+    def record(self, nodes, vcache_hits, results, compress):
+        "Record the counters of a single call."
+        self.calls += 1
+        self.nodes += nodes
+        self.vcache_hits += vcache_hits
+        if compress:
+            self.rcache_hits += nodes - results
+        self.results += results
+        self.peak_nodes = max(self.peak_nodes, nodes)
+
+    def merge(self, other):
+        "Add the counters of another statistics object."
+        self.calls += other.calls
+        self.nodes += other.nodes
+        self.vcache_hits += other.vcache_hits
+        self.rcache_hits += other.rcache_hits
+        self.results += other.results
+        self.peak_nodes = max(self.peak_nodes, other.peak_nodes)
+
+    def vcache_hit_ratio(self):
+        "Return the fraction of node visits resolved by the vcache."
+        visits = self.nodes + self.vcache_hits
+        return self.vcache_hits / visits if visits else 0.0
+
+    def rcache_hit_ratio(self):
+        "Return the fraction of results resolved by the rcache."
+        return self.rcache_hits / self.nodes if self.nodes else 0.0
+
+
+class MapCache(object):
+    """Caches of :func:`map_expr_dags` kept between calls applying the
+    same function, such that nodes mapped in an earlier call are
+    neither traversed nor mapped again.
+
+    The cache is only valid if all earlier calls completed, and if the
+    function result for a node only depends on the node and the results
+    for its operands.
+    """
+
+    __slots__ = ("vcache", "rcache", "visited")
+
+    def __init__(self):
+        self.vcache = {}
+        self.rcache = {}
+        self.visited = set()
+
+    def __len__(self):
+        return len(self.vcache)
+
+    def clear(self):
+        self.vcache.clear()
+        self.rcache.clear()
+        self.visited.clear()
+
+
+# The statistics object receiving the counters of map_expr_dags calls,
+# None when not collecting
+_collected_statistics = None
+
+
+@contextmanager
+def collect_map_statistics(statistics=None):
+    """Context manager collecting counters of all calls of
+    :func:`map_expr_dags` in the block, including nested calls.
+
+    Yields the :class:`MapStatistics` object, which is also added to
+    the statistics of an enclosing collection on exit.
+    """
+    global _collected_statistics
+    previous = _collected_statistics
+    if statistics is None:
+        statistics = MapStatistics()
+    _collected_statistics = statistics
+    try:
+        yield statistics
+    finally:
+        _collected_statistics = previous
+        if previous is not None:
+            previous.merge(statistics)
+
+
+def map_expr_dag(function, expression, compress=True, snapshot=None, cache=None):
     """Apply a function to each subexpression node in an expression DAG.
 
     If *compress* is ``True`` (default) the output object from
     the function is cached in a ``dict`` and reused such that the
     resulting expression DAG does not contain duplicate objects.
 
+    The traversal can iterate over a *snapshot* of the expression DAG,
+    and results can be reused from a *cache* of earlier calls, see
+    :func:`map_expr_dags`.
+
     Return the result of the final function call.
     """
-    result, = map_expr_dags(function, [expression], compress=compress)
+    result, = map_expr_dags(function, [expression], compress=compress, snapshot=snapshot,
+                            cache=cache)
     return result
 
 
-def map_expr_dags(function, expressions, compress=True):
+def map_expr_dags(function, expressions, compress=True, snapshot=None, cache=None):
     """Apply a function to each subexpression node in an expression DAG.
 
     If *compress* is ``True`` (default) the output object from
     the function is cached in a ``dict`` and reused such that the
     resulting expression DAG does not contain duplicate objects.
 
+    If a :class:`~ufl.corealg.dag_snapshot.DAGSnapshot` containing the
+    expressions is given, the traversal iterates over the snapshot
+    arrays instead of the expression objects. The function is applied
+    to the nodes in the same order in both cases.
+
+    If a :class:`MapCache` is given, results are reused from and stored
+    in the cache, which must only be used with the same function.
+
     Return a list with the result of the final function call for each expression.
     """
 
     # Temporary data structures
-    vcache = {}  # expr -> r = function(expr,...),  cache of intermediate results
-    rcache = {}  # r -> r,  cache of result objects for memory reuse
+    if cache is None:
+        vcache = {}  # expr -> r = function(expr,...),  cache of intermediate results
+        rcache = {}  # r -> r,  cache of result objects for memory reuse
+        # Visited set shared between traversal calls
+        visited = set()
+    else:
+        vcache, rcache, visited = cache.vcache, cache.rcache, cache.visited
+    num_mapped = len(vcache)
+    num_results = len(rcache)
 
     # Build mapping typecode:bool, for which types to skip the subtree of
     if isinstance(function, MultiFunction):
@@ -50,8 +176,10 @@ def map_expr_dags(function, expressions, compress=True):
         cutoff_types = [False] * Expr._ufl_num_typecodes_
         handlers = [function] * Expr._ufl_num_typecodes_
 
-    # Create visited set here to share between traversal calls
-    visited = set()
+    if snapshot is not None:
+        if cache is not None:
+            error("Cannot use a map cache with a DAG snapshot.")
+        return _map_snapshot_dags(handlers, cutoff_types, snapshot, expressions, compress)
 
     # Pick faster traversal algorithm if we have no cutoffs
     if any(cutoff_types):
@@ -61,11 +189,13 @@ def map_expr_dags(function, expressions, compress=True):
         def traversal(expression):
             return unique_post_traversal(expression, visited)
 
+    vcache_hits = 0
     for expression in expressions:
         # Iterate over all subexpression nodes, child before parent
         for v in traversal(expression):
             # Skip transformations on cache hit
             if v in vcache:
+                vcache_hits += 1
                 continue
 
             # Cache miss: Get transformed operands, then apply transformation
@@ -89,4 +219,168 @@ def map_expr_dags(function, expressions, compress=True):
             # Store result in cache
             vcache[v] = r
 
+    if _collected_statistics is not None:
+        num_mapped = len(vcache) - num_mapped
+        _collected_statistics.record(num_mapped, vcache_hits,
+                                     len(rcache) - num_results if compress else num_mapped,
+                                     compress)
+
     return [vcache[expression] for expression in expressions]
+
+
+def _map_snapshot_dags(handlers, cutoff_types, snapshot, expressions, compress):
+    "Implementation of map_expr_dags iterating over a DAG snapshot."
+    nodes = snapshot.nodes
+    typecodes = snapshot.typecodes
+    offsets = snapshot.operand_offsets
+    indices = snapshot.operand_indices
+    n = len(nodes)
+
+    results = [None] * n  # position -> r, cache of intermediate results
+    done = bytearray(n)
+    visited = bytearray(n)
+    rcache = {}
+
+    cutoffs = cutoff_types if any(cutoff_types) else None
+    roots = [snapshot.position(expression) for expression in expressions]
+    nodes_mapped = 0
+    vcache_hits = 0
+    for root in roots:
+        for k in snapshot.post_order(root, cutoffs, visited):
+            if done[k]:
+                vcache_hits += 1
+                continue
+            tc = typecodes[k]
+            if cutoff_types[tc]:
+                r = handlers[tc](nodes[k])
+            else:
+                r = handlers[tc](nodes[k], *[results[u] for u in indices[offsets[k]:offsets[k + 1]]])
+            if compress:
+                r2 = rcache.get(r)
+                if r2 is None:
+                    rcache[r] = r
+                else:
+                    r = r2
+            results[k] = r
+            done[k] = 1
+            nodes_mapped += 1
+
+    if _collected_statistics is not None:
+        _collected_statistics.record(nodes_mapped, vcache_hits,
+                                     len(rcache) if compress else nodes_mapped, compress)
+
+    return [results[root] for root in roots]
+
+
+def map_expr_dags_fused(functions, expressions, compress=True):
+    """Apply a chain of functions to each subexpression node in an
+    expression DAG, fusing the passes into a single traversal.
+
+    The result is the same as applying :func:`map_expr_dags` with each
+    function in turn, but the intermediate expressions are never
+    traversed separately: the result of the first function at each node
+    is immediately handed to the second function, and so on.  Each
+    function keeps its own caches, and only maps the nodes of a result
+    handed to it which it has not mapped before, usually the result
+    node itself since its operands are results handed to it earlier.
+
+    Only the first function may cut off traversal of subtrees of
+    non-terminal nodes, see :func:`fusion_blocking_types`.
+
+    Return a list with the result of the final function call for each expression.
+    """
+    if len(functions) == 1:
+        return map_expr_dags(functions[0], expressions, compress=compress)
+
+    stages = []
+    for function in functions:
+        # Build mapping typecode:bool, for which types to skip the subtree of
+        if isinstance(function, MultiFunction):
+            cutoff_types = function._is_cutoff_type
+            handlers = function._handlers
+        else:
+            cutoff_types = [False] * Expr._ufl_num_typecodes_
+            handlers = [function] * Expr._ufl_num_typecodes_
+
+        # Each stage has its own caches
+        stages.append((cutoff_types, handlers, {}, {}))
+
+    def apply_stage(v, cutoff_types, handlers, vcache, rcache):
+        if cutoff_types[v._ufl_typecode_]:
+            r = handlers[v._ufl_typecode_](v)
+        else:
+            r = handlers[v._ufl_typecode_](v, *[vcache[u] for u in v.ufl_operands])
+        if compress:
+            r2 = rcache.get(r)
+            if r2 is None:
+                rcache[r] = r
+            else:
+                r = r2
+        vcache[v] = r
+        return r
+
+    def feed_stage(r, cutoff_types, handlers, vcache, rcache):
+        "Map r, and the nodes below it not mapped before, by a later stage."
+        stack = [r]
+        while stack:
+            w = stack[-1]
+            if w in vcache:
+                stack.pop()
+                continue
+            if not cutoff_types[w._ufl_typecode_]:
+                operands = [u for u in w.ufl_operands if u not in vcache]
+                if operands:
+                    stack.extend(operands)
+                    continue
+            stack.pop()
+            apply_stage(w, cutoff_types, handlers, vcache, rcache)
+        return vcache[r]
+
+    first, later = stages[0], stages[1:]
+    first_cutoff_types, first_handlers, first_vcache, first_rcache = first
+    if any(first_cutoff_types):
+        def traversal(expression, visited):
+            return cutoff_unique_post_traversal(expression, first_cutoff_types, visited)
+    else:
+        traversal = unique_post_traversal
+    visited = set()
+    vcache_hits = 0
+    for expression in expressions:
+        for v in traversal(expression, visited):
+            if v in first_vcache:
+                vcache_hits += 1
+                continue
+            r = apply_stage(v, *first)
+
+            # Hand the new intermediate result to the later stages
+            for stage in later:
+                r = feed_stage(r, *stage)
+
+    if _collected_statistics is not None:
+        for k, (cutoff_types, handlers, vcache, rcache) in enumerate(stages):
+            _collected_statistics.record(len(vcache), vcache_hits if k == 0 else 0,
+                                         len(rcache) if compress else len(vcache), compress)
+
+    results = []
+    for expression in expressions:
+        r = first_vcache[expression]
+        for stage in later:
+            r = stage[2][r]
+        results.append(r)
+    return results
+
+
+def fusion_blocking_types(function):
+    """Return the non-terminal expression types for which *function*
+    has cutoff handlers, i.e. handlers that do not want their operands
+    mapped first.
+
+    A function with such handlers cannot be placed after another
+    function in :func:`map_expr_dags_fused`, because the intermediate
+    results fed to it include the operands it would have skipped.
+    """
+    if not isinstance(function, MultiFunction):
+        return ()
+    return tuple(cls for cls in Expr._ufl_all_classes_
+                 if function._is_cutoff_type[cls._ufl_typecode_] and
+                 not cls._ufl_is_terminal_ and not cls._ufl_is_abstract_)
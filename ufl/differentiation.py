@@ -19,7 +19,6 @@ from ufl.exprcontainers import ExprList, ExprMapping
 from ufl.constantvalue import Zero
 from ufl.coefficient import Coefficient
 from ufl.variable import Variable
-from ufl.precedence import parstr
 from ufl.domain import find_geometric_dimension
 from ufl.checks import is_cellwise_constant
 
@@ -62,10 +61,8 @@ class CoefficientDerivative(Derivative):
         Derivative.__init__(self, (integrand, coefficients, arguments,
                                    coefficient_derivatives))
 
-    def __str__(self):
-        return "d/dfj { %s }, with fh=%s, dfh/dfj = %s, and coefficient derivatives %s"\
-            % (self.ufl_operands[0], self.ufl_operands[1],
-               self.ufl_operands[2], self.ufl_operands[3])
+    def _ufl_str_(self, operands, paroperands):
+        return "d/dfj { %s }, with fh=%s, dfh/dfj = %s, and coefficient derivatives %s" % operands
 
 
 @ufl_type(num_ops=4, inherit_shape_from_operand=0,
@@ -74,10 +71,8 @@ class CoordinateDerivative(CoefficientDerivative):
     """Derivative of the integrand of a form w.r.t. the SpatialCoordinates."""
     __slots__ = ()
 
-    def __str__(self):
-        return "d/dfj { %s }, with fh=%s, dfh/dfj = %s, and coordinate derivatives %s"\
-            % (self.ufl_operands[0], self.ufl_operands[1],
-               self.ufl_operands[2], self.ufl_operands[3])
+    def _ufl_str_(self, operands, paroperands):
+        return "d/dfj { %s }, with fh=%s, dfh/dfj = %s, and coordinate derivatives %s" % operands
 
 
 @ufl_type(num_ops=2)
@@ -112,11 +107,10 @@ class VariableDerivative(Derivative):
         self.ufl_index_dimensions = f.ufl_index_dimensions
         self.ufl_shape = f.ufl_shape + v.ufl_shape
 
-    def __str__(self):
+    def _ufl_str_(self, operands, paroperands):
         if isinstance(self.ufl_operands[0], Terminal):
-            return "d%s/d[%s]" % (self.ufl_operands[0], self.ufl_operands[1])
-        return "d/d[%s] %s" % (self.ufl_operands[1],
-                               parstr(self.ufl_operands[0], self))
+            return "d%s/d[%s]" % operands
+        return "d/d[%s] %s" % (operands[1], paroperands[0])
 
 
 # --- Compound differentiation objects ---
@@ -170,8 +164,8 @@ class Grad(CompoundDerivative):
     def ufl_shape(self):
         return self.ufl_operands[0].ufl_shape + (self._dim,)
 
-    def __str__(self):
-        return "grad(%s)" % self.ufl_operands[0]
+    def _ufl_str_(self, operands, paroperands):
+        return "grad(%s)" % operands
 
 
 @ufl_type(num_ops=1, inherit_indices_from_operand=0, is_terminal_modifier=True,
@@ -215,8 +209,8 @@ class ReferenceGrad(CompoundDerivative):
     def ufl_shape(self):
         return self.ufl_operands[0].ufl_shape + (self._dim,)
 
-    def __str__(self):
-        return "reference_grad(%s)" % self.ufl_operands[0]
+    def _ufl_str_(self, operands, paroperands):
+        return "reference_grad(%s)" % operands
 
 
 @ufl_type(num_ops=1, inherit_indices_from_operand=0, is_terminal_modifier=True)
@@ -240,8 +234,8 @@ class Div(CompoundDerivative):
     def ufl_shape(self):
         return self.ufl_operands[0].ufl_shape[:-1]
 
-    def __str__(self):
-        return "div(%s)" % self.ufl_operands[0]
+    def _ufl_str_(self, operands, paroperands):
+        return "div(%s)" % operands
 
 
 @ufl_type(num_ops=1, inherit_indices_from_operand=0, is_terminal_modifier=True,
@@ -266,8 +260,8 @@ class ReferenceDiv(CompoundDerivative):
     def ufl_shape(self):
         return self.ufl_operands[0].ufl_shape[:-1]
 
-    def __str__(self):
-        return "reference_div(%s)" % self.ufl_operands[0]
+    def _ufl_str_(self, operands, paroperands):
+        return "reference_div(%s)" % operands
 
 
 @ufl_type(num_ops=1, inherit_indices_from_operand=0)
@@ -301,8 +295,8 @@ class NablaGrad(CompoundDerivative):
     def ufl_shape(self):
         return (self._dim,) + self.ufl_operands[0].ufl_shape
 
-    def __str__(self):
-        return "nabla_grad(%s)" % self.ufl_operands[0]
+    def _ufl_str_(self, operands, paroperands):
+        return "nabla_grad(%s)" % operands
 
 
 @ufl_type(num_ops=1, inherit_indices_from_operand=0)
@@ -326,8 +320,8 @@ class NablaDiv(CompoundDerivative):
     def ufl_shape(self):
         return self.ufl_operands[0].ufl_shape[1:]
 
-    def __str__(self):
-        return "nabla_div(%s)" % self.ufl_operands[0]
+    def _ufl_str_(self, operands, paroperands):
+        return "nabla_div(%s)" % operands
 
 
 _curl_shapes = {(): (2,), (2,): (), (3,): (3,)}
@@ -356,8 +350,8 @@ class Curl(CompoundDerivative):
         CompoundDerivative.__init__(self, (f,))
         self.ufl_shape = _curl_shapes[f.ufl_shape]
 
-    def __str__(self):
-        return "curl(%s)" % self.ufl_operands[0]
+    def _ufl_str_(self, operands, paroperands):
+        return "curl(%s)" % operands
 
 
 @ufl_type(num_ops=1, inherit_indices_from_operand=0,
@@ -384,5 +378,5 @@ class ReferenceCurl(CompoundDerivative):
         CompoundDerivative.__init__(self, (f,))
         self.ufl_shape = _curl_shapes[f.ufl_shape]
 
-    def __str__(self):
-        return "reference_curl(%s)" % self.ufl_operands[0]
+    def _ufl_str_(self, operands, paroperands):
+        return "reference_curl(%s)" % operands
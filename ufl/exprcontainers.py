@@ -11,6 +11,14 @@ from ufl.log import error
 from ufl.core.expr import Expr
 from ufl.core.operator import Operator
 from ufl.core.ufl_type import ufl_type
+from ufl.indexed import Indexed
+
+
+def _tuple_repr(operands):
+    "Return the repr of a tuple from the reprs of its items."
+    if len(operands) == 1:
+        return "(%s,)" % operands[0]
+    return "(%s)" % ", ".join(operands)
 
 
 # --- Non-tensor types ---
@@ -18,12 +26,38 @@ from ufl.core.ufl_type import ufl_type
 @ufl_type(num_ops="varying")
 class ExprList(Operator):
     "List of Expr objects. For internal use, never to be created by end users."
-    __slots__ = ()
+    __slots__ = ("_index",)
 
     def __init__(self, *operands):
         Operator.__init__(self, operands)
         if not all(isinstance(i, Expr) for i in operands):
             error("Expecting Expr in ExprList.")
+        # Lookup tables of operand positions, built on first request
+        self._index = None
+
+    def _build_index(self):
+        positions = {}
+        component_positions = {}
+        for k, e in enumerate(self.ufl_operands):
+            positions.setdefault(e, []).append(k)
+            component_positions.setdefault(e, []).append(k)
+            if isinstance(e, Indexed):
+                component_positions.setdefault(e.ufl_operands[0], []).append(k)
+        self._index = ({e: tuple(p) for e, p in positions.items()},
+                       {e: tuple(p) for e, p in component_positions.items()})
+
+    def positions(self, e):
+        "Return the positions of the operands equal to e."
+        if self._index is None:
+            self._build_index()
+        return self._index[0].get(e, ())
+
+    def component_positions(self, e):
+        """Return the positions of the operands equal to e or to a
+        component ``e[...]`` of e, in increasing order."""
+        if self._index is None:
+            self._build_index()
+        return self._index[1].get(e, ())
 
     def __getitem__(self, i):
         return self.ufl_operands[i]
@@ -34,12 +68,11 @@ class ExprList(Operator):
     def __iter__(self):
         return iter(self.ufl_operands)
 
-    def __str__(self):
-        return "ExprList(*(%s,))" % ", ".join(str(i) for i in self.ufl_operands)
+    def _ufl_str_(self, operands, paroperands):
+        return "ExprList(*(%s,))" % ", ".join(operands)
 
-    def __repr__(self):
-        r = "ExprList(*%s)" % repr(self.ufl_operands)
-        return r
+    def _ufl_repr_(self, operands):
+        return "ExprList(*%s)" % _tuple_repr(operands)
 
     @property
     def ufl_shape(self):
@@ -63,12 +96,21 @@ class ExprList(Operator):
 @ufl_type(num_ops="varying")
 class ExprMapping(Operator):
     "Mapping of Expr objects. For internal use, never to be created by end users."
-    __slots__ = ()
+    __slots__ = ("_mapping",)
 
     def __init__(self, *operands):
         Operator.__init__(self, operands)
         if not all(isinstance(e, Expr) for e in operands):
             error("Expecting Expr in ExprMapping.")
+        # Dict of the mapping, built on first request
+        self._mapping = None
+
+    def mapping(self):
+        "Return a dict with the key and value pairs of the operands."
+        if self._mapping is None:
+            ops = self.ufl_operands
+            self._mapping = {ops[2 * i]: ops[2 * i + 1] for i in range(len(ops) // 2)}
+        return self._mapping
 
     def ufl_domains(self):
         # Because this type can act like a terminal if it has no
@@ -87,12 +129,11 @@ class ExprMapping(Operator):
     # def __iter__(self):
     #     return iter(self.ufl_operands[::2])
 
-    def __str__(self):
-        return "ExprMapping(*%s)" % repr(self.ufl_operands)
+    def _ufl_str_(self, operands, paroperands):
+        return repr(self)
 
-    def __repr__(self):
-        r = "ExprMapping(*%s)" % repr(self.ufl_operands)
-        return r
+    def _ufl_repr_(self, operands):
+        return "ExprMapping(*%s)" % _tuple_repr(operands)
 
     @property
     def ufl_shape(self):
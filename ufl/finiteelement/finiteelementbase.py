@@ -11,6 +11,8 @@
 # Modified by Marie E. Rognes 2010, 2012
 # Modified by Massimiliano Leoni, 2016
 
+import sys
+
 from ufl.utils.sequences import product
 from ufl.utils.dicts import EmptyDict
 from ufl.log import error
@@ -26,6 +28,7 @@ class FiniteElementBase(object):
                  "_value_shape",
                  "_reference_value_shape",
                  "_repr",
+                 "_hash_key",
                  "__weakref__")
 
     # TODO: Not all these should be in the base class! In particular
@@ -67,13 +70,34 @@ class FiniteElementBase(object):
     def _ufl_signature_data_(self):
         return repr(self)
 
+    def _ufl_hash_key_(self):
+        """Return the hash data of the element, computed on first use
+        since subclasses assign their repr after initializing the base
+        class."""
+        try:
+            return self._hash_key
+        except AttributeError:
+            key = self._ufl_hash_data_()
+            if isinstance(key, str):
+                # Equal elements share the interned string, such that
+                # comparing keys is an identity check and its hash is
+                # computed once
+                key = sys.intern(key)
+            self._hash_key = key
+            return key
+
     def __hash__(self):
         "Compute hash code for insertion in hashmaps."
-        return hash(self._ufl_hash_data_())
+        try:
+            return hash(self._hash_key)
+        except AttributeError:
+            return hash(self._ufl_hash_key_())
 
     def __eq__(self, other):
         "Compute element equality for insertion in hashmaps."
-        return type(self) == type(other) and self._ufl_hash_data_() == other._ufl_hash_data_()
+        if self is other:
+            return True
+        return type(self) is type(other) and self._ufl_hash_key_() == other._ufl_hash_key_()
 
     def __ne__(self, other):
         "Compute element inequality for insertion in hashmaps."
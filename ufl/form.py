@@ -11,13 +11,12 @@
 # Modified by Massimiliano Leoni, 2016.
 # Modified by Cecile Daversin-Catty, 2018.
 
-from itertools import chain
 from collections import defaultdict
 
 from ufl.log import error, warning
 from ufl.domain import sort_domains
 from ufl.integral import Integral
-from ufl.checks import is_scalar_constant_expression
+from ufl.checks import is_scalar_constant_expression, is_python_scalar
 from ufl.equation import Equation
 from ufl.core.expr import Expr
 from ufl.core.expr import ufl_err_str
@@ -82,6 +81,8 @@ class Form(object):
         "_coefficients",
         "_coefficient_numbering",
         "_constants",
+        "_analysis",
+        "_merge_sources",
         "_hash",
         "_signature",
         # --- Dict that external frameworks can place framework-specific
@@ -107,13 +108,20 @@ class Form(object):
         # Internal variables for caching subdomain data
         self._subdomain_data = None
 
-        # Internal variables for caching form argument data
+        # Internal variables for caching form argument data, computed
+        # on first request
         self._arguments = None
         self._coefficients = None
         self._coefficient_numbering = None
+        self._constants = None
 
-        from ufl.algorithms.analysis import extract_constants
-        self._constants = extract_constants(self)
+        # Analysis of the integrands, shared by the accessors
+        self._analysis = None
+
+        # Forms and scalar expressions this form was built from, whose
+        # form argument data is merged instead of analyzing the
+        # integrands, None when no longer needed
+        self._merge_sources = ()
 
         # Internal variables for caching of hash and signature after
         # first request
@@ -127,6 +135,10 @@ class Form(object):
 
     def integrals(self):
         "Return a sequence of all integrals in form."
+        if self._integrals is None:
+            self._integrals = _sorted_integrals(self._collect_integrals())
+            if self._arguments is not None:
+                self._merge_sources = None
         return self._integrals
 
     def integrals_by_type(self, integral_type):
@@ -235,8 +247,19 @@ class Form(object):
         return self._coefficient_numbering
 
     def constants(self):
+        "Return all ``Constant`` objects found in form."
+        if self._constants is None:
+            self._analyze_form_arguments()
         return self._constants
 
+    def analysis(self):
+        """Return the :class:`~ufl.algorithms.analysis.FormAnalysis` of
+        the integrands, computed in a single traversal on first request."""
+        if self._analysis is None:
+            from ufl.algorithms.analysis import FormAnalysis
+            self._analysis = FormAnalysis(self)
+        return self._analysis
+
     def signature(self):
         "Signature for use with jit cache (independent of incidental numbering of indices etc.)"
         if self._signature is None:
@@ -268,7 +291,7 @@ class Form(object):
         "Evaluate ``bool(lhs_form == rhs_form)``."
         if type(other) != Form:
             return False
-        if len(self._integrals) != len(other._integrals):
+        if len(self.integrals()) != len(other.integrals()):
             return False
         if hash(self) != hash(other):
             return False
@@ -280,8 +303,12 @@ class Form(object):
 
     def __add__(self, other):
         if isinstance(other, Form):
-            # Add integrals from both forms
-            return Form(list(chain(self.integrals(), other.integrals())))
+            # Add integrals from both forms, collected and sorted on
+            # first request such that summing many forms is linear
+            form = Form(())
+            form._integrals = None
+            form._merge_sources = (self, other)
+            return form
 
         elif isinstance(other, (int, float)) and other == 0:
             # Allow adding 0 or 0.0 as a no-op, needed for sum([a,b])
@@ -310,13 +337,19 @@ class Form(object):
 
         This enables the handy "-form" syntax for e.g. the
         linearized system (J, -F) from a nonlinear form F."""
-        return Form([-itg for itg in self.integrals()])
+        form = Form([-itg for itg in self.integrals()])
+        form._merge_sources = (self,)
+        return form
 
     def __rmul__(self, scalar):
         "Multiply all integrals in form with constant scalar value."
         # This enables the handy "0*form" or "dt*form" syntax
         if is_scalar_constant_expression(scalar):
-            return Form([scalar * itg for itg in self.integrals()])
+            form = Form([scalar * itg for itg in self.integrals()])
+            # Multiplying by zero removes the form arguments
+            if not (scalar == 0 if is_python_scalar(scalar) else isinstance(scalar, Zero)):
+                form._merge_sources = (self,) if is_python_scalar(scalar) else (self, scalar)
+            return form
         return NotImplemented
 
     def __mul__(self, coefficient):
@@ -389,6 +422,11 @@ class Form(object):
         s = "\n  +  ".join(str(itg) for itg in self.integrals())
         return s or "<empty Form>"
 
+    def _ufl_err_str_(self):
+        "Return a short string to represent this Form in an error message."
+        s = "\n  +  ".join(itg._ufl_err_str_() for itg in self.integrals())
+        return s or "<empty Form>"
+
     def __repr__(self):
         "Compute repr string of form. This can be huge for complicated forms."
         # Warning used for making sure we don't use this in the general pipeline:
@@ -398,14 +436,61 @@ class Form(object):
         r = "Form([" + itgs + "])"
         return r
 
+    def __getstate__(self):
+        "Return the state of the form for pickling, with the integrals collected."
+        self.integrals()
+        state = dict((name, getattr(self, name)) for name in self.__slots__)
+        # Drop the forms this form was built from and the analysis,
+        # both are recomputed from the integrals on request
+        state["_merge_sources"] = None if self._arguments is not None else ()
+        state["_analysis"] = None
+        return (None, state)
+
     # --- Analysis functions, precomputation and caching of various quantities
 
+    def _collect_integrals(self):
+        """Return the integrals of the forms this form is the sum of, in
+        order.
+
+        The merge sources are replaced by the forms with integrals
+        found, such that the intermediate forms of a chain of sums are
+        not kept alive by this form."""
+        integrals = []
+        leaves = []
+        stack = list(reversed(self._merge_sources))
+        while stack:
+            form = stack.pop()
+            if form._integrals is None:
+                stack.extend(reversed(form._merge_sources))
+            else:
+                leaves.append(form)
+                integrals.extend(form._integrals)
+        self._merge_sources = tuple(leaves)
+        return integrals
+
+    def _merge_source_leaves(self):
+        """Return the forms with form argument data and expressions this
+        form was built from, or None if the integrands must be analyzed."""
+        leaves = []
+        stack = list(self._merge_sources)
+        if not stack:
+            return None
+        while stack:
+            source = stack.pop()
+            if not isinstance(source, Form) or source._arguments is not None:
+                leaves.append(source)
+            elif source._merge_sources:
+                stack.extend(source._merge_sources)
+            else:
+                return None
+        return leaves
+
     def _analyze_domains(self):
         from ufl.domain import join_domains, sort_domains
 
         # Collect unique integration domains
         integration_domains = join_domains(
-            [itg.ufl_domain() for itg in self._integrals])
+            [itg.ufl_domain() for itg in self.integrals()])
 
         # Make canonically ordered list of the domains
         self._integration_domains = sort_domains(integration_domains)
@@ -442,9 +527,32 @@ class Form(object):
         self._subdomain_data = subdomain_data
 
     def _analyze_form_arguments(self):
-        "Analyze which Argument and Coefficient objects can be found in the form."
-        from ufl.algorithms.analysis import extract_arguments_and_coefficients
-        arguments, coefficients = extract_arguments_and_coefficients(self)
+        "Analyze which Argument, Coefficient and Constant objects can be found in the form."
+        from ufl.core.terminal import FormArgument
+        from ufl.constant import Constant
+        from ufl.utils.sorting import sorted_by_count
+        from ufl.algorithms.analysis import FormAnalysis, _checked_arguments_and_coefficients
+        leaves = self._merge_source_leaves()
+        if leaves is None:
+            analysis = self.analysis()
+            arguments, coefficients = analysis.arguments_and_coefficients()
+            constants = analysis.constants()
+        else:
+            # Merge the data of the forms and scalars this form was
+            # built from
+            terminals = set()
+            constants = set()
+            for source in leaves:
+                if isinstance(source, Form):
+                    terminals.update(source._arguments)
+                    terminals.update(source._coefficients)
+                    constants.update(source._constants)
+                else:
+                    analysis = FormAnalysis(source)
+                    terminals.update(analysis.terminals(FormArgument))
+                    constants.update(analysis.terminals(Constant))
+            arguments, coefficients = _checked_arguments_and_coefficients(terminals)
+            constants = sorted_by_count(constants)
 
         # Define canonical numbering of arguments and coefficients
         self._arguments = tuple(
@@ -453,6 +561,9 @@ class Form(object):
             sorted(set(coefficients), key=lambda x: x.count()))
         self._coefficient_numbering = dict(
             (c, i) for i, c in enumerate(self._coefficients))
+        self._constants = constants
+        if self._integrals is not None:
+            self._merge_sources = None
 
     def _compute_renumbering(self):
         # Include integration domains and coefficients in renumbering
@@ -12,6 +12,10 @@ of UFL objects, mostly intended for debugging purposes."""
 
 from ufl.log import error
 from ufl.core.expr import Expr
+from ufl.core.terminal import Terminal
+from ufl.core.operator import Operator, repr_from_operands, str_from_operands
+from ufl.precedence import assign_precedences, build_precedence_list
+from ufl.corealg.traversal import unique_post_traversal
 from ufl.form import Form
 from ufl.integral import Integral
 
@@ -119,3 +123,81 @@ def tree_format(expression, indentation=0, parentheses=True):
         error("Invalid object type %s" % type(expression))
 
     return s
+
+
+# --- Formatting of expressions with shared subexpressions
+
+# Shared subexpressions with shorter strings are printed inline
+_inline_length = 20
+
+
+def _truncate(s, max_length):
+    if max_length is not None and len(s) > max_length:
+        return s[:max_length] + "..."
+    return s
+
+
+def _dag_format(expression, method, max_length):
+    if not isinstance(expression, Expr):
+        error("Expecting an Expr, not %s." % type(expression))
+
+    nodes = list(unique_post_traversal(expression))
+    uses = {}
+    for o in nodes:
+        for op in o.ufl_operands:
+            uses[op] = uses.get(op, 0) + 1
+
+    if not hasattr(Terminal, "_precedence"):
+        assign_precedences(build_precedence_list())
+
+    # Format each unique node once, from the operands up
+    strings = {}
+    bound = set()
+    bindings = []
+    length = 0
+    for o in nodes:
+        if getattr(type(o), method) is not getattr(Operator, method):
+            # Terminals and operators formatting themselves
+            s = getattr(o, method)()
+        elif method == "__str__":
+            # Names of bindings are never parenthesized, like terminals
+            s = str_from_operands(o, [strings[op] for op in o.ufl_operands],
+                                  [Terminal._precedence if op in bound else op._precedence
+                                   for op in o.ufl_operands])
+        else:
+            s = repr_from_operands(o, [strings[op] for op in o.ufl_operands])
+        s = _truncate(s, max_length)
+        if o is not expression and uses.get(o, 0) > 1 and len(s) > _inline_length:
+            name = "e%d" % len(bindings)
+            bindings.append("  %s = %s" % (name, s))
+            length += len(bindings[-1])
+            if max_length is not None and length > max_length:
+                bindings.append("  ...")
+                break
+            strings[o] = name
+            bound.add(o)
+        else:
+            strings[o] = s
+
+    root = strings.get(expression, "...")
+    if not bindings:
+        return root
+    return "let\n%s\nin %s" % ("\n".join(bindings), root)
+
+
+def dag_repr(expression, max_length=None):
+    """Return a repr of expression printing each shared subexpression
+    once, as a let binding.
+
+    The cost is linear in the number of unique nodes, while ``repr``
+    prints shared subexpressions at every use. If max_length is given,
+    the string of each node and the list of bindings are truncated
+    after about max_length characters, for use in diagnostics.
+    """
+    return _dag_format(expression, "__repr__", max_length)
+
+
+def dag_str(expression, max_length=None):
+    """Return a pretty print string of expression printing each shared
+    subexpression once, as a let binding, see :func:`dag_repr`."""
+    return _dag_format(expression, "__str__", max_length)
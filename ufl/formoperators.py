@@ -34,6 +34,7 @@ from ufl.algorithms import compute_form_adjoint, compute_form_action
 from ufl.algorithms import compute_energy_norm
 from ufl.algorithms import compute_form_lhs, compute_form_rhs, compute_form_functional
 from ufl.algorithms import expand_derivatives, extract_arguments
+from ufl.algorithms import compute_reverse_derivatives
 
 # Part of the external interface
 from ufl.algorithms import replace  # noqa
@@ -305,6 +306,33 @@ def derivative(form, coefficient, argument=None, coefficient_derivatives=None):
     error("Invalid argument type %s." % str(type(form)))
 
 
+def reverse_derivative(form, coefficients, arguments=None):
+    """UFL form operator:
+    Compute the Gateaux derivatives of the functional *form* w.r.t.
+    each of *coefficients* in direction of the corresponding
+    *arguments*, in a single reverse mode (adjoint) sweep.
+
+    This is equivalent to, but cheaper than, applying ``derivative``
+    once for each coefficient when there are many coefficients.
+    The derivatives are returned with derivatives applied.
+
+    If the arguments are omitted, a new ``Argument`` with number 0
+    is created in the space of each coefficient.
+
+    Returns a tuple with one linear form for each coefficient.
+    Only real valued functionals are supported.
+    """
+    form = as_form(form)
+    if isinstance(coefficients, Coefficient):
+        coefficients = (coefficients,)
+    coefficients = tuple(coefficients)
+    if arguments is None:
+        arguments = tuple(Argument(w.ufl_function_space(), 0) for w in coefficients)
+    elif isinstance(arguments, Argument):
+        arguments = (arguments,)
+    return compute_reverse_derivatives(form, coefficients, tuple(arguments))
+
+
 def sensitivity_rhs(a, u, L, v):
     """UFL form operator:
     Compute the right hand side for a sensitivity calculation system.
@@ -14,7 +14,6 @@ from ufl.core.ufl_type import ufl_type
 from ufl.core.operator import Operator
 from ufl.core.multiindex import Index, FixedIndex, MultiIndex
 from ufl.index_combination_utils import unique_sorted_indices, merge_unique_indices
-from ufl.precedence import parstr
 
 
 # --- Indexed expression ---
@@ -104,9 +103,8 @@ class Indexed(Operator):
         else:
             return A.evaluate(x, mapping, component, index_values)
 
-    def __str__(self):
-        return "%s[%s]" % (parstr(self.ufl_operands[0], self),
-                           self.ufl_operands[1])
+    def _ufl_str_(self, operands, paroperands):
+        return "%s[%s]" % (paroperands[0], operands[1])
 
     def __getitem__(self, key):
         error("Attempting to index with %s, but object is already indexed: %s" % (ufl_err_str(key), ufl_err_str(self)))
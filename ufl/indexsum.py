@@ -13,7 +13,6 @@ from ufl.core.ufl_type import ufl_type
 from ufl.core.expr import Expr, ufl_err_str
 from ufl.core.operator import Operator
 from ufl.core.multiindex import MultiIndex
-from ufl.precedence import parstr
 from ufl.constantvalue import Zero
 
 
@@ -77,6 +76,5 @@ class IndexSum(Operator):
             index_values.pop()
         return tmp
 
-    def __str__(self):
-        return "sum_{%s} %s " % (str(self.ufl_operands[1]),
-                                 parstr(self.ufl_operands[0], self))
+    def _ufl_str_(self, operands, paroperands):
+        return "sum_{%s} %s " % (operands[1], paroperands[0])
@@ -112,6 +112,11 @@ class Integral(object):
         s = fmt % (self._integrand, mname, self._ufl_domain, self._subdomain_id, self._metadata)
         return s
 
+    def _ufl_err_str_(self):
+        "Return a short string to represent this Integral in an error message."
+        mname = ufl.measure.integral_type_to_measure_name[self._integral_type]
+        return "{ %s } * %s[%s]" % (self._integrand._ufl_err_str_(), mname, self._subdomain_id)
+
     def __repr__(self):
         r = "Integral(%s, %s, %s, %s, %s, %s)" % (repr(self._integrand),
                                                   repr(self._integral_type),
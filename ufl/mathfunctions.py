@@ -67,8 +67,8 @@ class MathFunction(Operator):
             raise
         return res
 
-    def __str__(self):
-        return "%s(%s)" % (self._name, self.ufl_operands[0])
+    def _ufl_str_(self, operands, paroperands):
+        return "%s(%s)" % (self._name, operands[0])
 
 
 @ufl_type()
@@ -293,8 +293,8 @@ class Atan2(Operator):
             raise
         return res
 
-    def __str__(self):
-        return "atan_2(%s,%s)" % (self.ufl_operands[0], self.ufl_operands[1])
+    def _ufl_str_(self, operands, paroperands):
+        return "atan_2(%s,%s)" % operands
 
 
 def _find_erf():
@@ -374,9 +374,8 @@ class BesselFunction(Operator):
         func = getattr(scipy.special, name + functype)
         return func(nu, a)
 
-    def __str__(self):
-        return "%s(%s, %s)" % (self._name, self.ufl_operands[0],
-                               self.ufl_operands[1])
+    def _ufl_str_(self, operands, paroperands):
+        return "%s(%s, %s)" % (self._name, operands[0], operands[1])
 
 
 @ufl_type()
@@ -22,17 +22,21 @@ def parstr(child, parent, pre="(", post=")", format=str):
     # We want child to be evaluated fully first, and if the parent has
     # higher precedence we later wrap in ().
     s = format(child)
+    return parenthesize(s, child._precedence, parent._precedence, pre, post)
 
+
+def parenthesize(s, child_precedence, parent_precedence, pre="(", post=")"):
+    "Parenthesize the string s of a child with the given precedences if needed."
     # Operators where operands are always parenthesized because
     # precedence is not defined below
-    if parent._precedence == 0:
+    if parent_precedence == 0:
         return pre + s + post
 
     # If parent operator binds stronger than child, must parenthesize
     # child
     # FIXME: Is this correct for all possible positions of () in a + b + c?
     # FIXME: Left-right rule
-    if parent._precedence > child._precedence:  # parent = indexed, child = terminal
+    if parent_precedence > child_precedence:  # parent = indexed, child = terminal
         return pre + s + post
 
     # Nothing needed
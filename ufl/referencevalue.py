@@ -34,5 +34,5 @@ class ReferenceValue(Operator):
         "Get child from mapping and return the component asked for."
         error("Evaluate not implemented.")
 
-    def __str__(self):
-        return "reference_value(%s)" % self.ufl_operands[0]
+    def _ufl_str_(self, operands, paroperands):
+        return "reference_value(%s)" % operands
@@ -8,7 +8,6 @@
 # SPDX-License-Identifier:    LGPL-3.0-or-later
 
 from ufl.core.operator import Operator
-from ufl.precedence import parstr
 from ufl.core.ufl_type import ufl_type
 
 
@@ -34,8 +33,8 @@ class Restricted(Operator):
         return self.ufl_operands[0].evaluate(x, mapping, component,
                                              index_values)
 
-    def __str__(self):
-        return "%s('%s')" % (parstr(self.ufl_operands[0], self), self._side)
+    def _ufl_str_(self, operands, paroperands):
+        return "%s('%s')" % (paroperands[0], self._side)
 
 
 @ufl_type(is_terminal_modifier=True)
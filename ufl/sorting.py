@@ -100,8 +100,9 @@ _terminal_cmps[Coefficient._ufl_typecode_] = _cmp_coefficient
 _terminal_cmps[Label._ufl_typecode_] = _cmp_label
 
 
-def cmp_expr(a, b):
-    "Replacement for cmp(a, b), removed in Python 3, for Expr objects."
+def _cmp_expr_by_traversal(a, b):
+    """Compare a and b by a traversal of both expressions, without
+    using Python recursion."""
 
     # Modelled after pre_traversal to avoid recursion:
     left = [(a, b)]
@@ -155,13 +156,127 @@ def cmp_expr(a, b):
     return 0
 
 
+# --- Canonical sort keys
+
+class _MultiIndexKey(object):
+    """Sort key of a multiindex, comparing the index pairs of two
+    multiindices like ``_cmp_multi_index``, ignoring trailing indices
+    of the longer one."""
+    __slots__ = ("indices",)
+
+    def __init__(self, indices):
+        # Fixed indices sort by value and before free indices, free
+        # indices are all equal for sorting
+        self.indices = tuple((0, i._value) if isinstance(i, FixedIndex) else (1,)
+                             for i in indices)
+
+    def __eq__(self, other):
+        return all(x == y for x, y in zip(self.indices, other.indices))
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __lt__(self, other):
+        for x, y in zip(self.indices, other.indices):
+            if x != y:
+                return x < y
+        return False
+
+    def __gt__(self, other):
+        return other.__lt__(self)
+
+
+def _terminal_key_by_repr(a):
+    return repr(a)
+
+
+def _multi_index_key(a):
+    return _MultiIndexKey(a._indices)
+
+
+def _coefficient_key(a):
+    return a._count
+
+
+def _argument_key(a):
+    return (a._number, a._part)
+
+
+def _label_key(a):
+    # All labels are equal for sorting, see _cmp_label
+    return 0
+
+
+_terminal_keys = [_terminal_key_by_repr] * Expr._ufl_num_typecodes_
+_terminal_keys[MultiIndex._ufl_typecode_] = _multi_index_key
+_terminal_keys[Argument._ufl_typecode_] = _argument_key
+_terminal_keys[Coefficient._ufl_typecode_] = _coefficient_key
+_terminal_keys[Label._ufl_typecode_] = _label_key
+
+
+def _compute_sort_key(expr):
+    if expr._ufl_is_terminal_:
+        return (expr._ufl_typecode_, _terminal_keys[expr._ufl_typecode_](expr))
+    # Compared like cmp_expr: by type, number of operands and then the
+    # operands from the last to the first
+    ops = expr.ufl_operands
+    return (expr._ufl_typecode_, len(ops)) + tuple(op._sort_key for op in reversed(ops))
+
+
+def expr_sort_key(expr):
+    """Return the canonical sort key of expr, ordering expressions like
+    ``cmp_expr``.
+
+    The keys of expr and its subexpressions are computed once, without
+    using Python recursion, and cached on the nodes. The key of a node
+    shares the keys of its operands, so comparing the keys of
+    expressions with common subexpressions stops at these.
+    """
+    if expr._sort_key is not None:
+        return expr._sort_key
+    # Postorder traversal like in compute_expr_hash
+    lifo = [(expr, list(expr.ufl_operands))]
+    while lifo:
+        e, deps = lifo[-1]
+        for i, dep in enumerate(deps):
+            if dep is not None and dep._sort_key is None:
+                lifo.append((dep, list(dep.ufl_operands)))
+                deps[i] = None
+                break
+        else:
+            if e._sort_key is None:
+                e._sort_key = _compute_sort_key(e)
+            lifo.pop()
+    return expr._sort_key
+
+
+def cmp_expr(a, b):
+    "Replacement for cmp(a, b), removed in Python 3, for Expr objects."
+    if a is b:
+        return 0
+    # Most comparisons are decided by the type
+    x, y = a._ufl_typecode_, b._ufl_typecode_
+    if x != y:
+        return -1 if x < y else +1
+    try:
+        x, y = expr_sort_key(a), expr_sort_key(b)
+        return -1 if x < y else (+1 if y < x else 0)
+    except RecursionError:
+        # Comparing the keys of deeply nested expressions recurses
+        return _cmp_expr_by_traversal(a, b)
+
+
 def sorted_expr(sequence):
     "Return a canonically sorted list of Expr objects in sequence."
-    return sorted(sequence, key=cmp_to_key(cmp_expr))
+    sequence = list(sequence)
+    try:
+        return sorted(sequence, key=expr_sort_key)
+    except RecursionError:
+        return sorted(sequence, key=cmp_to_key(_cmp_expr_by_traversal))
 
 
 def sorted_expr_sum(seq):
-    seq2 = sorted(seq, key=cmp_to_key(cmp_expr))
+    seq2 = sorted_expr(seq)
     s = seq2[0]
     for e in seq2[1:]:
         s = s + e
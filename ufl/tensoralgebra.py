@@ -12,7 +12,6 @@ from ufl.core.expr import ufl_err_str
 from ufl.core.ufl_type import ufl_type
 from ufl.constantvalue import Zero
 from ufl.algebra import Operator, Conj
-from ufl.precedence import parstr
 from ufl.sorting import sorted_expr
 from ufl.index_combination_utils import merge_nonoverlapping_indices
 
@@ -104,8 +103,8 @@ class Transposed(CompoundTensorOperator):
         s = self.ufl_operands[0].ufl_shape
         return (s[1], s[0])
 
-    def __str__(self):
-        return "%s^T" % parstr(self.ufl_operands[0], self)
+    def _ufl_str_(self, operands, paroperands):
+        return "%s^T" % paroperands
 
 
 @ufl_type(num_ops=2)
@@ -131,9 +130,8 @@ class Outer(CompoundTensorOperator):
     def ufl_shape(self):
         return self.ufl_operands[0].ufl_shape + self.ufl_operands[1].ufl_shape
 
-    def __str__(self):
-        return "%s (X) %s" % (parstr(self.ufl_operands[0], self),
-                              parstr(self.ufl_operands[1], self))
+    def _ufl_str_(self, operands, paroperands):
+        return "%s (X) %s" % paroperands
 
 
 @ufl_type(num_ops=2)
@@ -170,9 +168,8 @@ class Inner(CompoundTensorOperator):
 
     ufl_shape = ()
 
-    def __str__(self):
-        return "%s : %s" % (parstr(self.ufl_operands[0], self),
-                            parstr(self.ufl_operands[1], self))
+    def _ufl_str_(self, operands, paroperands):
+        return "%s : %s" % paroperands
 
 
 @ufl_type(num_ops=2)
@@ -212,9 +209,8 @@ class Dot(CompoundTensorOperator):
     def ufl_shape(self):
         return self.ufl_operands[0].ufl_shape[:-1] + self.ufl_operands[1].ufl_shape[1:]
 
-    def __str__(self):
-        return "%s . %s" % (parstr(self.ufl_operands[0], self),
-                            parstr(self.ufl_operands[1], self))
+    def _ufl_str_(self, operands, paroperands):
+        return "%s . %s" % paroperands
 
 
 @ufl_type(num_ops=2)
@@ -245,9 +241,8 @@ class Cross(CompoundTensorOperator):
 
     ufl_shape = (3,)
 
-    def __str__(self):
-        return "%s x %s" % (parstr(self.ufl_operands[0], self),
-                            parstr(self.ufl_operands[1], self))
+    def _ufl_str_(self, operands, paroperands):
+        return "%s x %s" % paroperands
 
 
 @ufl_type(num_ops=1, inherit_indices_from_operand=0)
@@ -270,8 +265,8 @@ class Trace(CompoundTensorOperator):
 
     ufl_shape = ()
 
-    def __str__(self):
-        return "tr(%s)" % self.ufl_operands[0]
+    def _ufl_str_(self, operands, paroperands):
+        return "tr(%s)" % operands
 
 
 @ufl_type(is_scalar=True, num_ops=1)
@@ -302,8 +297,8 @@ class Determinant(CompoundTensorOperator):
     def __init__(self, A):
         CompoundTensorOperator.__init__(self, (A,))
 
-    def __str__(self):
-        return "det(%s)" % self.ufl_operands[0]
+    def _ufl_str_(self, operands, paroperands):
+        return "det(%s)" % operands
 
 
 # TODO: Drop Inverse and represent it as product of Determinant and
@@ -341,8 +336,8 @@ class Inverse(CompoundTensorOperator):
     def ufl_shape(self):
         return self.ufl_operands[0].ufl_shape
 
-    def __str__(self):
-        return "%s^-1" % parstr(self.ufl_operands[0], self)
+    def _ufl_str_(self, operands, paroperands):
+        return "%s^-1" % paroperands
 
 
 @ufl_type(is_index_free=True, num_ops=1)
@@ -367,8 +362,8 @@ class Cofactor(CompoundTensorOperator):
     def ufl_shape(self):
         return self.ufl_operands[0].ufl_shape
 
-    def __str__(self):
-        return "cofactor(%s)" % self.ufl_operands[0]
+    def _ufl_str_(self, operands, paroperands):
+        return "cofactor(%s)" % operands
 
 
 @ufl_type(num_ops=1, inherit_shape_from_operand=0, inherit_indices_from_operand=0)
@@ -395,8 +390,8 @@ class Deviatoric(CompoundTensorOperator):
     def __init__(self, A):
         CompoundTensorOperator.__init__(self, (A,))
 
-    def __str__(self):
-        return "dev(%s)" % self.ufl_operands[0]
+    def _ufl_str_(self, operands, paroperands):
+        return "dev(%s)" % operands
 
 
 @ufl_type(num_ops=1, inherit_shape_from_operand=0, inherit_indices_from_operand=0)
@@ -424,8 +419,8 @@ class Skew(CompoundTensorOperator):
     def __init__(self, A):
         CompoundTensorOperator.__init__(self, (A,))
 
-    def __str__(self):
-        return "skew(%s)" % self.ufl_operands[0]
+    def _ufl_str_(self, operands, paroperands):
+        return "skew(%s)" % operands
 
 
 @ufl_type(num_ops=1, inherit_shape_from_operand=0, inherit_indices_from_operand=0)
@@ -453,5 +448,5 @@ class Sym(CompoundTensorOperator):
     def __init__(self, A):
         CompoundTensorOperator.__init__(self, (A,))
 
-    def __str__(self):
-        return "sym(%s)" % self.ufl_operands[0]
+    def _ufl_str_(self, operands, paroperands):
+        return "sym(%s)" % operands
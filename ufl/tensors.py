@@ -90,22 +90,13 @@ class ListTensor(Operator):
 
         return Expr.__getitem__(self, origkey)
 
-    def __str__(self):
-        def substring(expressions, indent):
-            ind = " " * indent
-            if any(isinstance(e, ListTensor) for e in expressions):
-                substrings = []
-                for e in expressions:
-                    if isinstance(e, ListTensor):
-                        substrings.append(substring(e.ufl_operands, indent + 2))
-                    else:
-                        substrings.append(str(e))
-                s = (",\n" + ind).join(substrings)
-                return "%s[\n%s%s\n%s]" % (ind, ind, s, ind)
-            else:
-                s = ", ".join(str(e) for e in expressions)
-                return "%s[%s]" % (ind, s)
-        return substring(self.ufl_operands, 0)
+    def _ufl_str_(self, operands, paroperands):
+        if any(isinstance(e, ListTensor) for e in self.ufl_operands):
+            # Sublists on separate indented lines
+            substrings = [("  " + s.replace("\n", "\n  ") if isinstance(e, ListTensor) else s)
+                          for e, s in zip(self.ufl_operands, operands)]
+            return "[\n%s\n]" % ",\n".join(substrings)
+        return "[%s]" % ", ".join(operands)
 
 
 @ufl_type(is_shaping=True, num_ops="varying")
@@ -173,8 +164,8 @@ class ComponentTensor(Operator):
 
         return a
 
-    def __str__(self):
-        return "{ A | A_{%s} = %s }" % (self.ufl_operands[1], self.ufl_operands[0])
+    def _ufl_str_(self, operands, paroperands):
+        return "{ A | A_{%s} = %s }" % (operands[1], operands[0])
 
 
 # --- User-level functions to wrap expressions in the correct way ---
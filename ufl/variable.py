@@ -106,6 +106,5 @@ class Variable(Operator):
                 self.ufl_operands[1] == other.ufl_operands[1] and
                 self.ufl_operands[0] == other.ufl_operands[0])
 
-    def __str__(self):
-        return "var%d(%s)" % (self.ufl_operands[1].count(),
-                              self.ufl_operands[0])
+    def _ufl_str_(self, operands, paroperands):
+        return "var%d(%s)" % (self.ufl_operands[1].count(), operands[0])